@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""ACL message codec benchmark
+
+Compare the binary ACL codec with JSON and pickle: encode and decode
+throughput, frame size and memory held per decoded message.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core import acl
+
+
+def make_message(content_size):
+    return acl.ACLMessage(
+        acl.Performative.INFORM, sender='sender@0A1B2C3D4E5F', receivers=['receiver@0A1B2C3D4E5F'],
+        content=b'x' * content_size, language='fipa-sl', ontology='logistics', protocol='fipa-request',
+        conversation_id='conversation-0001', reply_with='reply-0001', reply_by=1500000000.0)
+
+
+def json_encode(message):
+    return json.dumps({
+        'performative': message.performative.value, 'sender': message.sender,
+        'receivers': message.receivers, 'content': bytes(message.content).decode('latin-1'),
+        'language': message.language, 'ontology': message.ontology, 'protocol': message.protocol,
+        'conversation_id': message.conversation_id, 'reply_with': message.reply_with,
+        'reply_by': message.reply_by}).encode('utf-8')
+
+
+def json_decode(data):
+    document = json.loads(data)
+    document['performative'] = acl.Performative(document['performative'])
+    document['content'] = document['content'].encode('latin-1')
+    return acl.ACLMessage(**document)
+
+
+def pickle_encode(message):
+    return pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+
+
+CODECS = [
+    ('acl', acl.encode, acl.decode),
+    ('json', json_encode, json_decode),
+    ('pickle', pickle_encode, pickle.loads),
+]
+
+
+def bench(content_size, count):
+    message = make_message(content_size)
+    for name, encode, decode in CODECS:
+        start = time.perf_counter()
+        for _ in range(count):
+            frame = encode(message)
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(count):
+            decode(frame)
+        decode_time = time.perf_counter() - start
+
+        # memory held by decoded messages, the frames themselves are allocated beforehand
+        frames = [encode(message) for _ in range(1000)]
+        tracemalloc.start()
+        decoded = [decode(item) for item in frames]
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del decoded
+
+        print('%6d bytes %-7s encode %9.0f msg/s  decode %9.0f msg/s  frame %6d bytes  %6d bytes/message' % (
+            content_size, name, count / encode_time, count / decode_time, len(frame), held / 1000))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--content-sizes', type=int, nargs='+', default=[64, 4096, 65536])
+    arg_parser.add_argument('--count', type=int, default=50000)
+    args = arg_parser.parse_args(args=argv[1:])
+    for content_size in args.content_sizes:
+        bench(content_size, args.count)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
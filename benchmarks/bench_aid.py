@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Agent creation benchmark
+
+Create agents and use their AIDs as dictionary keys, with the current AID
+value type and with the former per agent uuid4/getnode/string formatting.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+from uuid import getnode, uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.aid import local_platform_id, unique_name
+from copdai_core.mas import AbstractAgent, agent_identifier
+
+
+class BenchAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+def legacy_aid():
+    # AID formatting done by AbstractAgent.__init__ before AIDs became a value type
+    platform_id = getnode()
+    return '%s#%s@%s' % (str(uuid4()), 'copdai_core.mas',
+                         ''.join(("%012X" % platform_id)[i:i + 2] for i in range(0, 12, 2)))
+
+
+def bench(count):
+    start = time.perf_counter()
+    legacy = {}
+    for _ in range(count):
+        legacy[legacy_aid()] = None
+    legacy_time = time.perf_counter() - start
+    del legacy
+
+    start = time.perf_counter()
+    current = {}
+    for _ in range(count):
+        current[agent_identifier(unique_name(), local_platform_id())] = None
+    current_time = time.perf_counter() - start
+    del current
+
+    start = time.perf_counter()
+    agents = {}
+    for _ in range(count):
+        agent = BenchAgent()
+        agents[agent.aid] = agent
+    agent_time = time.perf_counter() - start
+
+    aids = list(agents)
+    start = time.perf_counter()
+    for aid in aids:
+        agents[aid]
+    lookup_time = time.perf_counter() - start
+
+    print('%8d agents: legacy AID %8.0f/s  AID %8.0f/s  agent creation %8.0f/s  AID lookup %9.0f/s' % (
+        count, count / legacy_time, count / current_time, count / agent_time, count / lookup_time))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--counts', type=int, nargs='+', default=[1000000])
+    args = arg_parser.parse_args(args=argv[1:])
+    for count in args.counts:
+        bench(count)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
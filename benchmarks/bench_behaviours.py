@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Behaviour scheduler benchmark
+
+Overhead of one behaviour step, with plain and coroutine actions, the
+precision of ticker timers under many concurrent agents and the CPU used by
+agents whose behaviours are all blocked waiting for messages.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.behaviours import CyclicBehaviour, TickerBehaviour
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class BehaviourAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class Steps(CyclicBehaviour):
+
+    def __init__(self, steps):
+        super().__init__()
+        self.steps = steps
+
+    def action(self):
+        self.steps -= 1
+        if not self.steps:
+            self.agent.remove_behaviour(self)
+
+
+class AsyncSteps(Steps):
+
+    async def action(self):
+        Steps.action(self)
+
+
+class Ticks(TickerBehaviour):
+
+    def __init__(self, period, count, lateness):
+        super().__init__(period)
+        self.count = count
+        self.lateness = lateness
+
+    def on_tick(self):
+        self.lateness.append(asyncio.get_running_loop().time() - self._deadline)
+        if self.ticks == self.count:
+            self.stop()
+
+
+class Waiting(CyclicBehaviour):
+
+    def action(self):
+        if self.agent.receive() is None:
+            self.block()
+
+
+async def step_overhead(behaviour_class, agents, behaviours, steps):
+    platform = AgentPlatform('AP')
+    population = []
+    for _ in range(agents):
+        agent = BehaviourAgent(platform_id=1)
+        for _ in range(behaviours):
+            agent.add_behaviour(behaviour_class(steps))
+        population.append(agent)
+    start = time.perf_counter()
+    for agent in population:
+        platform.runtime.spawn(agent)
+    await platform.runtime.join()
+    elapsed = time.perf_counter() - start
+    total = agents * behaviours * steps
+    print('%-10s %6d agents x %3d behaviours x %6d steps: %7.3f us per step' % (
+        behaviour_class.__name__, agents, behaviours, steps, elapsed / total * 1e6))
+
+
+async def timer_precision(agents, period, ticks):
+    platform = AgentPlatform('AP')
+    lateness = []
+    for _ in range(agents):
+        agent = BehaviourAgent(platform_id=1)
+        agent.add_behaviour(Ticks(period, ticks, lateness))
+        platform.runtime.spawn(agent)
+    await platform.runtime.join()
+    lateness.sort()
+    print('%6d tickers every %5.1f ms: lateness mean %7.3f ms  p50 %7.3f ms  p99 %7.3f ms  max %7.3f ms' % (
+        agents, period * 1e3, sum(lateness) / len(lateness) * 1e3, lateness[len(lateness) // 2] * 1e3,
+        lateness[int(len(lateness) * 0.99)] * 1e3, lateness[-1] * 1e3))
+
+
+async def idle_cpu(agents, duration):
+    platform = AgentPlatform('AP')
+    population = []
+    for _ in range(agents):
+        agent = BehaviourAgent(platform_id=1)
+        agent.add_behaviour(Waiting())
+        platform.runtime.spawn(agent)
+        population.append(agent)
+    await asyncio.sleep(0.1)
+    cpu = time.process_time()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu
+    for agent in population:
+        platform.runtime.quit(agent)
+    await platform.runtime.join()
+    print('%6d blocked agents: %6.3f s CPU over %4.1f s' % (agents, cpu, duration))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, default=1000)
+    arg_parser.add_argument('--behaviours', type=int, default=4)
+    arg_parser.add_argument('--steps', type=int, default=250)
+    arg_parser.add_argument('--periods', type=float, nargs='+', default=[0.001, 0.01, 0.1])
+    arg_parser.add_argument('--ticks', type=int, default=20)
+    arg_parser.add_argument('--idle', type=float, default=2.0)
+    args = arg_parser.parse_args(args=argv[1:])
+    for behaviour_class in (Steps, AsyncSteps):
+        asyncio.run(step_overhead(behaviour_class, args.agents, args.behaviours, args.steps))
+    for period in args.periods:
+        asyncio.run(timer_precision(args.agents, period, args.ticks))
+    asyncio.run(idle_cpu(args.agents * 10, args.idle))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Agent container scaling benchmark
+
+Run the same set of CPU bound agents on 1 to N worker processes and report
+the speedup over a single worker.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class BusyAgent(AbstractAgent):
+    """Burn a fixed amount of CPU in run then terminate."""
+
+    __slots__ = ['work']
+
+    def __init__(self, work, name=None, platform_id=None):
+        super().__init__(platform_id=platform_id, name=name)
+        self.work = work
+
+    def setup(self):
+        pass
+
+    def run(self):
+        total = 0
+        for i in range(self.work):
+            total += i * i
+        return total
+
+    def teardown(self):
+        pass
+
+
+def bench(workers, agents, work):
+    platform = AgentPlatform('AP')
+    with platform.container(workers=workers) as container:
+        start = time.perf_counter()
+        for i in range(agents):
+            container.spawn(BusyAgent, 'busy%d' % i, work)
+        container.join()
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    arg_parser.add_argument('--agents', type=int, default=256)
+    arg_parser.add_argument('--work', type=int, default=200000)
+    args = arg_parser.parse_args(args=argv[1:])
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        elapsed = bench(workers, args.agents, args.work)
+        baseline = baseline or elapsed
+        print('%3d workers: %7.3f s  speedup %5.2f  efficiency %5.1f%%' % (
+            workers, elapsed, baseline / elapsed, 100.0 * baseline / elapsed / workers))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""DF yellow pages directory benchmark
+
+Mixed register/search workload against the DF inverted index.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.directory import ServiceDirectory, DFAgentDescription, ServiceDescription
+
+TYPES = ['planning', 'routing', 'sensing', 'translation', 'storage', 'vision', 'negotiation', 'billing']
+ONTOLOGIES = ['logistics', 'energy', 'health', 'finance', 'robotics']
+PROTOCOLS = ['fipa-request', 'fipa-query', 'fipa-contract-net', 'fipa-subscribe']
+
+
+def make_description(i, rng):
+    return DFAgentDescription(name='agent%d@AP' % i, services=[
+        ServiceDescription(
+            name='service%d' % (i % 1000),
+            type=rng.choice(TYPES),
+            ontologies=rng.sample(ONTOLOGIES, 2),
+            protocols=rng.sample(PROTOCOLS, 2),
+            languages=['fipa-sl'],
+            properties={'region': i % 32})])
+
+
+def make_template(rng):
+    return DFAgentDescription(services=[
+        ServiceDescription(
+            type=rng.choice(TYPES),
+            ontologies=[rng.choice(ONTOLOGIES)],
+            protocols=[rng.choice(PROTOCOLS)],
+            properties={'region': rng.randrange(32)})])
+
+
+def bench(size, operations, search_ratio, page_size):
+    rng = random.Random(size)
+    directory = ServiceDirectory()
+    start = time.perf_counter()
+    for i in range(size):
+        directory.register(make_description(i, rng))
+    fill_time = time.perf_counter() - start
+
+    workload = [rng.random() < search_ratio for _ in range(operations)]
+    templates = [make_template(rng) for _ in range(operations)]
+    fresh = [make_description(size + i, rng) for i in range(operations)]
+    searches = 0
+    hits = 0
+    start = time.perf_counter()
+    for i, is_search in enumerate(workload):
+        if is_search:
+            hits += len(directory.search(templates[i], max_results=page_size))
+            searches += 1
+        else:
+            directory.register(fresh[i])
+    mixed_time = time.perf_counter() - start
+
+    print('%8d services: register %9.0f ops/s  mixed %9.0f ops/s (%d searches, %.1f hits/search)' % (
+        size, size / fill_time, operations / mixed_time, searches, hits / float(max(searches, 1))))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    arg_parser.add_argument('--operations', type=int, default=20000)
+    arg_parser.add_argument('--search-ratio', type=float, default=0.8)
+    arg_parser.add_argument('--page-size', type=int, default=100)
+    args = arg_parser.parse_args(args=argv[1:])
+    for size in args.sizes:
+        bench(size, args.operations, args.search_ratio, args.page_size)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
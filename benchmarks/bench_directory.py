@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""AMS white pages directory benchmark
+
+Measure register and search throughput of the AgentDirectory for growing
+numbers of registered agents.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.commun import AgentState
+from copdai_core.directory import AgentDirectory, AMSAgentDescription
+
+STATES = list(AgentState)
+
+
+def bench(size, searches):
+    directory = AgentDirectory()
+    descriptions = [
+        AMSAgentDescription(
+            name='agent%d@AP' % i,
+            state=STATES[i % len(STATES)],
+            platform_id=i % 64,
+            addresses=('tcp://10.0.%d.%d:7000' % (i % 256, i % 251),))
+        for i in range(size)]
+
+    start = time.perf_counter()
+    for description in descriptions:
+        directory.register(description)
+    register_time = time.perf_counter() - start
+
+    templates = [AMSAgentDescription(state=STATES[i % len(STATES)], platform_id=i % 64) for i in range(searches)]
+    start = time.perf_counter()
+    for template in templates:
+        directory.search(template, max_results=10)
+    search_time = time.perf_counter() - start
+
+    names = [descriptions[(i * 7919) % size].name for i in range(searches)]
+    start = time.perf_counter()
+    for name in names:
+        directory.get(name)
+    lookup_time = time.perf_counter() - start
+
+    print('%9d agents: register %10.0f ops/s  search %10.0f ops/s  lookup %10.0f ops/s' % (
+        size, size / register_time, searches / search_time, searches / lookup_time))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    arg_parser.add_argument('--searches', type=int, default=10000)
+    args = arg_parser.parse_args(args=argv[1:])
+    for size in args.sizes:
+        bench(size, args.searches)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
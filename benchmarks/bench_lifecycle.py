@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Agent life cycle transitions benchmark
+
+Cycle hosted agents through suspend/resume and measure the transitions per
+second, with the AMS directory following them through the batched
+transition stream and through a callback per transition.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class BenchAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+def populate(agents, batch_size):
+    platform = AgentPlatform('bench')
+    platform.runtime.transitions.batch_size = batch_size
+    population = []
+    for _ in range(agents):
+        agent = BenchAgent()
+        platform.ams.create(agent)
+        # hosted without a task, only the transitions are measured
+        agent._runtime = platform.runtime
+        agent.invoke()
+        population.append(agent)
+    platform.runtime.transitions.flush()
+    return platform, population
+
+
+def cycle(population, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for agent in population:
+            agent.suspend()
+            agent.resume()
+    return time.perf_counter() - start
+
+
+def bench(agents, rounds, batch_size):
+    transitions = agents * rounds * 2
+
+    platform, population = populate(agents, batch_size)
+    elapsed = cycle(population, rounds)
+    start = time.perf_counter()
+    platform.runtime.transitions.flush()
+    elapsed += time.perf_counter() - start
+    batched = transitions / elapsed
+
+    # one subscriber call per transition, as an observer called on every state change
+    platform, population = populate(agents, 1)
+    per_transition = transitions / cycle(population, rounds)
+
+    print('%8d agents x %4d rounds: batched stream %9.0f transitions/s  per transition %9.0f transitions/s' % (
+        agents, rounds, batched, per_transition))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, nargs='+', default=[1000, 100000])
+    arg_parser.add_argument('--rounds', type=int, default=10)
+    arg_parser.add_argument('--batch-size', type=int, default=4096)
+    args = arg_parser.parse_args(args=argv[1:])
+    for agents in args.agents:
+        bench(agents, args.rounds, args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
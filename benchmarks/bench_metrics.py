@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Platform metrics benchmark
+
+Cost of the instrumentation on the message path and on the AMS operations,
+with the platform metrics started and stopped, and the cost of collecting
+the metrics of many agents in the text exposition format.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.acl import ACLMessage, Performative
+from copdai_core.directory import AMSAgentDescription
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class SinkAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+def platform_with(agents):
+    platform = AgentPlatform('AP')
+    population = [SinkAgent(platform_id=1) for _ in range(agents)]
+    for agent in population:
+        platform.mts.attach(agent)
+        agent.invoke()
+    return platform, population
+
+
+def message_path(platform, population, count):
+    messages = [ACLMessage(Performative.INFORM, sender=population[0].aid, receivers=(agent.aid,), content=n)
+                for n, agent in enumerate(population)]
+    send = platform.mts.send
+    start = time.perf_counter()
+    for n in range(count):
+        message = messages[n % len(messages)]
+        send(message)
+        population[n % len(population)].receive()
+    return time.perf_counter() - start
+
+
+def ams_operations(platform, count):
+    ams = platform.ams
+    descriptions = [AMSAgentDescription(name='agent%d@AP' % n, platform_id='AP') for n in range(count)]
+    template = AMSAgentDescription(name='agent0@AP')
+    start = time.perf_counter()
+    for description in descriptions:
+        ams.register(description)
+    for _ in range(count):
+        ams.search(template, 1)
+    for description in descriptions:
+        ams.deregister(description.name)
+    return time.perf_counter() - start
+
+
+def best(function, repeat, *args):
+    return min(function(*args) for _ in range(repeat))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--messages', type=int, default=200000)
+    arg_parser.add_argument('--agents', type=int, default=100)
+    arg_parser.add_argument('--operations', type=int, default=20000)
+    arg_parser.add_argument('--sample-every', type=int, default=64)
+    arg_parser.add_argument('--scrape-agents', type=int, nargs='+', default=[100, 1000, 10000])
+    arg_parser.add_argument('--repeat', type=int, default=10, help='best of this many runs, off and on interleaved')
+    args = arg_parser.parse_args(args=argv[1:])
+
+    platform, population = platform_with(args.agents)
+    timings = {'off': [], 'on': []}
+    for _ in range(args.repeat):
+        timings['off'].append(message_path(platform, population, args.messages))
+        platform.start_metrics(args.sample_every)
+        timings['on'].append(message_path(platform, population, args.messages))
+        platform.stop_metrics()
+    off, on = min(timings['off']), min(timings['on'])
+    print('message path, %d agents: metrics off %.3f us/message  on %.3f us/message  overhead %+.1f%%' % (
+        args.agents, off / args.messages * 1e6, on / args.messages * 1e6, (on / off - 1) * 100))
+
+    off = best(ams_operations, args.repeat, AgentPlatform('AP'), args.operations)
+    metered = AgentPlatform('AP')
+    metered.start_metrics(args.sample_every)
+    on = best(ams_operations, args.repeat, metered, args.operations)
+    total = args.operations * 3
+    print('AMS operations: metrics off %.3f us/operation  on %.3f us/operation  overhead %+.1f%%' % (
+        off / total * 1e6, on / total * 1e6, (on / off - 1) * 100))
+
+    for agents in args.scrape_agents:
+        platform, population = platform_with(agents)
+        platform.start_metrics(args.sample_every)
+        message_path(platform, population, agents)
+        start = time.perf_counter()
+        text = platform.metrics.exposition()
+        elapsed = time.perf_counter() - start
+        print('exposition of %6d agents: %8.2f ms, %8d bytes' % (agents, elapsed * 1e3, len(text)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
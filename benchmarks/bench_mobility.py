@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Agent migration pause benchmark
+
+Migrate agents carrying states of growing size to a platform running in
+another process and report the time each agent is not active.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class CarrierAgent(AbstractAgent):
+
+    __slots__ = ['payload', 'table']
+
+    def __init__(self, size, name=None, platform_id=None):
+        super().__init__(platform_id=platform_id, name=name)
+        self.payload = bytearray(size)
+        self.table = dict((i, str(i)) for i in range(100))
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        while True:
+            await self.receive_async()
+
+    def teardown(self):
+        pass
+
+
+def destination(address, ready):
+    async def serve():
+        platform = AgentPlatform('destination')
+        await platform.listen_migrations(address)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def migrate_all(address, sizes, agents):
+    platform = AgentPlatform('origin')
+    results = []
+    for size in sizes:
+        pauses = []
+        for _ in range(agents):
+            aid = platform.ams.create(CarrierAgent(size))
+            platform.ams.invoke(aid)
+            await asyncio.sleep(0)
+            report = await platform.migrate(aid, address)
+            pauses.append(report.pause)
+        results.append((size, report, pauses))
+    return results
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1 << 16, 1 << 20, 1 << 24])
+    arg_parser.add_argument('--agents', type=int, default=20)
+    args = arg_parser.parse_args(args=argv[1:])
+    with tempfile.TemporaryDirectory() as directory:
+        address = 'unix://' + os.path.join(directory, 'migrations.sock')
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=destination, args=(address, ready), daemon=True)
+        process.start()
+        ready.wait(10)
+        try:
+            for size, report, pauses in asyncio.run(migrate_all(address, args.sizes, args.agents)):
+                print('%10d bytes state: snapshot %6d bytes + %10d out-of-band  pause median %8.1f us  max %8.1f us'
+                      % (size, report.snapshot_size, report.buffer_size, statistics.median(pauses) * 1e6,
+                         max(pauses) * 1e6))
+        finally:
+            process.terminate()
+            process.join()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
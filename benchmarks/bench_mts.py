@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Message delivery benchmark
+
+Throughput and latency of the MTS for co-located receivers, where the
+message object is handed over by reference, against the same messages
+serialized per receiver and against a round trip through a worker process
+of an agent container.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core import acl
+from copdai_core.acl import ACLMessage, Performative
+from copdai_core.mas import AbstractAgent, AgentPlatform, MessageTransportService
+
+
+class SinkAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class EchoAgent(AbstractAgent):
+    """Send every message back to its sender."""
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        while True:
+            message = await self.receive_async()
+            self.send(ACLMessage(Performative.INFORM, sender=self.aid, receivers=(message.sender,),
+                                 content=message.content))
+
+    def teardown(self):
+        pass
+
+
+def local(count, fanout, size):
+    mts = MessageTransportService(capacity=count + 1)
+    agents = [SinkAgent() for _ in range(fanout)]
+    for agent in agents:
+        mts.attach(agent)
+        agent.invoke()
+    message = ACLMessage(Performative.INFORM, receivers=[agent.aid for agent in agents], content=b'x' * size)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        mts.send(message)
+        for agent in agents:
+            agent.receive()
+    by_reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        for agent in agents:
+            # what a transport serializing every delivery would pay
+            agent._mailbox.put(acl.decode(acl.encode(message)))
+            agent.receive()
+    serialized = time.perf_counter() - start
+    return by_reference, serialized
+
+
+def cross_process(count, size):
+    platform = AgentPlatform('bench')
+    with platform.container(workers=1) as container:
+        aid = container.spawn(EchoAgent, 'echo')
+        message = ACLMessage(Performative.INFORM, sender=container.aid, receivers=(aid,), content=b'x' * size)
+        container.send(message)
+        container.receive(timeout=10)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            container.send(message)
+            container.receive(timeout=10)
+        latency = (time.perf_counter() - start) / count
+
+        start = time.perf_counter()
+        for _ in range(count):
+            container.send(message)
+        for _ in range(count):
+            container.receive(timeout=10)
+        throughput = count / (time.perf_counter() - start)
+    return latency, throughput
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--count', type=int, default=20000)
+    arg_parser.add_argument('--fanouts', type=int, nargs='+', default=[1, 16])
+    arg_parser.add_argument('--size', type=int, default=1024)
+    args = arg_parser.parse_args(args=argv[1:])
+    for fanout in args.fanouts:
+        by_reference, serialized = local(args.count, fanout, args.size)
+        deliveries = args.count * fanout
+        print('local x%-3d   by reference %9.0f deliveries/s %7.2f us/message  serialized %9.0f deliveries/s' % (
+            fanout, deliveries / by_reference, by_reference / args.count * 1e6, deliveries / serialized))
+    latency, throughput = cross_process(args.count // 10, args.size)
+    print('cross-process round trip %7.2f us  pipelined %9.0f round trips/s' % (latency * 1e6, throughput))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
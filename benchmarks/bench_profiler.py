@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Agent profiler benchmark
+
+Overhead of the behaviour step accounting and of the sampling profiler at
+several sampling intervals on a platform of busy agents, one of them much
+hotter than the others, and how well the samples single it out.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.behaviours import CyclicBehaviour
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class BehaviourAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class Work(CyclicBehaviour):
+
+    def __init__(self, steps, work):
+        super().__init__()
+        self.steps = steps
+        self.work = work
+
+    def action(self):
+        total = 0
+        for n in range(self.work):
+            total += n
+        self.steps -= 1
+
+    def done(self):
+        return self.steps <= 0
+
+
+class HotWork(Work):
+    pass
+
+
+async def run(agents, steps, work, mode, interval, collapsed):
+    platform = AgentPlatform('AP')
+    population = []
+    for n in range(agents):
+        agent = BehaviourAgent(platform_id=1)
+        # the first agent does ten times the work of the others
+        agent.add_behaviour(HotWork(steps, work * 10) if not n else Work(steps, work))
+        population.append(agent)
+    if mode != 'off':
+        platform.ams.start_profiling(accounting=mode == 'accounting', sampling=mode == 'sampling',
+                                     interval=interval)
+    cpu = time.process_time()
+    for agent in population:
+        platform.runtime.spawn(agent)
+    await platform.runtime.join()
+    cpu = time.process_time() - cpu
+    platform.ams.stop_profiling()
+    hot = None
+    if mode == 'sampling':
+        profiler = platform.ams.profiler
+        samples = sum(profiler.samples.values())
+        hot = profiler.samples.get((population[0].aid, 'HotWork'), 0) / float(max(samples, 1))
+        if collapsed:
+            profiler.dump(collapsed)
+    return cpu, hot
+
+
+def best(repeat, *args):
+    runs = [asyncio.run(run(*args)) for _ in range(repeat)]
+    return min(cpu for cpu, hot in runs), runs[-1][1]
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, default=200)
+    arg_parser.add_argument('--steps', type=int, default=100)
+    arg_parser.add_argument('--work', type=int, default=200, help='loop iterations per behaviour step')
+    arg_parser.add_argument('--intervals', type=float, nargs='+', default=[0.01, 0.001])
+    arg_parser.add_argument('--repeat', type=int, default=3, help='best of this many runs')
+    arg_parser.add_argument('--collapsed', help='write the collapsed stacks of the last sampling run there')
+    args = arg_parser.parse_args(args=argv[1:])
+    total = args.agents * args.steps
+    # the hot agent takes 10 / (agents + 9) of the work
+    expected = 10.0 / (args.agents + 9)
+    baseline, _ = best(args.repeat, args.agents, args.steps, args.work, 'off', None, None)
+    print('%-22s %7.3f us/step' % ('off', baseline / total * 1e6))
+    cpu, _ = best(args.repeat, args.agents, args.steps, args.work, 'accounting', None, None)
+    print('%-22s %7.3f us/step  overhead %+6.1f%%' % ('accounting', cpu / total * 1e6, (cpu / baseline - 1) * 100))
+    for interval in args.intervals:
+        cpu, hot = best(args.repeat, args.agents, args.steps, args.work, 'sampling', interval, args.collapsed)
+        print('%-22s %7.3f us/step  overhead %+6.1f%%  hot agent %5.1f%% of the samples (%.1f%% of the work)' % (
+            'sampling every %g ms' % (interval * 1e3), cpu / total * 1e6, (cpu / baseline - 1) * 100, hot * 100,
+            expected * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Interaction protocol benchmark
+
+Cost of inserting, cancelling and expiring reply-by deadlines in the
+hierarchical timing wheel against a binary heap, then contract-nets called
+on growing bidder sets, some of them never answering so that the call for
+proposals stops at its deadline.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.acl import Performative
+from copdai_core.behaviours import CyclicBehaviour
+from copdai_core.mas import AbstractAgent, AgentPlatform
+from copdai_core.protocols import ProtocolEngine
+from copdai_core.timers import TimingWheel
+
+
+def _nothing():
+    pass
+
+
+def wheel(deadlines, resolution):
+    timers = TimingWheel(resolution=resolution)
+    start = time.perf_counter()
+    pending = [timers.schedule(deadline, _nothing) for deadline in deadlines]
+    inserted = time.perf_counter()
+    # a reply arrives before most deadlines
+    for timer in pending[::2]:
+        timer.cancel()
+    cancelled = time.perf_counter()
+    expired = 0
+    now = 0.0
+    horizon = max(deadlines) + resolution
+    while now <= horizon:
+        now += resolution * 16
+        expired += len(timers.advance(now))
+    end = time.perf_counter()
+    assert expired == len(deadlines) - len(pending[::2])
+    return inserted - start, cancelled - inserted, end - cancelled
+
+
+def heap(deadlines, resolution):
+    start = time.perf_counter()
+    queue = []
+    pending = []
+    for sequence, deadline in enumerate(deadlines):
+        entry = [deadline, sequence, _nothing]
+        heapq.heappush(queue, entry)
+        pending.append(entry)
+    inserted = time.perf_counter()
+    # the usual lazy deletion, cancelled entries stay in the heap until popped
+    for entry in pending[::2]:
+        entry[2] = None
+    cancelled = time.perf_counter()
+    expired = 0
+    now = 0.0
+    while queue:
+        now += resolution * 16
+        while queue and queue[0][0] <= now:
+            if heapq.heappop(queue)[2] is not None:
+                expired += 1
+    end = time.perf_counter()
+    assert expired == len(deadlines) - len(pending[::2])
+    return inserted - start, cancelled - inserted, end - cancelled
+
+
+def deadlines_bench(count, span, resolution):
+    rng = random.Random(count)
+    deadlines = [rng.uniform(0, span) for _ in range(count)]
+    for name, function in (('timing wheel', wheel), ('binary heap', heap)):
+        insert, cancel, expire = function(deadlines, resolution)
+        print('%-12s %8d deadlines over %5.0f s: insert %6.3f us  cancel %6.3f us  expire %6.3f us' % (
+            name, count, span, insert / count * 1e6, cancel / (count // 2) * 1e6,
+            expire / (count - count // 2) * 1e6))
+
+
+class Bidder(CyclicBehaviour):
+
+    def __init__(self, price):
+        super().__init__()
+        self.price = price
+
+    def action(self):
+        message = self.agent.receive()
+        if message is None:
+            self.block()
+            return
+        if self.price is None:
+            return
+        if message.performative is Performative.CFP:
+            self.agent.engine.reply(message, Performative.PROPOSE, self.price)
+        elif message.performative is Performative.ACCEPT_PROPOSAL:
+            self.agent.engine.reply(message, Performative.INFORM, 'done')
+
+
+class ProtocolAgent(AbstractAgent):
+
+    __slots__ = ['engine']
+
+    def __init__(self, price=None):
+        super().__init__(platform_id=1)
+        self.engine = ProtocolEngine(self)
+        if price is not None:
+            self.add_behaviour(Bidder(price))
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        if self._scheduler is not None:
+            await super().run()
+        else:
+            await asyncio.get_running_loop().create_future()
+
+    def teardown(self):
+        pass
+
+
+def cheapest(proposals):
+    return [min(proposals, key=lambda message: message.content)]
+
+
+async def contract_net(bidders, silent, timeout):
+    platform = AgentPlatform('AP')
+    runtime = platform.runtime
+    initiator = ProtocolAgent()
+    population = [ProtocolAgent(price=n + 1) for n in range(bidders)] + [ProtocolAgent() for _ in range(silent)]
+    runtime.spawn(initiator)
+    for agent in population:
+        runtime.spawn(agent)
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    result = await initiator.engine.contract_net([agent.aid for agent in population], 'task', timeout, cheapest)
+    elapsed = time.perf_counter() - start
+    for agent in [initiator] + population:
+        runtime.quit(agent)
+    await runtime.join()
+    print('contract-net %6d bidders (%4d silent), deadline %5.2f s: %3d proposals in %7.3f s, %s' % (
+        bidders + silent, silent, timeout, len(result.proposals), elapsed,
+        'stopped at deadline' if result.expired else 'all answered'))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--deadlines', type=int, nargs='+', default=[10000, 100000, 1000000])
+    arg_parser.add_argument('--span', type=float, default=60.0, help='deadlines are spread over this many seconds')
+    arg_parser.add_argument('--resolution', type=float, default=0.01)
+    arg_parser.add_argument('--bidders', type=int, nargs='+', default=[100, 1000, 10000])
+    arg_parser.add_argument('--silent', type=int, default=10)
+    arg_parser.add_argument('--timeout', type=float, default=0.5)
+    args = arg_parser.parse_args(args=argv[1:])
+    for count in args.deadlines:
+        deadlines_bench(count, args.span, args.resolution)
+    for bidders in args.bidders:
+        asyncio.run(contract_net(bidders, 0, args.timeout * 10))
+        asyncio.run(contract_net(bidders, args.silent, args.timeout))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
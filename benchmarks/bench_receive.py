@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Selective receive benchmark
+
+Fill a mailbox with messages spread over many conversations, then take
+them out conversation by conversation with message templates, against a
+naive scan of the pending messages on every receive. Plain receives in
+arrival order are measured on the same mailbox for reference.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.acl import ACLMessage, MessageTemplate, Performative
+from copdai_core.mailbox import Mailbox
+
+_PERFORMATIVES = (Performative.INFORM, Performative.PROPOSE, Performative.REFUSE, Performative.AGREE)
+
+
+def messages(count, conversations):
+    return [ACLMessage(_PERFORMATIVES[n % len(_PERFORMATIVES)], sender='bidder%d@AP' % n,
+                       conversation_id='conversation%d' % (n % conversations), content=n) for n in range(count)]
+
+
+def naive(pending, templates):
+    pending = list(pending)
+    start = time.perf_counter()
+    for template in templates:
+        match = template.match
+        for position, message in enumerate(pending):
+            if match(message):
+                del pending[position]
+                break
+    return time.perf_counter() - start
+
+
+def indexed(pending, templates):
+    box = Mailbox(capacity=len(pending))
+    for message in pending:
+        box.put(message)
+    start = time.perf_counter()
+    for template in templates:
+        box.get(template)
+    elapsed = time.perf_counter() - start
+    assert not len(box)
+    return elapsed
+
+
+def plain(pending):
+    box = Mailbox(capacity=len(pending))
+    for message in pending:
+        box.put(message)
+    start = time.perf_counter()
+    while box.get() is not None:
+        pass
+    return time.perf_counter() - start
+
+
+def bench(count, conversations, naive_limit):
+    pending = messages(count, conversations)
+    order = list(range(count))
+    random.Random(count).shuffle(order)
+    templates = [MessageTemplate(conversation_id=pending[n].conversation_id) for n in order]
+    by_performative = [MessageTemplate(performative=pending[n].performative) for n in order]
+    line = '%7d pending, %5d conversations:' % (count, conversations)
+    if count <= naive_limit:
+        line += ' naive scan %8.2f us/receive ' % (naive(pending, templates) / count * 1e6)
+    line += ' conversation index %6.2f us/receive  performative index %6.2f us/receive' \
+            '  plain %5.2f us/receive' % (indexed(pending, templates) / count * 1e6,
+                                          indexed(pending, by_performative) / count * 1e6,
+                                          plain(pending) / count * 1e6)
+    print(line)
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 50000])
+    arg_parser.add_argument('--conversations', type=int, default=1000)
+    arg_parser.add_argument('--naive-limit', type=int, default=10000,
+                            help='skip the quadratic naive scan above this mailbox depth')
+    args = arg_parser.parse_args(args=argv[1:])
+    for count in args.counts:
+        bench(count, args.conversations, args.naive_limit)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
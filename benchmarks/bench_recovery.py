@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""AMS directory recovery benchmark
+
+Populate a durable white pages directory then measure the cold start of a
+platform from the snapshot, from the write-ahead log alone, and the
+re-registration of every agent it replaces.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.aid import AID
+from copdai_core.commun import AgentState
+from copdai_core.directory import AgentDirectory, AMSAgentDescription
+from copdai_core.persistence import DurableAgentDirectory
+
+
+def descriptions(count):
+    states = (AgentState.ACTIVE, AgentState.SUSPENDED, AgentState.WAITING)
+    for i in range(count):
+        yield AMSAgentDescription(name=AID('agent%d' % i, '0A1B2C3D4E5F'), state=states[i % 3], platform_id=1,
+                                  addresses=('tcp://10.0.%d.%d:7000' % (i // 256 % 256, i % 256),))
+
+
+def populate(path, count, fsync):
+    directory = DurableAgentDirectory.open(path, fsync=fsync, snapshot_every=count * 10)
+    start = time.perf_counter()
+    for description in descriptions(count):
+        directory.register(description)
+    directory.close()
+    return time.perf_counter() - start
+
+
+def cold_start(path):
+    start = time.perf_counter()
+    directory = DurableAgentDirectory.open(path)
+    elapsed = time.perf_counter() - start
+    size = len(directory)
+    return directory, size, elapsed
+
+
+def bench(count, fsync):
+    with tempfile.TemporaryDirectory() as path:
+        logged = populate(path, count, fsync)
+        directory, size, from_log = cold_start(path)
+        assert size == count
+        directory.journal.snapshot()
+        directory.close()
+        directory, size, from_snapshot = cold_start(path)
+        assert size == count
+        directory.close()
+
+    start = time.perf_counter()
+    directory = AgentDirectory()
+    for description in descriptions(count):
+        directory.register(description)
+    reregister = time.perf_counter() - start
+
+    print('%8d agents: logged registration %6.2f s  cold start from log %6.2f s  from snapshot %6.2f s'
+          '  in-memory re-registration %6.2f s' % (count, logged, from_log, from_snapshot, reregister))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--counts', type=int, nargs='+', default=[100000, 1000000])
+    arg_parser.add_argument('--no-fsync', action='store_true')
+    args = arg_parser.parse_args(args=argv[1:])
+    for count in args.counts:
+        bench(count, not args.no_fsync)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Agent runtime benchmark
+
+Memory footprint of idle agents hosted as coroutines (agents per GB) and
+context switch latency of two agents playing ping-pong through the MTS.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+
+class IdleAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        await self.receive_async()
+
+    def teardown(self):
+        pass
+
+
+class PingPongAgent(AbstractAgent):
+
+    __slots__ = ['peer', 'mts', 'rounds']
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        for _ in range(self.rounds):
+            message = await self.receive_async()
+            self.mts.deliverMessage(self.peer, message + 1)
+
+    def teardown(self):
+        pass
+
+
+async def agents_per_gb(count):
+    platform = AgentPlatform('AP')
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    agents = [IdleAgent(platform_id=1) for _ in range(count)]
+    for agent in agents:
+        platform.runtime.spawn(agent)
+    await asyncio.sleep(0)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for agent in agents:
+        platform.runtime.quit(agent)
+    await platform.runtime.join()
+    per_agent = (after - before) / float(count)
+    print('%8d idle agents: %6.0f bytes/agent  %10.0f agents/GB' % (count, per_agent, (1 << 30) / per_agent))
+
+
+async def context_switch(rounds):
+    platform = AgentPlatform('AP')
+    ping = PingPongAgent(platform_id=1)
+    pong = PingPongAgent(platform_id=1)
+    for agent, peer in ((ping, pong), (pong, ping)):
+        agent.peer, agent.mts, agent.rounds = peer, platform.mts, rounds
+        platform.runtime.spawn(agent)
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    platform.mts.deliverMessage(ping, 0)
+    await platform.runtime.join()
+    elapsed = time.perf_counter() - start
+    print('%8d round trips: %6.2f us per context switch' % (rounds, elapsed / (2 * rounds) * 1e6))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--rounds', type=int, default=100000)
+    args = arg_parser.parse_args(args=argv[1:])
+    for count in args.agents:
+        asyncio.run(agents_per_gb(count))
+    asyncio.run(context_switch(args.rounds))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
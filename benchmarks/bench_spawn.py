@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Agent spawn rate benchmark
+
+Create a population of simulation agents through the AMS, one create call
+per agent against one create_all call for the whole population, from the
+agent class, from its module path and from a list of parameter sets, then
+invoke them in the platform runtime. With --state-directory the white
+pages are journaled, one registration transaction per create_all.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core.mas import AbstractAgent, AgentPlatform
+
+PATH = '%s:SimulationAgent' % __name__
+
+
+class SimulationAgent(AbstractAgent):
+
+    __slots__ = ['cell']
+
+    def __init__(self, cell=0, name=None):
+        super().__init__(name=name)
+        self.cell = cell
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+def one_by_one(platform, agents):
+    create = platform.ams.create
+    return [create(SimulationAgent) for _ in range(agents)]
+
+
+def one_by_one_path(platform, agents):
+    create = platform.ams.create
+    return [create(PATH) for _ in range(agents)]
+
+
+def bulk(platform, agents):
+    return platform.ams.create_all(SimulationAgent, agents)
+
+
+def bulk_path(platform, agents):
+    return platform.ams.create_all(PATH, agents)
+
+
+def bulk_parameters(platform, agents):
+    return platform.ams.create_all(PATH, parameters=[{'cell': n} for n in range(agents)])
+
+
+MODES = [('create', one_by_one), ('create path', one_by_one_path), ('create_all', bulk),
+         ('create_all path', bulk_path), ('create_all parameters', bulk_parameters)]
+
+
+async def invoke(platform, aids):
+    start = time.perf_counter()
+    platform.ams.invoke_all(aids)
+    # every agent ran its life cycle once
+    await platform.runtime.join()
+    return time.perf_counter() - start
+
+
+def bench(agents, state_directory, invoked, repeat):
+    for label, create in MODES:
+        best = None
+        running = None
+        for run in range(repeat):
+            options = {}
+            if state_directory is not None:
+                options['state_directory'] = tempfile.mkdtemp(dir=state_directory)
+            platform = AgentPlatform('bench', **options)
+            start = time.perf_counter()
+            aids = create(platform, agents)
+            elapsed = time.perf_counter() - start
+            assert len(aids) == agents
+            best = elapsed if best is None else min(best, elapsed)
+            if invoked and run == repeat - 1:
+                running = asyncio.run(invoke(platform, aids))
+            platform.close()
+        line = '%8d agents %-22s %8.3f s %10.0f agents/s' % (agents, label, best, agents / best)
+        if running is not None:
+            line += '  invoked and run %8.3f s' % running
+        print(line)
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, nargs='+', default=[1000, 100000])
+    arg_parser.add_argument('--state-directory', action='store_true', help='journal the white pages in a temporary '
+                                                                           'directory')
+    arg_parser.add_argument('--invoke', action='store_true', help='also invoke the agents in the runtime')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='best of this many runs')
+    args = arg_parser.parse_args(args=argv[1:])
+    state_directory = tempfile.mkdtemp() if args.state_directory else None
+    try:
+        for agents in args.agents:
+            bench(agents, state_directory, args.invoke, args.repeat)
+    finally:
+        if state_directory is not None:
+            shutil.rmtree(state_directory)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
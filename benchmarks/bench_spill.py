@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Mailbox spill benchmark
+
+Buffer a growing backlog in the mailboxes of agents that do not consume
+and compare the heap it takes when queued in memory, spilled to a file per
+mailbox and spilled to the memory-mapped segments shared by the platform,
+then the replay rate of each tier.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from copdai_core import acl
+from copdai_core.aid import AID
+from copdai_core.mailbox import Mailbox, OverflowPolicy
+from copdai_core.segments import SegmentStore
+
+
+def mailboxes(tier, count, capacity, backlog):
+    if tier == 'memory':
+        return [Mailbox(backlog, OverflowPolicy.DROP_NEWEST) for _ in range(count)], None
+    if tier == 'file':
+        return [Mailbox(capacity, OverflowPolicy.SPILL) for _ in range(count)], None
+    store = SegmentStore()
+    return [Mailbox(capacity, OverflowPolicy.SPILL, spill=store.queue()) for _ in range(count)], store
+
+
+def bench(tier, agents, backlog, capacity):
+    boxes, store = mailboxes(tier, agents, capacity, backlog)
+    message = acl.ACLMessage(acl.Performative.INFORM, receivers=[AID('sink', '0A1B2C3D4E5F')], content=b'x' * 128)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(backlog):
+        for box in boxes:
+            box.put(message)
+    buffered = time.perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    count = 0
+    for box in boxes:
+        count += len(box.drain())
+    replayed = time.perf_counter() - start
+    assert count == agents * backlog
+    segments = store.created if store is not None else 0
+    for box in boxes:
+        box.close()
+    if store is not None:
+        store.close()
+    print('%-8s %5d agents x %6d messages: buffer %9.0f msg/s  replay %9.0f msg/s  heap %8.2f MiB'
+          '  segments %d' % (tier, agents, backlog, count / buffered, count / replayed, heap / float(1 << 20),
+                             segments))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--agents', type=int, default=100)
+    arg_parser.add_argument('--backlogs', type=int, nargs='+', default=[1000, 10000])
+    arg_parser.add_argument('--capacity', type=int, default=64)
+    arg_parser.add_argument('--tiers', nargs='+', choices=['memory', 'file', 'segments'],
+                            default=['memory', 'file', 'segments'])
+    args = arg_parser.parse_args(args=argv[1:])
+    for backlog in args.backlogs:
+        for tier in args.tiers:
+            bench(tier, args.agents, backlog, args.capacity)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
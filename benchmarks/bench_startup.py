@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Startup benchmark
+
+Import time of the copdai_core modules as reported by python -X importtime,
+with the modules costing the most, then the wall time of python -m
+copdai_core and of starting a container worker process that hosts agents,
+against a bare interpreter.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+
+def _run(arguments):
+    environment = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable] + arguments, cwd=ROOT, env=environment, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, check=True, universal_newlines=True)
+
+
+def import_times(module):
+    """
+    :param module: name of the module imported
+    :return: dict of module name -> (self us, cumulative us)
+    """
+    times = {}
+    for line in _run(['-X', 'importtime', '-c', 'import %s' % module]).stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def wall(arguments, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run(arguments)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def worker_start(repeat, start_method):
+    from copdai_core.container import AgentContainer
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        container = AgentContainer('AP', workers=1, start_method=start_method)
+        container.start()
+        # the worker answers once its platform runs
+        container.join(timeout=30)
+        elapsed = time.perf_counter() - start
+        container.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--module', default='copdai_core.mas')
+    arg_parser.add_argument('--top', type=int, default=10, help='number of the costliest modules listed')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='best of this many runs')
+    arg_parser.add_argument('--start-method', default='spawn', help='multiprocessing start method of the worker')
+    args = arg_parser.parse_args(args=argv[1:])
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    print('import %s: %7.2f ms' % (args.module, best[args.module][1] / 1e3))
+    ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (own, cumulative) in ranked:
+        print('  %-32s self %7.2f ms  cumulative %7.2f ms' % (name, own / 1e3, cumulative / 1e3))
+
+    bare = wall(['-c', 'pass'], args.repeat)
+    print('python -c pass            %7.2f ms' % (bare * 1e3))
+    for label, arguments in (('python -c import %s' % args.module, ['-c', 'import %s' % args.module]),
+                             ('python -m copdai_core -V', ['-m', 'copdai_core', '-V'])):
+        elapsed = wall(arguments, args.repeat)
+        print('%-25s %7.2f ms  (+%.2f ms)' % (label, elapsed * 1e3, (elapsed - bare) * 1e3))
+    elapsed = worker_start(args.repeat, args.start_method)
+    print('%-25s %7.2f ms' % ('worker start (%s)' % args.start_method, elapsed * 1e3))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
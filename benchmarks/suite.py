@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""Core platform benchmark suite
+
+Run the benchmarks of the core platform and write their timings as JSON,
+then compare two result files to flag the regressions between two commits:
+
+    python benchmarks/suite.py run -o before.json
+    python benchmarks/suite.py run -o after.json
+    python benchmarks/suite.py compare before.json after.json
+
+Like pyperf, every benchmark runs in several fresh worker processes, so one
+unlucky process does not decide the result: the first one calibrates the
+number of loops to last min_time, each one warms up before taking its
+values. A value is the mean time of one iteration over those loops.
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import fnmatch
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from copdai_core import acl
+from copdai_core.acl import ACLMessage, Performative
+from copdai_core.commun import AgentState
+from copdai_core.directory import AMSAgentDescription
+from copdai_core.mas import AbstractAgent, AgentPlatform, MessageTransportService
+
+from bench_acl import make_message
+from bench_df import make_description, make_template
+from bench_mts import EchoAgent
+
+FORMAT_VERSION = 1
+
+# name -> setup function returning (time function of the loops, close function or None)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class BenchAgent(AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+@benchmark('agent_construction')
+def agent_construction():
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            BenchAgent(platform_id=1)
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('lifecycle_suspend_resume')
+def lifecycle_suspend_resume(agents=1000):
+    platform = AgentPlatform('bench')
+    population = []
+    for _ in range(agents):
+        agent = BenchAgent(platform_id=1)
+        platform.ams.create(agent)
+        # hosted without a task, only the transitions and the AMS following them are measured
+        agent._runtime = platform.runtime
+        agent.invoke()
+        population.append(agent)
+    platform.runtime.transitions.flush()
+
+    def run(loops):
+        start = time.perf_counter()
+        for n in range(loops):
+            agent = population[n % agents]
+            agent.suspend()
+            agent.resume()
+        platform.runtime.transitions.flush()
+        return time.perf_counter() - start
+    return run, None
+
+
+def _ams(agents):
+    platform = AgentPlatform('bench')
+    states = (AgentState.ACTIVE, AgentState.SUSPENDED, AgentState.WAITING)
+    for n in range(agents):
+        platform.ams.register(AMSAgentDescription(name='agent%d@bench' % n, state=states[n % len(states)],
+                                                  platform_id='bench'))
+    return platform.ams
+
+
+@benchmark('ams_register')
+def ams_register(agents=10000):
+    ams = _ams(agents)
+    descriptions = [AMSAgentDescription(name='new%d@bench' % n, state=AgentState.ACTIVE, platform_id='bench')
+                    for n in range(1000)]
+
+    def run(loops):
+        start = time.perf_counter()
+        for n in range(loops):
+            description = descriptions[n % 1000]
+            ams.register(description)
+            ams.deregister(description.name)
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('ams_search')
+def ams_search(agents=10000):
+    ams = _ams(agents)
+    templates = [AMSAgentDescription(state=AgentState.SUSPENDED), AMSAgentDescription(name='agent7@bench'),
+                 AMSAgentDescription(state=AgentState.WAITING, platform_id='bench')]
+
+    def run(loops):
+        start = time.perf_counter()
+        for n in range(loops):
+            ams.search(templates[n % 3], 10)
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('df_search')
+def df_search(services=10000):
+    rng = random.Random(services)
+    df = AgentPlatform('bench').df
+    for n in range(services):
+        df.register(make_description(n, rng))
+    templates = [make_template(rng) for _ in range(1000)]
+
+    def run(loops):
+        start = time.perf_counter()
+        for n in range(loops):
+            df.search(templates[n % 1000], 10)
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('acl_encode')
+def acl_encode(content_size=1024):
+    message = make_message(content_size)
+    encode = acl.encode
+
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            encode(message)
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('acl_decode')
+def acl_decode(content_size=1024):
+    data = acl.encode(make_message(content_size))
+    decode = acl.decode
+
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            decode(data)
+        return time.perf_counter() - start
+    return run, None
+
+
+def _local_delivery(fanout):
+    mts = MessageTransportService(capacity=1024)
+    agents = [BenchAgent(platform_id=1) for _ in range(fanout)]
+    for agent in agents:
+        mts.attach(agent)
+        agent.invoke()
+    message = ACLMessage(Performative.INFORM, receivers=[agent.aid for agent in agents], content=b'x' * 1024)
+
+    def run(loops):
+        send = mts.send
+        start = time.perf_counter()
+        for _ in range(loops):
+            send(message)
+            for agent in agents:
+                agent.receive()
+        return time.perf_counter() - start
+    return run, None
+
+
+@benchmark('mts_local_delivery')
+def mts_local_delivery():
+    return _local_delivery(1)
+
+
+@benchmark('mts_local_multicast_16')
+def mts_local_multicast_16():
+    return _local_delivery(16)
+
+
+@benchmark('container_round_trip')
+def container_round_trip():
+    container = AgentPlatform('bench').container(workers=1)
+    container.start()
+    aid = container.spawn(EchoAgent, 'echo')
+    message = ACLMessage(Performative.INFORM, sender=container.aid, receivers=(aid,), content=b'x' * 1024)
+    container.send(message)
+    container.receive(timeout=10)
+
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            container.send(message)
+            container.receive(timeout=10)
+        return time.perf_counter() - start
+    return run, container.stop
+
+
+def calibrate(run, min_time):
+    loops = 1
+    while True:
+        if run(loops) >= min_time or loops >= 1 << 24:
+            return loops
+        loops *= 2
+
+
+def worker(name, loops, warmups, values, min_time):
+    """
+    Body of a worker process
+    :return: dict of the loops and the seconds per iteration of every value
+    """
+    run, close = BENCHMARKS[name]()
+    try:
+        if not loops:
+            loops = calibrate(run, min_time)
+        for _ in range(warmups):
+            run(loops)
+        return {'loops': loops, 'values': [run(loops) / loops for _ in range(values)]}
+    finally:
+        if close is not None:
+            close()
+
+
+def run_benchmark(name, args):
+    loops = 0
+    values = []
+    for _ in range(args.processes):
+        command = [sys.executable, os.path.abspath(__file__), 'worker', name, '--loops', str(loops),
+                   '--warmups', str(args.warmups), '--values', str(args.values), '--min-time', str(args.min_time)]
+        result = json.loads(subprocess.check_output(command, universal_newlines=True))
+        # the first worker calibrates, the others run the same number of loops
+        loops = result['loops']
+        values.extend(result['values'])
+    return {'name': name, 'unit': 'second', 'loops': loops, 'values': values}
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL,
+                                         universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'date': datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z',
+            'python': '%s %s' % (platform.python_implementation(), platform.python_version()),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+
+def mean(values):
+    return sum(values) / len(values)
+
+
+def stdev(values):
+    if len(values) < 2:
+        return 0.0
+    average = mean(values)
+    return math.sqrt(sum((value - average) ** 2 for value in values) / (len(values) - 1))
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '%.2f %s' % (seconds / scale, unit)
+    return '%.1f ns' % (seconds * 1e9)
+
+
+def significant(base, changed):
+    """
+    Welch t-test at about 95 %, as pyperf does before calling a change significant
+    :return: True when the difference of the means is unlikely to be noise
+    """
+    if len(base) < 2 or len(changed) < 2:
+        return True
+    error = math.sqrt(stdev(base) ** 2 / len(base) + stdev(changed) ** 2 / len(changed))
+    if not error:
+        return mean(base) != mean(changed)
+    return abs(mean(changed) - mean(base)) / error > 2.0
+
+
+def compare(base, changed, threshold):
+    """
+    :param base: results of the reference commit
+    :param changed: results of the commit judged
+    :param threshold: relative slowdown of the median tolerated, 0.05 for 5 %
+    :return: list of (name, base median, changed median, ratio, verdict)
+    """
+    reference = dict((result['name'], result) for result in base['benchmarks'])
+    rows = []
+    for result in changed['benchmarks']:
+        before = reference.get(result['name'])
+        if before is None:
+            continue
+        old, new = median(before['values']), median(result['values'])
+        ratio = new / old
+        if not significant(before['values'], result['values']) or abs(ratio - 1) <= threshold:
+            verdict = 'same'
+        else:
+            verdict = 'slower' if ratio > 1 else 'faster'
+        rows.append((result['name'], old, new, ratio, verdict))
+    return rows
+
+
+def command_run(args):
+    names = [name for name in BENCHMARKS if any(fnmatch.fnmatch(name, pattern) for pattern in args.benchmarks)]
+    if not names:
+        print('no benchmark matches %s' % ' '.join(args.benchmarks), file=sys.stderr)
+        return 2
+    results = {'version': FORMAT_VERSION, 'metadata': metadata(), 'benchmarks': []}
+    for name in names:
+        result = run_benchmark(name, args)
+        results['benchmarks'].append(result)
+        print('%-26s %12s +- %-10s (%d values, %d loops)' % (
+            name, _format_time(mean(result['values'])), _format_time(stdev(result['values'])),
+            len(result['values']), result['loops']), file=sys.stderr)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=1)
+    return 0
+
+
+def command_compare(args):
+    with open(args.base) as base, open(args.changed) as changed:
+        base, changed = json.load(base), json.load(changed)
+    print('%s -> %s' % (base['metadata'].get('commit'), changed['metadata'].get('commit')))
+    regressions = 0
+    for name, old, new, ratio, verdict in compare(base, changed, args.threshold):
+        print('%-26s %12s -> %-12s %6.2fx  %s' % (name, _format_time(old), _format_time(new), ratio, verdict))
+        if verdict == 'slower':
+            regressions += 1
+    return 1 if regressions else 0
+
+
+def command_worker(args):
+    json.dump(worker(args.name, args.loops, args.warmups, args.values, args.min_time), sys.stdout)
+    return 0
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(prog=argv[0], description=__doc__.splitlines()[0])
+    commands = arg_parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run.add_argument('benchmarks', nargs='*', default=['*'], help='names or patterns, all by default')
+    run.add_argument('-o', '--output', help='result file, standard output by default')
+    run.add_argument('--processes', type=int, default=5, help='worker processes per benchmark')
+    run.add_argument('--values', type=int, default=3, help='values per worker process')
+    run.add_argument('--warmups', type=int, default=1, help='runs discarded per worker process')
+    run.add_argument('--min-time', type=float, default=0.1, help='minimum duration of a value in seconds')
+    run.add_argument('--fast', action='store_true', help='fewer processes and values, for a quick look')
+
+    comparison = commands.add_parser('compare', help='compare two result files, fails on a regression')
+    comparison.add_argument('base')
+    comparison.add_argument('changed')
+    comparison.add_argument('--threshold', type=float, default=0.05,
+                            help='relative slowdown tolerated, 0.05 by default')
+
+    commands.add_parser('list', help='list the benchmarks')
+
+    work = commands.add_parser('worker')
+    work.add_argument('name', choices=sorted(BENCHMARKS))
+    work.add_argument('--loops', type=int, default=0)
+    work.add_argument('--warmups', type=int, default=1)
+    work.add_argument('--values', type=int, default=3)
+    work.add_argument('--min-time', type=float, default=0.1)
+
+    args = arg_parser.parse_args(args=argv[1:])
+    if args.command == 'run':
+        if args.fast:
+            args.processes, args.values, args.min_time = 2, 2, 0.05
+        return command_run(args)
+    if args.command == 'compare':
+        return command_compare(args)
+    if args.command == 'worker':
+        return command_worker(args)
+    if args.command == 'list':
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+    arg_parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
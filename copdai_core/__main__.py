@@ -5,14 +5,11 @@
 from __future__ import print_function
 
 import argparse
-
-import metadata
-
 import sys
-import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from copdai_core.mas import Agent
+# only the metadata is needed to answer, the platform modules are not imported
+from copdai_core import metadata
+
 
 def main(argv):
     """Program entry point.
@@ -48,8 +45,6 @@ URL: <{url}>
     arg_parser.parse_args(args=argv[1:])
 
     print(epilog)
-    a = Agent()
-    print(a.state)
     return 0
 
 
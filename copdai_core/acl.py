@@ -0,0 +1,336 @@
+import struct
+from enum import Enum, unique
+from operator import attrgetter
+
+
+@unique
+class Performative(Enum):
+    """FIPA communicative acts (see [FIPA00037])"""
+
+    ACCEPT_PROPOSAL = 1
+    AGREE = 2
+    CANCEL = 3
+    CFP = 4
+    CONFIRM = 5
+    DISCONFIRM = 6
+    FAILURE = 7
+    INFORM = 8
+    INFORM_IF = 9
+    INFORM_REF = 10
+    NOT_UNDERSTOOD = 11
+    PROPAGATE = 12
+    PROPOSE = 13
+    PROXY = 14
+    QUERY_IF = 15
+    QUERY_REF = 16
+    REFUSE = 17
+    REJECT_PROPOSAL = 18
+    REQUEST = 19
+    REQUEST_WHEN = 20
+    REQUEST_WHENEVER = 21
+    SUBSCRIBE = 22
+
+
+class ACLMessage(object):
+    """
+    FIPA ACL message (see [FIPA00061]).
+    Agents are identified by their AID, the content is either a str or a
+    bytes-like object; a decoded binary content is a memoryview on the
+    received buffer.
+    """
+
+    __slots__ = ['performative', 'sender', 'receivers', 'reply_to', 'content', 'language', 'encoding',
+                 'ontology', 'protocol', 'conversation_id', 'reply_with', 'in_reply_to', 'reply_by']
+
+    def __init__(self, performative, sender=None, receivers=(), content=None, reply_to=(), language=None,
+                 encoding=None, ontology=None, protocol=None, conversation_id=None, reply_with=None,
+                 in_reply_to=None, reply_by=None):
+        self.performative = performative
+        self.sender = sender
+        self.receivers = tuple(receivers)
+        self.reply_to = tuple(reply_to)
+        self.content = content
+        self.language = language
+        self.encoding = encoding
+        self.ontology = ontology
+        self.protocol = protocol
+        self.conversation_id = conversation_id
+        self.reply_with = reply_with
+        self.in_reply_to = in_reply_to
+        # reply deadline as a time.time() timestamp
+        self.reply_by = reply_by
+
+    def __repr__(self):
+        return 'ACLMessage(%s, sender=%r, receivers=%r, conversation_id=%r)' % (
+            self.performative.name, self.sender, self.receivers, self.conversation_id)
+
+    def __eq__(self, other):
+        if not isinstance(other, ACLMessage):
+            return NotImplemented
+        for name in self.__slots__:
+            if getattr(self, name) != getattr(other, name):
+                return False
+        return True
+
+    __hash__ = None
+
+    def create_reply(self, performative, content=None, sender=None):
+        """
+        :param performative: Performative of the reply
+        :param content: content of the reply
+        :param sender: AID of the agent replying, usually the receiver of this message
+        :return: ACLMessage addressed to the reply-to agents or the sender, in the same conversation
+        """
+        return ACLMessage(performative, sender=sender, receivers=self.reply_to or (self.sender,), content=content,
+                          language=self.language, encoding=self.encoding, ontology=self.ontology,
+                          protocol=self.protocol, conversation_id=self.conversation_id,
+                          in_reply_to=self.reply_with)
+
+
+class MessageTemplate(object):
+    """
+    Pattern selecting messages out of a mailbox.
+    Every field left to None is a wildcard, the predicate is an optional
+    callable taking the message. The template is compiled once into its
+    match function: the fields it sets are fetched by a single attrgetter
+    and compared as one tuple. A mailbox uses the conversation_id and the
+    performative of a template to look in its indexes instead of scanning.
+    """
+
+    __slots__ = ['performative', 'sender', 'conversation_id', 'ontology', 'protocol', 'language', 'encoding',
+                 'in_reply_to', 'reply_with', 'predicate', 'match']
+
+    # fields in the order they are compared, the most selective first
+    _FIELDS = ('conversation_id', 'in_reply_to', 'performative', 'sender', 'reply_with', 'protocol', 'ontology',
+               'language', 'encoding')
+
+    def __init__(self, performative=None, sender=None, conversation_id=None, ontology=None, protocol=None,
+                 language=None, encoding=None, in_reply_to=None, reply_with=None, predicate=None):
+        self.performative = performative
+        self.sender = sender
+        self.conversation_id = conversation_id
+        self.ontology = ontology
+        self.protocol = protocol
+        self.language = language
+        self.encoding = encoding
+        self.in_reply_to = in_reply_to
+        self.reply_with = reply_with
+        self.predicate = predicate
+        # message -> bool
+        self.match = self._compile()
+
+    def __repr__(self):
+        fields = ', '.join('%s=%r' % (name, getattr(self, name)) for name in self._FIELDS
+                           if getattr(self, name) is not None)
+        return 'MessageTemplate(%s)' % fields
+
+    def _compile(self):
+        names = tuple(name for name in self._FIELDS if getattr(self, name) is not None)
+        predicate = self.predicate
+        if not names:
+            if predicate is None:
+                return _match_any
+            return predicate
+        getter = attrgetter(*names)
+        # attrgetter of one name returns the value itself, of several a tuple
+        expected = tuple(getattr(self, name) for name in names) if len(names) > 1 else getattr(self, names[0])
+        if predicate is None:
+            return _match_fields(getter, expected)
+        return _match_fields_and(getter, expected, predicate)
+
+
+def _match_any(message):
+    return True
+
+
+def _match_fields(getter, expected):
+    def match(message):
+        try:
+            return getter(message) == expected
+        except AttributeError:
+            return False
+    return match
+
+
+def _match_fields_and(getter, expected, predicate):
+    def match(message):
+        try:
+            if getter(message) != expected:
+                return False
+        except AttributeError:
+            return False
+        return predicate(message)
+    return match
+
+
+# Binary frame layout, every integer in network byte order:
+#   u32 frame length (excluding itself) | u8 codec version | u8 performative | u8 content kind
+#   8 optional strings (sender, language, encoding, ontology, protocol, conversation-id, reply-with, in-reply-to)
+#   u32 count + strings for receivers then reply-to | f64 reply-by (NaN when unset) | u32 length + content
+# A string is a u8 flag, NO_STRING marks None, else STRING followed by a u32 length and the UTF-8 bytes.
+VERSION = 2
+_FRAME = struct.Struct('!IBBB')
+_U8 = struct.Struct('!B')
+_U32 = struct.Struct('!I')
+_STRING = struct.Struct('!BI')
+_F64 = struct.Struct('!d')
+NO_STRING = 0
+STRING = 1
+_NONE = _U8.pack(NO_STRING)
+_STRING_FIELDS = ('sender', 'language', 'encoding', 'ontology', 'protocol', 'conversation_id', 'reply_with',
+                  'in_reply_to')
+
+_CONTENT_NONE = 0
+_CONTENT_BYTES = 1
+_CONTENT_STR = 2
+
+_PERFORMATIVES = dict((performative.value, performative) for performative in Performative)
+_NAN = float('nan')
+
+
+def encode(message):
+    """
+    Serialize a message into a length prefixed binary frame
+    :param message: ACLMessage
+    :return: bytes of the frame
+    """
+    parts = [None]
+    append = parts.append
+    for name in _STRING_FIELDS:
+        _pack_string(append, getattr(message, name))
+    for agents in (message.receivers, message.reply_to):
+        append(_U32.pack(len(agents)))
+        for aid in agents:
+            _pack_string(append, aid)
+    append(_F64.pack(message.reply_by if message.reply_by is not None else _NAN))
+
+    content = message.content
+    if content is None:
+        kind = _CONTENT_NONE
+        append(_U32.pack(0))
+    else:
+        if isinstance(content, str):
+            kind = _CONTENT_STR
+            content = content.encode('utf-8')
+        else:
+            kind = _CONTENT_BYTES
+        append(_U32.pack(len(content)))
+        append(content)
+
+    size = _FRAME.size - _U32.size
+    for part in parts[1:]:
+        size += len(part)
+    parts[0] = _FRAME.pack(size, VERSION, message.performative.value, kind)
+    return b''.join(parts)
+
+
+def decode(buffer, offset=0):
+    """
+    Deserialize one frame, a binary content is not copied
+    :param buffer: bytes-like object holding the frame
+    :param offset: position of the frame in the buffer
+    :return: ACLMessage
+    """
+    return decode_from(memoryview(buffer), offset)[0]
+
+
+def iter_decode(buffer):
+    """
+    Deserialize a sequence of concatenated frames
+    :param buffer: bytes-like object holding the frames
+    :return: generator of ACLMessage
+    """
+    view = memoryview(buffer)
+    offset = 0
+    end = len(view)
+    while offset < end:
+        message, offset = decode_from(view, offset)
+        yield message
+
+
+def decode_from(view, offset):
+    """
+    :param view: memoryview holding the frame
+    :param offset: position of the frame in the view
+    :return: tuple of the ACLMessage and the offset following the frame
+    :raise ValueError: when the frame is truncated or corrupted
+    """
+    if len(view) - offset < _FRAME.size:
+        raise ValueError('Truncated ACL frame')
+    size, version, performative, kind = _FRAME.unpack_from(view, offset)
+    if version != VERSION:
+        raise ValueError('Unsupported ACL codec version %d' % version)
+    end = offset + _U32.size + size
+    if end > len(view):
+        raise ValueError('Truncated ACL frame')
+    try:
+        return _decode_body(view[:end], offset + _FRAME.size, performative, kind), end
+    except (struct.error, IndexError):
+        # a fixed size field runs past the end of the frame
+        raise ValueError('Truncated ACL frame') from None
+    except KeyError:
+        raise ValueError('Unknown ACL performative %d' % performative) from None
+
+
+def _decode_body(view, position, performative, kind):
+    # the view ends with the frame, the fields must not run past it
+    message = ACLMessage.__new__(ACLMessage)
+    message.performative = _PERFORMATIVES[performative]
+    unpack_string = _unpack_string
+    message.sender, position = unpack_string(view, position)
+    message.language, position = unpack_string(view, position)
+    message.encoding, position = unpack_string(view, position)
+    message.ontology, position = unpack_string(view, position)
+    message.protocol, position = unpack_string(view, position)
+    message.conversation_id, position = unpack_string(view, position)
+    message.reply_with, position = unpack_string(view, position)
+    message.in_reply_to, position = unpack_string(view, position)
+    message.receivers, position = _unpack_agents(view, position)
+    message.reply_to, position = _unpack_agents(view, position)
+    reply_by, = _F64.unpack_from(view, position)
+    message.reply_by = None if reply_by != reply_by else reply_by
+    position += _F64.size
+
+    length, = _U32.unpack_from(view, position)
+    position += _U32.size
+    if position + length != len(view):
+        raise ValueError('Corrupted ACL frame')
+    if kind == _CONTENT_NONE:
+        message.content = None
+    elif kind == _CONTENT_STR:
+        message.content = str(view[position:position + length], 'utf-8')
+    else:
+        message.content = view[position:position + length]
+    return message
+
+
+def _pack_string(append, value):
+    if value is None:
+        append(_NONE)
+    else:
+        data = str(value).encode('utf-8')
+        append(_STRING.pack(STRING, len(data)))
+        append(data)
+
+
+def _unpack_agents(view, position):
+    count, = _U32.unpack_from(view, position)
+    position += _U32.size
+    agents = []
+    for _ in range(count):
+        aid, position = _unpack_string(view, position)
+        agents.append(aid)
+    return tuple(agents), position
+
+
+def _unpack_string(view, position):
+    if view[position] == NO_STRING:
+        return None, position + _U8.size
+    flag, length = _STRING.unpack_from(view, position)
+    if flag != STRING:
+        raise ValueError('Corrupted ACL frame')
+    position += _STRING.size
+    end = position + length
+    if end > len(view):
+        raise ValueError('Truncated ACL frame')
+    return str(view[position:end], 'utf-8'), end
@@ -0,0 +1,146 @@
+import itertools
+import os
+import sys
+
+# Identity of the local platform, computed once per process
+_local_platform_id = None
+_platform_names = {}
+# Agents created without a name get <process prefix>-<counter>, unique without drawing a uuid per agent
+_name_prefix = None
+_name_counter = itertools.count()
+
+
+def local_platform_id():
+    """
+    The platform ID in normal case will be the MAC address of current machine
+    :return: platform ID as an integer
+    """
+    global _local_platform_id
+    if _local_platform_id is None:
+        from uuid import getnode
+        _local_platform_id = getnode()
+    return _local_platform_id
+
+
+def platform_name(platform_id):
+    """
+    Colon-less MAC string of a platform, formatted once and interned
+    :param platform_id: platform ID as an integer
+    :return: platform name
+    """
+    name = _platform_names.get(platform_id)
+    if name is None:
+        name = _platform_names[platform_id] = sys.intern('%012X' % platform_id)
+    return name
+
+
+def unique_name():
+    """
+    :return: a name unique across processes and restarts of the platform
+    """
+    global _name_prefix
+    if _name_prefix is None:
+        _name_prefix = os.urandom(8).hex()
+    return '%s-%x' % (_name_prefix, next(_name_counter))
+
+
+def unique_names(count):
+    """
+    Block allocation of unique names, drawn from the counter in one pass
+    :param count: number of names
+    :return: list of count names unique across processes and restarts of the platform
+    """
+    global _name_prefix
+    if _name_prefix is None:
+        _name_prefix = os.urandom(8).hex()
+    prefix = _name_prefix + '-%x'
+    return [prefix % number for number in itertools.islice(_name_counter, count)]
+
+
+def _reset_name_prefix():
+    # a forked process draws its own prefix
+    global _name_prefix
+    _name_prefix = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_name_prefix)
+
+
+class AID(object):
+    """
+    Agent identifier (see [FIPA00023]): a name unique on its platform,
+    the platform name and the transport addresses of the agent.
+    An AID is immutable, its string form name@platform and its hash are
+    only computed on first use then cached. It compares equal to its
+    string form so either can be used as a dictionary key.
+    """
+
+    __slots__ = ['local_name', 'platform', 'addresses', '_name', '_hash']
+
+    def __init__(self, local_name, platform, addresses=()):
+        object.__setattr__(self, 'local_name', local_name)
+        object.__setattr__(self, 'platform', platform)
+        object.__setattr__(self, 'addresses', tuple(addresses))
+        object.__setattr__(self, '_name', None)
+        object.__setattr__(self, '_hash', None)
+
+    @classmethod
+    def parse(cls, name, addresses=()):
+        """
+        :param name: string form of an AID
+        :param addresses: transport addresses of the agent
+        :return: AID
+        """
+        local_name, _, platform = name.rpartition('@')
+        return cls(local_name, platform, addresses)
+
+    @property
+    def name(self):
+        name = self._name
+        if name is None:
+            name = '%s@%s' % (self.local_name, self.platform)
+            object.__setattr__(self, '_name', name)
+        return name
+
+    def __setattr__(self, key, value):
+        raise AttributeError('AID is immutable')
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return 'AID(%r)' % self.name
+
+    def __hash__(self):
+        value = self._hash
+        if value is None:
+            value = hash(self.name)
+            object.__setattr__(self, '_hash', value)
+        return value
+
+    def __eq__(self, other):
+        if other.__class__ is AID:
+            return self is other or (self.__hash__() == other.__hash__() and self.name == other.name)
+        if isinstance(other, str):
+            return self.name == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        if isinstance(other, (AID, str)):
+            return self.name < str(other)
+        return NotImplemented
+
+    def __reduce__(self):
+        return AID, (self.local_name, self.platform, self.addresses)
+
+    def with_addresses(self, addresses):
+        """
+        :param addresses: new transport addresses
+        :return: copy of the AID with other transport addresses
+        """
+        return AID(self.local_name, self.platform, addresses)
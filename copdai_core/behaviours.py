@@ -0,0 +1,617 @@
+import asyncio
+import heapq
+import inspect
+import time
+import types
+from abc import ABC, abstractmethod
+from collections import deque
+
+from copdai_core.commun import ReturnCodes, AgentState
+
+# Where a behaviour is in the scheduler of its agent
+_READY = 1
+# until a message arrives for the agent or its deadline
+_BLOCKED = 2
+# until its deadline only
+_SLEEPING = 3
+_DONE = 4
+
+
+def _now():
+    # deadlines are read on the clock of the event loop running the agents
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+class Behaviour(ABC):
+    """
+    Task of an agent, run one action step at a time by the BehaviourScheduler
+    of the agent. An action must return quickly: a behaviour waiting for a
+    message calls block, one waiting for some time calls sleep, the other
+    behaviours of the agent run meanwhile.
+    """
+
+    __slots__ = ['agent', 'parent', 'exit_code', '_status', '_started', '_deadline', '_timer', '_coroutine']
+
+    def __init__(self, agent=None):
+        # agent owning the behaviour, set when the behaviour is added to it
+        self.agent = agent
+        # FSMBehaviour the behaviour is a state of, None for a top level behaviour
+        self.parent = None
+        # value returned by on_end
+        self.exit_code = None
+        self._status = None
+        self._started = False
+        self._deadline = None
+        # entry of the scheduler timer heap while a deadline is armed
+        self._timer = None
+        self._coroutine = inspect.iscoroutinefunction(self.action)
+
+    def on_start(self):
+        """
+        Called before the first action, it may already block or sleep the behaviour
+        :return:
+        """
+
+    @abstractmethod
+    def action(self):
+        """
+        One step of the behaviour, a plain method or a coroutine function
+        :return:
+        """
+
+    @abstractmethod
+    def done(self):
+        """
+        :return: True once the behaviour is over, it is then removed from the scheduler
+        """
+
+    def on_end(self):
+        """
+        Called once the behaviour is done
+        :return: exit value, it picks the next state of an FSMBehaviour
+        """
+
+    def reset(self):
+        """Make the behaviour start over, as a state an FSMBehaviour enters again."""
+        self._started = False
+        self._deadline = None
+
+    def block(self, timeout=None):
+        """
+        Stop scheduling the behaviour after the current action, until a message
+        arrives for the agent or timeout seconds elapsed
+        :param timeout: maximum time to stay blocked in seconds, None to wait for a message only
+        :return:
+        """
+        root = self._root()
+        root._status = _BLOCKED
+        root._deadline = None if timeout is None else _now() + timeout
+
+    def sleep(self, delay):
+        """
+        Stop scheduling the behaviour after the current action for delay seconds, messages do not wake it up
+        :param delay: time in seconds
+        :return:
+        """
+        self.sleep_until(_now() + delay)
+
+    def sleep_until(self, deadline):
+        """
+        :param deadline: time of the event loop clock the behaviour is scheduled again
+        :return:
+        """
+        root = self._root()
+        root._status = _SLEEPING
+        self._deadline = root._deadline = deadline
+
+    def restart(self):
+        """Schedule a blocked or sleeping behaviour again."""
+        root = self._root()
+        if root.agent is not None and root.agent._scheduler is not None:
+            root.agent._scheduler.restart(root)
+
+    @property
+    def blocked(self):
+        return self._root()._status in (_BLOCKED, _SLEEPING)
+
+    def _root(self):
+        behaviour = self
+        while behaviour.parent is not None:
+            behaviour = behaviour.parent
+        return behaviour
+
+    def _rebase(self, skew):
+        if self._deadline is not None:
+            self._deadline += skew
+
+
+class OneShotBehaviour(Behaviour):
+    """Behaviour whose action runs once."""
+
+    __slots__ = []
+
+    def done(self):
+        return True
+
+
+class CyclicBehaviour(Behaviour):
+    """Behaviour whose action runs until the agent terminates or the behaviour is removed."""
+
+    __slots__ = []
+
+    def done(self):
+        return False
+
+
+class WakerBehaviour(Behaviour):
+    """Behaviour calling on_wake once, delay seconds after it started."""
+
+    __slots__ = ['delay', '_fired']
+
+    def __init__(self, delay, agent=None):
+        super().__init__(agent)
+        self.delay = delay
+        self._fired = False
+
+    def on_start(self):
+        self.sleep(self.delay)
+
+    def action(self):
+        self._fired = True
+        self.on_wake()
+
+    def on_wake(self):
+        """
+        Code run when the delay elapsed
+        :return:
+        """
+
+    def done(self):
+        return self._fired
+
+    def reset(self):
+        super().reset()
+        self._fired = False
+
+
+class TickerBehaviour(Behaviour):
+    """
+    Behaviour calling on_tick every period seconds until stopped.
+    Ticks are at a fixed rate: a late tick does not delay the next ones,
+    the ticks missed while the agent was busy are skipped.
+    """
+
+    __slots__ = ['period', 'ticks', '_stopped']
+
+    def __init__(self, period, agent=None):
+        super().__init__(agent)
+        self.period = period
+        self.ticks = 0
+        self._stopped = False
+
+    def on_start(self):
+        self.sleep(self.period)
+
+    def action(self):
+        # the deadline that fired is the reference of the next tick
+        tick = self._deadline
+        self.ticks += 1
+        self.on_tick()
+        if self._stopped:
+            return
+        period = self.period
+        deadline = tick + period
+        now = _now()
+        if deadline <= now:
+            deadline += ((now - deadline) // period + 1) * period
+        self.sleep_until(deadline)
+
+    def on_tick(self):
+        """
+        Code run on every tick
+        :return:
+        """
+
+    def stop(self):
+        """No more ticks, the behaviour is done after the current one."""
+        self._stopped = True
+
+    def done(self):
+        return self._stopped
+
+    def reset(self):
+        super().reset()
+        self.ticks = 0
+        self._stopped = False
+
+
+class FSMBehaviour(Behaviour):
+    """
+    Finite state machine whose states are behaviours.
+    The current state runs one step per action of the machine; once it is
+    done, the value its on_end returns is the event picking the transition
+    to the next state. The machine is done when a last state is.
+    A state blocking or sleeping blocks or sleeps the machine.
+    """
+
+    __slots__ = ['_states', '_transitions', '_defaults', '_first', '_last', '_current', '_finished']
+
+    def __init__(self, agent=None):
+        super().__init__(agent)
+        self._states = {}
+        self._transitions = {}
+        self._defaults = {}
+        self._first = None
+        self._last = set()
+        self._current = None
+        self._finished = False
+
+    @property
+    def current(self):
+        """Name of the current state"""
+        return self._current
+
+    def register_state(self, behaviour, name):
+        """
+        :param behaviour: Behaviour run in the state
+        :param name: name of the state
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        if name in self._states:
+            return ReturnCodes.ALREADY_REGISTERED
+        behaviour.parent = self
+        self._states[name] = behaviour
+        return ReturnCodes.SUCCESS
+
+    def register_first_state(self, behaviour, name):
+        code = self.register_state(behaviour, name)
+        if code is ReturnCodes.SUCCESS:
+            self._first = name
+        return code
+
+    def register_last_state(self, behaviour, name):
+        code = self.register_state(behaviour, name)
+        if code is ReturnCodes.SUCCESS:
+            self._last.add(name)
+        return code
+
+    def register_transition(self, source, destination, event):
+        """
+        :param source: name of the state left
+        :param destination: name of the state entered
+        :param event: value returned by the on_end of the source state
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED when a state is unknown
+        """
+        if source not in self._states or destination not in self._states:
+            return ReturnCodes.NOT_REGISTERED
+        self._transitions[(source, event)] = destination
+        return ReturnCodes.SUCCESS
+
+    def register_default_transition(self, source, destination):
+        """Transition taken when no transition is registered for the event returned by the source state."""
+        if source not in self._states or destination not in self._states:
+            return ReturnCodes.NOT_REGISTERED
+        self._defaults[source] = destination
+        return ReturnCodes.SUCCESS
+
+    def on_start(self):
+        for behaviour in self._states.values():
+            behaviour.agent = self.agent
+        self._enter(self._first)
+
+    async def action(self):
+        name = self._current
+        state = self._states[name]
+        if not state._started:
+            state._started = True
+            state.on_start()
+            if self._status is not _READY:
+                return
+        result = state.action()
+        if state._coroutine:
+            await result
+        if not state.done():
+            return
+        event = state.exit_code = state.on_end()
+        if name in self._last:
+            self._finished = True
+            self.exit_code = event
+            return
+        destination = self._transitions.get((name, event), self._defaults.get(name))
+        if destination is None:
+            raise ValueError('No transition from state %s on event %r' % (name, event))
+        self._enter(destination)
+
+    def on_end(self):
+        return self.exit_code
+
+    def done(self):
+        return self._finished
+
+    def reset(self):
+        super().reset()
+        self._finished = False
+        self._current = None
+
+    def _enter(self, name):
+        state = self._states[name]
+        state.reset()
+        self._current = name
+
+    def _rebase(self, skew):
+        super()._rebase(skew)
+        for behaviour in self._states.values():
+            behaviour._rebase(skew)
+
+
+class BehaviourScheduler(object):
+    """
+    Cooperative round-robin scheduler of the behaviours of one agent hosted
+    by an AgentRuntime. A ready behaviour runs one action step per turn; a
+    blocked one leaves the ready queue until a message arrives for the agent,
+    a sleeping one until its deadline, deadlines being kept in a heap. With
+    nothing ready the agent parks in its runtime until a message, a lifecycle
+    event or the earliest deadline wakes it up: there is no polling, an idle
+    agent uses no CPU. The loop yields to the other agents every quantum steps.
+    """
+
+    __slots__ = ['agent', 'quantum', 'steps', '_behaviours', '_ready', '_blocked', '_timers', '_sequence',
+                 '_current', '_arrived', '_clock']
+
+    def __init__(self, agent, quantum=64):
+        self.agent = agent
+        self.quantum = quantum
+        # total number of action steps run
+        self.steps = 0
+        # scheduled behaviours, dicts are used as insertion ordered sets
+        self._behaviours = {}
+        self._ready = deque()
+        self._blocked = {}
+        # heap of [deadline, sequence, behaviour], the behaviour is None once the timer is cancelled
+        self._timers = []
+        self._sequence = 0
+        self._current = None
+        self._arrived = False
+        # clock of the platform the agent was captured on, see run
+        self._clock = None
+
+    def __len__(self):
+        return len(self._behaviours)
+
+    def __contains__(self, behaviour):
+        return behaviour in self._behaviours
+
+    def add(self, behaviour):
+        """
+        :param behaviour: Behaviour to schedule, it starts on the next turn
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        if behaviour in self._behaviours:
+            return ReturnCodes.ALREADY_REGISTERED
+        behaviour.agent = self.agent
+        behaviour._status = _READY
+        behaviour._started = False
+        self._behaviours[behaviour] = None
+        self._ready.append(behaviour)
+        self._wake()
+        return ReturnCodes.SUCCESS
+
+    def remove(self, behaviour):
+        """
+        Unschedule a behaviour, its on_end is not called
+        :param behaviour: scheduled Behaviour
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if behaviour not in self._behaviours:
+            return ReturnCodes.NOT_REGISTERED
+        del self._behaviours[behaviour]
+        if behaviour._status is _READY and behaviour is not self._current:
+            self._ready.remove(behaviour)
+        self._blocked.pop(behaviour, None)
+        self._cancel(behaviour)
+        behaviour._status = _DONE
+        return ReturnCodes.SUCCESS
+
+    def restart(self, behaviour):
+        """
+        Schedule a blocked or sleeping behaviour again
+        :param behaviour: scheduled Behaviour
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if behaviour not in self._behaviours:
+            return ReturnCodes.NOT_REGISTERED
+        if behaviour._status is _BLOCKED or behaviour._status is _SLEEPING:
+            self._blocked.pop(behaviour, None)
+            self._cancel(behaviour)
+            behaviour._status = _READY
+            if behaviour is not self._current:
+                self._ready.append(behaviour)
+            self._wake()
+        return ReturnCodes.SUCCESS
+
+    async def run(self):
+        """
+        Run the behaviours until every one of them is done
+        :return:
+        """
+        agent = self.agent
+        runtime = agent._runtime
+        loop = asyncio.get_running_loop()
+        self._attach(loop)
+        ready = self._ready
+        timers = self._timers
+        budget = self.quantum
+        while self._behaviours:
+            if agent._state is not AgentState.ACTIVE:
+                await runtime.checkpoint(agent)
+            self._poll(loop)
+            if not ready:
+                await runtime.idle(agent, timers[0][0] if timers else None)
+                continue
+            behaviour = self._current = ready.popleft()
+            if not behaviour._started:
+                behaviour._started = True
+                behaviour.on_start()
+            if behaviour._status is _READY:
+                profiler = runtime.profiler
+                if profiler is None:
+                    result = behaviour.action()
+                    if behaviour._coroutine:
+                        await result
+                else:
+                    await self._profiled_action(profiler, behaviour)
+            self._current = None
+            self.steps += 1
+            if behaviour in self._behaviours:
+                # otherwise removed by its own action
+                self._reschedule(behaviour)
+            budget -= 1
+            if not budget:
+                budget = self.quantum
+                await asyncio.sleep(0)
+
+    def _attach(self, loop):
+        if self._clock is not None:
+            # captured on another platform, the deadlines move to the clock of this one
+            self._rebase(loop.time() - self._clock)
+        mailbox = self.agent._mailbox
+        if mailbox is not None:
+            # the runtime is woken up through the scheduler, which learns that a message arrived
+            mailbox.listener = self._message_arrived
+            self._arrived = len(mailbox) > 0
+
+    def _poll(self, loop):
+        if self._arrived:
+            self._arrived = False
+            self._restart_blocked()
+        if self._timers:
+            self._expire(loop.time())
+
+    async def _profiled_action(self, profiler, behaviour):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        result = behaviour.action()
+        if behaviour._coroutine:
+            # what runs while the action awaits is not its CPU time, it is measured across each resumed step
+            cpu = time.thread_time() - cpu
+            cpu += await _metered(result)
+        else:
+            cpu = time.thread_time() - cpu
+        profiler.account(self.agent.aid, behaviour, time.perf_counter() - wall, cpu)
+
+    def _reschedule(self, behaviour):
+        if behaviour.done():
+            self._finish(behaviour)
+            return
+        status = behaviour._status
+        if status is _READY:
+            self._ready.append(behaviour)
+            return
+        if status is _BLOCKED:
+            self._blocked[behaviour] = None
+        if behaviour._deadline is not None:
+            self._arm(behaviour)
+
+    def _finish(self, behaviour):
+        del self._behaviours[behaviour]
+        self._blocked.pop(behaviour, None)
+        self._cancel(behaviour)
+        behaviour._status = _DONE
+        behaviour.exit_code = behaviour.on_end()
+
+    def _arm(self, behaviour):
+        self._sequence += 1
+        entry = behaviour._timer = [behaviour._deadline, self._sequence, behaviour]
+        heapq.heappush(self._timers, entry)
+
+    def _cancel(self, behaviour):
+        if behaviour._timer is not None:
+            behaviour._timer[2] = None
+            behaviour._timer = None
+
+    def _expire(self, now):
+        # the deadline of the heap head wakes the agent, cancelled entries are dropped on the way
+        timers = self._timers
+        while timers:
+            entry = timers[0]
+            behaviour = entry[2]
+            if behaviour is not None and entry[0] > now:
+                break
+            heapq.heappop(timers)
+            if behaviour is not None:
+                behaviour._timer = None
+                self._blocked.pop(behaviour, None)
+                behaviour._status = _READY
+                self._ready.append(behaviour)
+
+    def _restart_blocked(self):
+        blocked = self._blocked
+        if not blocked:
+            return
+        self._blocked = {}
+        ready = self._ready
+        for behaviour in blocked:
+            self._cancel(behaviour)
+            behaviour._status = _READY
+            ready.append(behaviour)
+
+    def _message_arrived(self):
+        self._arrived = True
+        self._wake()
+
+    def _wake(self):
+        runtime = self.agent._runtime if self.agent is not None else None
+        if runtime is not None:
+            runtime.wake(self.agent)
+
+    def _rebase(self, skew):
+        self._clock = None
+        for behaviour in self._behaviours:
+            behaviour._rebase(skew)
+        for entry in self._timers:
+            entry[0] += skew
+
+    def __getstate__(self):
+        # a behaviour interrupted in the middle of its action runs it again first
+        ready = list(self._ready)
+        current = self._current
+        if current is not None and current._status is _READY and current in self._behaviours:
+            ready.insert(0, current)
+        return (self.agent, self.quantum, self.steps, self._behaviours, ready, self._blocked, self._timers,
+                self._sequence, _now())
+
+    def __setstate__(self, state):
+        (self.agent, self.quantum, self.steps, self._behaviours, ready, self._blocked, self._timers,
+         self._sequence, self._clock) = state
+        self._ready = deque(ready)
+        self._current = None
+        self._arrived = False
+
+
+@types.coroutine
+def _metered(coroutine):
+    """
+    Drive a coroutine, suspending with it
+    :return: CPU time the thread spent in the coroutine between its suspensions
+    """
+    cpu = 0.0
+    value = error = None
+    while True:
+        start = time.thread_time()
+        try:
+            future = coroutine.send(value) if error is None else coroutine.throw(error)
+        except StopIteration:
+            return cpu + time.thread_time() - start
+        cpu += time.thread_time() - start
+        value = error = None
+        try:
+            value = yield future
+        except GeneratorExit:
+            coroutine.close()
+            raise
+        except BaseException as thrown:
+            # such as the cancellation of the agent task, the coroutine handles it
+            value, error = None, thrown
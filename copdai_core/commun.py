@@ -7,3 +7,26 @@ class ReturnCodes(Enum):
 
     FATAL = 0
     SUCCESS = 1
+    # FIPA failure reasons returned by the AMS and DF management functions
+    ALREADY_REGISTERED = 2
+    NOT_REGISTERED = 3
+    # a full mailbox refused a message
+    BUFFER_OVERFLOW = 4
+    # the life cycle operation is not allowed in the current state of the agent
+    ILLEGAL_TRANSITION = 5
+
+
+@unique
+class AgentState(Enum):
+    """Normal agent life cycle FIPA specification"""
+
+    UNKNOWN = 0
+    INITIATED = 1
+    ACTIVE = 2
+    SUSPENDED = 3
+    WAITING = 4
+    TRANSIT = 5
+
+
+# protocol of the notice an agent sends to its former platform once it executes at its new location
+MOBILITY_PROTOCOL = 'copdai-agent-mobility'
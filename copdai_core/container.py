@@ -0,0 +1,456 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from collections import deque
+
+from copdai_core import acl
+from copdai_core.commun import ReturnCodes, AgentState
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RING_CAPACITY = 1 << 18
+
+
+def shard_of(aid, shards):
+    """
+    Shard hosting an agent, a stable hash so every process computes the same placement
+    :param aid: AID of the agent
+    :param shards: number of shards
+    :return: index of the shard
+    """
+    # crc32 is linear, a multiplicative mix spreads AIDs differing by a single character
+    mixed = (zlib.crc32(str(aid).encode('utf-8')) * 0x9E3779B1) & 0xFFFFFFFF
+    return (mixed >> 16) % shards
+
+
+class RingBuffer(object):
+    """
+    Single producer single consumer ring of byte records in shared memory.
+    Head and tail are monotonic byte counters, each one written by a single
+    side, so neither the producer nor the consumer takes a lock. A record is a
+    u32 length followed by the payload, padded to 8 bytes; a WRAP length tells
+    the consumer to continue at the beginning of the ring.
+    """
+
+    _COUNTER = struct.Struct('=Q')
+    _LENGTH = struct.Struct('=I')
+    # head and tail live on separate cache lines
+    _HEAD = 0
+    _TAIL = 64
+    _DATA = 128
+    WRAP = 0xFFFFFFFF
+
+    def __init__(self, name=None, capacity=DEFAULT_RING_CAPACITY):
+        from multiprocessing import shared_memory
+        capacity = _align(capacity)
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=self._DATA + capacity)
+            self._owner = True
+            self._memory.buf[:self._DATA] = bytes(self._DATA)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.name = self._memory.name
+        self.capacity = capacity
+        self._buffer = self._memory.buf
+        self._head = self._COUNTER.unpack_from(self._buffer, self._HEAD)[0]
+        self._tail = self._COUNTER.unpack_from(self._buffer, self._TAIL)[0]
+
+    def __len__(self):
+        """Number of bytes waiting to be read"""
+        return self._COUNTER.unpack_from(self._buffer, self._TAIL)[0] - \
+            self._COUNTER.unpack_from(self._buffer, self._HEAD)[0]
+
+    def write(self, payload):
+        """
+        Producer side
+        :param payload: bytes-like record
+        :return: False when the ring is full, the caller keeps the record and retries later
+        """
+        size = len(payload)
+        record = _align(self._LENGTH.size + size)
+        capacity = self.capacity
+        tail = self._tail
+        position = tail % capacity
+        contiguous = capacity - position
+        needed = record if record <= contiguous else contiguous + record
+        head = self._COUNTER.unpack_from(self._buffer, self._HEAD)[0]
+        if record > capacity or tail - head + needed > capacity:
+            return False
+        buffer = self._buffer
+        if record > contiguous:
+            self._LENGTH.pack_into(buffer, self._DATA + position, self.WRAP)
+            tail += contiguous
+            position = 0
+        start = self._DATA + position
+        self._LENGTH.pack_into(buffer, start, size)
+        buffer[start + self._LENGTH.size:start + self._LENGTH.size + size] = payload
+        self._tail = tail + record
+        # publishing the tail makes the record visible to the consumer
+        self._COUNTER.pack_into(buffer, self._TAIL, self._tail)
+        return True
+
+    def read(self, max_records=None):
+        """
+        Consumer side, records are copied out before their space is given back to the producer
+        :param max_records: maximum number of records read, None for all
+        :return: list of bytes records
+        """
+        buffer = self._buffer
+        capacity = self.capacity
+        head = self._head
+        tail = self._COUNTER.unpack_from(buffer, self._TAIL)[0]
+        records = []
+        while head < tail and (max_records is None or len(records) < max_records):
+            position = head % capacity
+            start = self._DATA + position
+            size = self._LENGTH.unpack_from(buffer, start)[0]
+            if size == self.WRAP:
+                head += capacity - position
+                continue
+            records.append(bytes(buffer[start + self._LENGTH.size:start + self._LENGTH.size + size]))
+            head += _align(self._LENGTH.size + size)
+        if head != self._head:
+            self._head = head
+            self._COUNTER.pack_into(buffer, self._HEAD, head)
+        return records
+
+    def close(self):
+        self._buffer = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+class AgentContainer(object):
+    """
+    Container mode of an AgentPlatform: the agents are sharded across worker
+    processes, one per core by default, each running its own AgentRuntime.
+    An agent lives on the shard given by the hash of its AID, so any process
+    routes a message without a lookup. Cross-shard messages are ACL encoded
+    frames written to a shared memory ring per pair of processes, only the
+    rare control commands go through pipes.
+    """
+
+    def __init__(self, uid, workers=None, ring_capacity=DEFAULT_RING_CAPACITY, platform_id=None,
+                 start_method=None):
+        from copdai_core.mas import AgentManagementSystem, agent_identifier
+        self.uid = uid
+        self.workers = workers or os.cpu_count() or 1
+        self.ring_capacity = ring_capacity
+        self._context = multiprocessing.get_context(start_method)
+        # the AMS of the container keeps the white pages of every shard
+        self.ams = AgentManagementSystem()
+        self.platform_id = platform_id if platform_id is not None else self.ams._platform_id
+        # messages sent to the container AID are routed back to the parent process
+        self.aid = agent_identifier('container', self.platform_id)
+        self._agent_identifier = agent_identifier
+        self._processes = []
+        self._connections = []
+        self._rings = {}
+        self._inbox = deque()
+        # answers of every worker to the join command, the transition reports are applied as they come
+        self._answers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Create the rings and start the workers
+        :return: ReturnCodes.SUCCESS
+        """
+        parent = self.workers
+        endpoints = range(self.workers + 1)
+        for source in endpoints:
+            for destination in endpoints:
+                if source != destination:
+                    self._rings[source, destination] = RingBuffer(capacity=self.ring_capacity)
+        for index in range(self.workers):
+            ours, theirs = self._context.Pipe()
+            names = dict(((source, destination), ring.name) for (source, destination), ring in self._rings.items()
+                         if index in (source, destination))
+            process = self._context.Process(
+                target=_worker_main, name='copdai-shard-%d' % index,
+                args=(index, self.workers, self.uid, self.platform_id, self.aid, names, self.ring_capacity, theirs))
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+            self._connections.append(ours)
+            self._answers.append(deque())
+        self._outbound = dict((destination, self._rings[parent, destination]) for destination in range(self.workers))
+        self._inbound = [self._rings[source, parent] for source in range(self.workers)]
+        return ReturnCodes.SUCCESS
+
+    def shard_of(self, aid):
+        return shard_of(aid, self.workers)
+
+    def spawn(self, agent_class, name, *args, **kwargs):
+        """
+        Create an agent on the shard owning its AID.
+        The agent is built in the worker as agent_class(*args, name=name, platform_id=..., **kwargs)
+        :param agent_class: AbstractAgent subclass importable by the workers
+        :param name: ID of the agent, unique on the platform
+        :return: AID of the agent
+        """
+        from copdai_core.directory import AMSAgentDescription
+        aid = self._agent_identifier(name, self.platform_id)
+        index = self.shard_of(aid)
+        self._connections[index].send(('spawn', agent_class, name, args, kwargs))
+        self.ams.register(AMSAgentDescription(name=aid, state=AgentState.INITIATED, platform_id=self.platform_id,
+                                              addresses=('shard://%d' % index,)))
+        return aid
+
+    def send(self, message):
+        """
+        Send a message from the parent process to agents of the shards, waiting while a ring is full
+        :param message: ACLMessage
+        :return: ReturnCodes.SUCCESS or ReturnCodes.FATAL when the worker of a receiver is dead
+        """
+        frame = acl.encode(message)
+        result = ReturnCodes.SUCCESS
+        for index in set(self.shard_of(aid) for aid in message.receivers):
+            ring = self._outbound[index]
+            process = self._processes[index]
+            while not ring.write(frame):
+                if not process.is_alive():
+                    log.warning('Worker %d is dead, a message to its agents is lost', index)
+                    result = ReturnCodes.FATAL
+                    break
+                time.sleep(0.0001)
+        return result
+
+    def sync(self):
+        """
+        Apply the transitions reported by the workers to the AMS of the container
+        :return: number of worker reports applied
+        """
+        count = 0
+        for index, connection in enumerate(self._connections):
+            while connection.poll():
+                count += self._dispatch(index, connection.recv())
+        return count
+
+    def receive(self, timeout=None):
+        """
+        Wait for a message sent by an agent to the container AID
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :return: ACLMessage or None when the timeout expired
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delay = 0.00005
+        while not self._inbox:
+            self.sync()
+            for ring in self._inbound:
+                for frame in ring.read():
+                    self._inbox.append(acl.decode(frame))
+            if self._inbox:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.001)
+        return self._inbox.popleft()
+
+    def join(self, timeout=None):
+        """
+        Wait for every agent of every shard to terminate
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :return: list of per shard statistics dicts, None for a shard that did not answer in time
+        """
+        for connection in self._connections:
+            connection.send(('join', timeout))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return [self._answer(index, deadline) for index in range(len(self._connections))]
+
+    def stop(self, timeout=5.0):
+        """
+        Terminate the agents, stop the workers and release the rings
+        :param timeout: time given to each worker to stop gracefully
+        :return: ReturnCodes.SUCCESS
+        """
+        for connection in self._connections:
+            try:
+                connection.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in self._connections:
+            connection.close()
+        for ring in self._rings.values():
+            ring.close()
+        self._processes, self._connections, self._rings, self._answers = [], [], {}, []
+        return ReturnCodes.SUCCESS
+
+    def _answer(self, index, deadline):
+        connection = self._connections[index]
+        answers = self._answers[index]
+        while not answers:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                if not connection.poll(remaining):
+                    return None
+                self._dispatch(index, connection.recv())
+            except (EOFError, OSError):
+                # the worker died
+                return None
+        return answers.popleft()
+
+    def _dispatch(self, index, answer):
+        if answer.__class__ is tuple and answer[0] == 'transitions':
+            directory = self.ams._directory
+            for name, value in answer[1]:
+                state = AgentState(value)
+                if state is AgentState.UNKNOWN:
+                    directory.deregister(name)
+                else:
+                    directory.set_state(name, state)
+            return 1
+        self._answers[index].append(answer)
+        return 0
+
+
+class _ShardWorker(object):
+    """Event loop side of a worker process."""
+
+    def __init__(self, index, shards, uid, platform_id, container_aid, ring_names, ring_capacity, connection):
+        from copdai_core.mas import AgentPlatform
+        self.index = index
+        self.shards = shards
+        self.platform_id = platform_id
+        self.container_aid = container_aid
+        self.connection = connection
+        self.platform = AgentPlatform(uid)
+        self.platform.mts.router = self.route
+        # the AMS of the container follows the states of the agents of the shard
+        self.platform.runtime.transitions.subscribe(self.transitions_published)
+        parent = shards
+        self.inbound = [RingBuffer(name, ring_capacity) for (source, destination), name in ring_names.items()
+                        if destination == index]
+        self.outbound = dict((destination if destination != parent else None, RingBuffer(name, ring_capacity))
+                             for (source, destination), name in ring_names.items() if source == index)
+        self.backlog = deque()
+        self.stats = {'shard': index, 'pid': os.getpid(), 'spawned': 0, 'received': 0, 'sent': 0}
+        self.running = True
+
+    def route(self, message, receivers):
+        """
+        MTS router of the shard: receivers hosted elsewhere get one frame per destination shard
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED when a receiver of this shard does not exist,
+                 the other receivers still get the message
+        """
+        result = ReturnCodes.SUCCESS
+        destinations = set()
+        for aid in receivers:
+            destination = None if aid == self.container_aid else shard_of(aid, self.shards)
+            if destination == self.index:
+                result = ReturnCodes.NOT_REGISTERED
+            else:
+                destinations.add(destination)
+        if not destinations:
+            return result
+        frame = acl.encode(message)
+        for destination in destinations:
+            if self.backlog or not self.outbound[destination].write(frame):
+                # full ring, keep the order and retry from the pump
+                self.backlog.append((destination, frame))
+            self.stats['sent'] += 1
+        return result
+
+    def transitions_published(self, events):
+        """
+        Subscriber of the runtime transitions of the shard, the last state of every agent goes to the parent
+        :param events: list of TransitionEvent
+        """
+        last = {}
+        for aid, previous, state in events:
+            last[str(aid)] = state.value
+        try:
+            self.connection.send(('transitions', list(last.items())))
+        except (BrokenPipeError, OSError):
+            # the parent is gone
+            pass
+
+    async def serve(self):
+        delay = 0.00005
+        while self.running:
+            busy = False
+            # the parent writes a spawn command before any frame for the new agent, so commands go first
+            while self.running and self.connection.poll():
+                await self.control(self.connection.recv())
+                busy = True
+            busy = self.pump() or busy
+            if busy:
+                delay = 0.00005
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.001)
+
+    def pump(self):
+        busy = False
+        while self.backlog:
+            destination, frame = self.backlog[0]
+            if not self.outbound[destination].write(frame):
+                break
+            self.backlog.popleft()
+            busy = True
+        deliver = self.platform.mts.deliver_local
+        for ring in self.inbound:
+            for frame in ring.read():
+                deliver(acl.decode(frame))
+                self.stats['received'] += 1
+                busy = True
+        return busy
+
+    async def control(self, command):
+        if command[0] == 'spawn':
+            agent_class, name, args, kwargs = command[1:]
+            agent = agent_class(*args, name=name, platform_id=self.platform_id, **kwargs)
+            self.platform.runtime.spawn(agent)
+            self.stats['spawned'] += 1
+        elif command[0] == 'join':
+            asyncio.ensure_future(self._join(command[1]))
+        elif command[0] == 'stop':
+            for agent in list(self.platform.runtime._tasks):
+                self.platform.runtime.quit(agent)
+            await self.platform.runtime.join(1.0)
+            self.running = False
+
+    async def _join(self, timeout):
+        code = await self.platform.runtime.join(timeout)
+        # the last transitions reach the parent before the statistics
+        self.platform.runtime.transitions.flush()
+        if code is ReturnCodes.SUCCESS:
+            self.connection.send(dict(self.stats))
+
+    def close(self):
+        for ring in self.inbound + list(self.outbound.values()):
+            ring.close()
+        self.connection.close()
+
+
+def _worker_main(index, shards, uid, platform_id, container_aid, ring_names, ring_capacity, connection):
+    worker = _ShardWorker(index, shards, uid, platform_id, container_aid, ring_names, ring_capacity, connection)
+    try:
+        asyncio.run(worker.serve())
+    finally:
+        worker.close()
+
+
+def _align(size):
+    return (size + 7) & ~7
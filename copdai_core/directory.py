@@ -0,0 +1,522 @@
+from copdai_core.commun import ReturnCodes
+
+
+class AMSAgentDescription(object):
+    """
+    Entry of the AMS white pages directory (see [FIPA00023]).
+    Every field left to None is treated as a wildcard when the
+    description is used as a search template.
+    """
+
+    __slots__ = ['name', 'ownership', 'state', 'platform_id', 'addresses']
+
+    def __init__(self, name=None, ownership=None, state=None, platform_id=None, addresses=None):
+        self.name = name
+        self.ownership = ownership
+        self.state = state
+        self.platform_id = platform_id
+        # transport addresses are kept as a tuple so the description can be indexed safely
+        self.addresses = tuple(addresses) if addresses is not None else None
+
+    def __repr__(self):
+        return 'AMSAgentDescription(name=%r, state=%r, platform_id=%r, addresses=%r)' % (
+            self.name, self.state, self.platform_id, self.addresses)
+
+
+class AgentDirectory(object):
+    """
+    In-memory white pages directory keyed by AID.
+    Secondary indexes on state, platform ID and transport address map a
+    key to the AIDs holding it, so a search only walks the smallest
+    matching index instead of every registered agent.
+    Index buckets are plain dicts used as insertion ordered sets.
+    """
+
+    __slots__ = ['_entries', '_by_state', '_by_platform', '_by_address']
+
+    def __init__(self):
+        self._entries = {}
+        self._by_state = {}
+        self._by_platform = {}
+        self._by_address = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, aid):
+        return aid in self._entries
+
+    def get(self, aid):
+        """
+        Direct lookup of a registered agent
+        :param aid: agent identifier
+        :return: the registered description or None
+        """
+        return self._entries.get(aid)
+
+    def register(self, description):
+        """
+        Add a new agent description to the directory
+        :param description: AMSAgentDescription with at least a name
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        aid = description.name
+        if aid in self._entries:
+            return ReturnCodes.ALREADY_REGISTERED
+        self._entries[aid] = description
+        self._index(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def register_many(self, descriptions):
+        """
+        Register a batch of new agents as one transaction, either all of them or none
+        :param descriptions: list of AMSAgentDescription with distinct names
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED when one of them is, nothing is registered then
+        """
+        entries = self._entries
+        names = set()
+        for description in descriptions:
+            aid = description.name
+            if aid in entries or aid in names:
+                return ReturnCodes.ALREADY_REGISTERED
+            names.add(aid)
+        self.load(descriptions)
+        return ReturnCodes.SUCCESS
+
+    def load(self, descriptions):
+        """
+        Bulk registration used to rebuild a directory, an agent already registered is replaced
+        :param descriptions: iterable of AMSAgentDescription
+        :return: number of descriptions loaded
+        """
+        entries = self._entries
+        by_state = self._by_state
+        by_platform = self._by_platform
+        by_address = self._by_address
+        count = 0
+        # consecutive descriptions mostly share their state and platform, their buckets are reused
+        state = platform_id = state_bucket = platform_bucket = None
+        for description in descriptions:
+            aid = description.name
+            if aid in entries:
+                self.deregister(aid)
+                state = platform_id = state_bucket = platform_bucket = None
+            entries[aid] = description
+            if state_bucket is None or description.state is not state:
+                state = description.state
+                state_bucket = by_state.get(state)
+                if state_bucket is None:
+                    state_bucket = by_state[state] = {}
+            state_bucket[aid] = None
+            if platform_bucket is None or description.platform_id != platform_id:
+                platform_id = description.platform_id
+                platform_bucket = by_platform.get(platform_id)
+                if platform_bucket is None:
+                    platform_bucket = by_platform[platform_id] = {}
+            platform_bucket[aid] = None
+            for address in description.addresses or ():
+                _add(by_address, address, aid)
+            count += 1
+        return count
+
+    def deregister(self, aid):
+        """
+        Remove an agent from the directory
+        :param aid: agent identifier
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        description = self._entries.pop(aid, None)
+        if description is None:
+            return ReturnCodes.NOT_REGISTERED
+        self._unindex(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def modify(self, description):
+        """
+        Replace the description of an already registered agent
+        :param description: new AMSAgentDescription of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        aid = description.name
+        previous = self._entries.get(aid)
+        if previous is None:
+            return ReturnCodes.NOT_REGISTERED
+        self._unindex(aid, previous)
+        self._entries[aid] = description
+        self._index(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def set_state(self, aid, state):
+        """
+        Update only the state of a registered agent, the cheapest modification
+        :param aid: agent identifier
+        :param state: new AgentState
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        description = self._entries.get(aid)
+        if description is None:
+            return ReturnCodes.NOT_REGISTERED
+        if description.state is not state:
+            _discard(self._by_state, description.state, aid)
+            description.state = state
+            _add(self._by_state, state, aid)
+        return ReturnCodes.SUCCESS
+
+    def search(self, template=None, max_results=None):
+        """
+        Find the descriptions matching every non None field of the template
+        :param template: AMSAgentDescription used as a filter, None matches everything
+        :param max_results: maximum number of descriptions returned, None for no limit
+        :return: list of matching descriptions
+        """
+        entries = self._entries
+        if template is not None and template.name is not None:
+            description = entries.get(template.name)
+            if description is None or not _matches(description, template):
+                return []
+            return [description]
+
+        buckets = self._buckets(template)
+        if max_results is not None and max_results <= 0:
+            return []
+        ownership = template.ownership if template is not None else None
+        return _intersect(entries, buckets, ownership, max_results)
+
+    def _buckets(self, template):
+        """
+        :param template: AMSAgentDescription used as a filter, None matches everything
+        :return: list of the index buckets every matching AID belongs to
+        """
+        buckets = []
+        if template is not None:
+            if template.state is not None:
+                buckets.append(self._by_state.get(template.state, _EMPTY))
+            if template.platform_id is not None:
+                buckets.append(self._by_platform.get(template.platform_id, _EMPTY))
+            for address in template.addresses or ():
+                buckets.append(self._by_address.get(address, _EMPTY))
+        if not buckets:
+            buckets.append(self._entries)
+        return buckets
+
+    def _index(self, aid, description):
+        _add(self._by_state, description.state, aid)
+        _add(self._by_platform, description.platform_id, aid)
+        for address in description.addresses or ():
+            _add(self._by_address, address, aid)
+
+    def _unindex(self, aid, description):
+        _discard(self._by_state, description.state, aid)
+        _discard(self._by_platform, description.platform_id, aid)
+        for address in description.addresses or ():
+            _discard(self._by_address, address, aid)
+
+
+class ServiceDescription(object):
+    """
+    Description of a service offered by an agent (see [FIPA00023]).
+    Used as a search template, every field left to None is a wildcard and
+    every listed ontology, protocol, language or property must be offered.
+    """
+
+    __slots__ = ['name', 'type', 'ontologies', 'protocols', 'languages', 'ownership', 'properties']
+
+    def __init__(self, name=None, type=None, ontologies=None, protocols=None, languages=None,
+                 ownership=None, properties=None):
+        self.name = name
+        self.type = type
+        self.ontologies = frozenset(ontologies) if ontologies is not None else None
+        self.protocols = frozenset(protocols) if protocols is not None else None
+        self.languages = frozenset(languages) if languages is not None else None
+        self.ownership = ownership
+        self.properties = dict(properties) if properties is not None else None
+
+    def __repr__(self):
+        return 'ServiceDescription(name=%r, type=%r)' % (self.name, self.type)
+
+    def terms(self):
+        """
+        Inverted index terms of the service, one per searchable value.
+        A property whose value cannot be hashed, such as a list, has no term:
+        the searches find it by comparing the candidates with matches.
+        :return: generator of (field, value) tuples
+        """
+        if self.name is not None:
+            yield ('name', self.name)
+        if self.type is not None:
+            yield ('type', self.type)
+        if self.ownership is not None:
+            yield ('ownership', self.ownership)
+        for ontology in self.ontologies or ():
+            yield ('ontology', ontology)
+        for protocol in self.protocols or ():
+            yield ('protocol', protocol)
+        for language in self.languages or ():
+            yield ('language', language)
+        for item in (self.properties or {}).items():
+            if _hashable(item[1]):
+                yield ('property', item)
+
+    def matches(self, template):
+        """
+        :param template: ServiceDescription used as a filter
+        :return: True if this service satisfies every constraint of the template
+        """
+        if template.name is not None and self.name != template.name:
+            return False
+        if template.type is not None and self.type != template.type:
+            return False
+        if template.ownership is not None and self.ownership != template.ownership:
+            return False
+        return _offers(template.ontologies, self.ontologies) and _offers(template.protocols, self.protocols) \
+            and _offers(template.languages, self.languages) and _has_properties(template.properties, self.properties)
+
+
+class DFAgentDescription(object):
+    """
+    Entry of the DF yellow pages directory: an agent and the services it offers.
+    """
+
+    __slots__ = ['name', 'services']
+
+    def __init__(self, name=None, services=None):
+        self.name = name
+        self.services = tuple(services) if services is not None else ()
+
+    def __repr__(self):
+        return 'DFAgentDescription(name=%r, services=%r)' % (self.name, self.services)
+
+    def matches(self, template):
+        """
+        Every service of the template must be matched by one of the registered services
+        :param template: DFAgentDescription used as a filter
+        :return: True if the description satisfies the template
+        """
+        if template.name is not None and self.name != template.name:
+            return False
+        for wanted in template.services:
+            for service in self.services:
+                if service.matches(wanted):
+                    break
+            else:
+                return False
+        return True
+
+
+class ServiceDirectory(object):
+    """
+    In-memory yellow pages directory.
+    Every searchable value of a registered service is a term of an inverted
+    index whose posting list holds the AIDs offering it, so a multi-constraint
+    query is answered by intersecting posting lists, smallest first.
+    Candidates are then checked against the full template since the terms of
+    one template service may be spread over several registered services.
+    """
+
+    __slots__ = ['_entries', '_postings']
+
+    def __init__(self):
+        self._entries = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, aid):
+        return aid in self._entries
+
+    def get(self, aid):
+        """
+        :param aid: agent identifier
+        :return: the registered DFAgentDescription or None
+        """
+        return self._entries.get(aid)
+
+    def register(self, description):
+        """
+        :param description: DFAgentDescription to publish
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        aid = description.name
+        if aid in self._entries:
+            return ReturnCodes.ALREADY_REGISTERED
+        self._entries[aid] = description
+        self._index(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def deregister(self, aid):
+        """
+        :param aid: agent identifier
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        description = self._entries.pop(aid, None)
+        if description is None:
+            return ReturnCodes.NOT_REGISTERED
+        self._unindex(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def modify(self, description):
+        """
+        :param description: new DFAgentDescription of an already registered agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        aid = description.name
+        previous = self._entries.get(aid)
+        if previous is None:
+            return ReturnCodes.NOT_REGISTERED
+        self._unindex(aid, previous)
+        self._entries[aid] = description
+        self._index(aid, description)
+        return ReturnCodes.SUCCESS
+
+    def search(self, template=None, max_results=None, offset=0):
+        """
+        Find the descriptions matching the template, one page at a time
+        :param template: DFAgentDescription used as a filter, None matches everything
+        :param max_results: page size, None for no limit
+        :param offset: number of matching descriptions to skip
+        :return: list of at most max_results matching descriptions
+        """
+        results = []
+        if max_results is not None and max_results <= 0:
+            return results
+        for description in self.iter_search(template):
+            if offset > 0:
+                offset -= 1
+                continue
+            results.append(description)
+            if max_results is not None and len(results) >= max_results:
+                break
+        return results
+
+    def iter_search(self, template=None):
+        """
+        Lazily yield the descriptions matching the template
+        :param template: DFAgentDescription used as a filter, None matches everything
+        :return: generator of matching DFAgentDescription
+        """
+        entries = self._entries
+        if template is None:
+            for description in entries.values():
+                yield description
+            return
+        if template.name is not None:
+            description = entries.get(template.name)
+            if description is not None and description.matches(template):
+                yield description
+            return
+
+        postings = self._postings_of(template)
+        if postings is None:
+            return
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        # like a dict iteration, the directory must not be modified while the generator is alive
+        for aid in smallest:
+            for posting in others:
+                if aid not in posting:
+                    break
+            else:
+                description = entries[aid]
+                if description.matches(template):
+                    yield description
+
+    def _postings_of(self, template):
+        """
+        :param template: DFAgentDescription used as a filter
+        :return: list of the postings every matching AID belongs to, None when a term has no posting
+        """
+        postings = []
+        for service in template.services:
+            for term in service.terms():
+                posting = self._postings.get(term)
+                if posting is None:
+                    return None
+                postings.append(posting)
+        if not postings:
+            postings.append(self._entries)
+        return postings
+
+    def _index(self, aid, description):
+        for service in description.services:
+            for term in service.terms():
+                _add(self._postings, term, aid)
+
+    def _unindex(self, aid, description):
+        for service in description.services:
+            for term in service.terms():
+                _discard(self._postings, term, aid)
+
+
+_EMPTY = {}
+
+
+def _add(index, key, aid):
+    bucket = index.get(key)
+    if bucket is None:
+        index[key] = bucket = {}
+    bucket[aid] = None
+
+
+def _discard(index, key, aid):
+    bucket = index.get(key)
+    if bucket is not None:
+        bucket.pop(aid, None)
+        if not bucket:
+            del index[key]
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _offers(required, offered):
+    return not required or required <= (offered or frozenset())
+
+
+def _has_properties(required, properties):
+    if not required:
+        return True
+    properties = properties or {}
+    for key, value in required.items():
+        if key not in properties or properties[key] != value:
+            return False
+    return True
+
+
+def _matches(description, template):
+    if template.state is not None and description.state is not template.state:
+        return False
+    if template.platform_id is not None and description.platform_id != template.platform_id:
+        return False
+    if template.ownership is not None and description.ownership != template.ownership:
+        return False
+    if template.addresses:
+        addresses = description.addresses or ()
+        for address in template.addresses:
+            if address not in addresses:
+                return False
+    return True
+
+
+def _intersect(entries, buckets, ownership, max_results):
+    # walk the smallest bucket and probe the others, the cost is bounded by the most selective index
+    buckets.sort(key=len)
+    smallest, others = buckets[0], buckets[1:]
+    results = []
+    for aid in smallest:
+        for bucket in others:
+            if aid not in bucket:
+                break
+        else:
+            description = entries[aid]
+            if ownership is not None and description.ownership != ownership:
+                continue
+            results.append(description)
+            if max_results is not None and len(results) >= max_results:
+                break
+    return results
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import struct
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from copdai_core.aid import AID
+from copdai_core.directory import DFAgentDescription, ServiceDescription
+
+log = logging.getLogger(__name__)
+
+# Federated DF searches are exchanged as length prefixed JSON documents
+_HEADER = struct.Struct('!I')
+
+
+class SearchIdCache(object):
+    """
+    Remember the search IDs recently handled by a DF so a query coming
+    back through a federation loop is dropped instead of re-propagated.
+    Entries expire after ttl seconds and the oldest ones are evicted
+    beyond capacity, the cache never grows without limit.
+    """
+
+    __slots__ = ['capacity', 'ttl', '_expiries']
+
+    def __init__(self, capacity=10000, ttl=60.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._expiries = OrderedDict()
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def add(self, search_id):
+        """
+        :param search_id: ID of the search being handled
+        :return: False if the search ID was already seen and is still valid
+        """
+        now = time.monotonic()
+        expiries = self._expiries
+        while expiries:
+            oldest, expiry = next(iter(expiries.items()))
+            if expiry > now and len(expiries) < self.capacity:
+                break
+            del expiries[oldest]
+        if search_id in expiries:
+            return False
+        expiries[search_id] = now + self.ttl
+        return True
+
+
+class DFPeer(ABC):
+    """A federated DF that can be queried by another DF."""
+
+    @abstractmethod
+    async def search(self, search_id, template, max_results, max_depth, timeout):
+        """
+        :param search_id: ID shared by every hop of the federated search
+        :param template: DFAgentDescription template
+        :param max_results: maximum number of results wanted
+        :param max_depth: remaining number of hops allowed after the peer
+        :param timeout: remaining time budget in seconds
+        :return: list of DFAgentDescription
+        """
+
+
+class LocalDFPeer(DFPeer):
+    """Peer DF hosted in the same process, queried by a direct call."""
+
+    def __init__(self, df):
+        self.df = df
+
+    async def search(self, search_id, template, max_results, max_depth, timeout):
+        return await self.df.federated_search(template, max_results, max_depth, timeout, search_id)
+
+
+class RemoteDFPeer(DFPeer):
+    """Peer DF served by a DFFederationServer, queried over a stream socket."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    async def search(self, search_id, template, max_results, max_depth, timeout):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            _write_document(writer, {
+                'search_id': search_id,
+                'template': encode_description(template),
+                'max_results': max_results,
+                'max_depth': max_depth,
+                'timeout': timeout,
+            })
+            await writer.drain()
+            response = await _read_document(reader)
+        finally:
+            writer.close()
+        return [decode_description(item) for item in response['results']]
+
+
+class DFFederationServer(object):
+    """Serve the federated searches of a DF to remote peers."""
+
+    def __init__(self, df, host='127.0.0.1', port=0):
+        self.df = df
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        """
+        Start listening, when port is 0 the bound port is stored back in self.port
+        :return: the peer to give to the other DFs
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return RemoteDFPeer(self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await _read_document(reader)
+            results = await self.df.federated_search(
+                decode_description(request['template']), request['max_results'],
+                request['max_depth'], request['timeout'], request['search_id'])
+            _write_document(writer, {'results': [encode_description(result) for result in results]})
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            # the peer gets no answer, as for an unreachable DF, but the failure is not silent
+            log.exception('Federated search of %s failed', writer.get_extra_info('peername'))
+        finally:
+            writer.close()
+
+
+class DFFederation(object):
+    """
+    Federated search of a DF.
+    A search is answered locally then propagated to every peer in parallel,
+    at most max_fanout peers being queried at the same time. Each hop
+    decrements max_depth, results are deduplicated by AID and the search
+    returns what it has gathered when the global deadline expires, so its
+    latency is bounded by the slowest peer instead of the sum of the peers.
+    """
+
+    def __init__(self, df, max_fanout=16, search_ids=None):
+        self.df = df
+        self.max_fanout = max_fanout
+        self.peers = []
+        self.search_ids = search_ids if search_ids is not None else SearchIdCache()
+
+    async def search(self, template=None, max_results=None, max_depth=1, timeout=None, search_id=None):
+        """
+        :param template: DFAgentDescription template, None matches everything
+        :param max_results: maximum number of results, capped by the DF max_results
+        :param max_depth: number of federation hops allowed, 0 searches the local DF only
+        :param timeout: global time budget in seconds, None to wait for every peer
+        :param search_id: ID of the search, generated when the search starts here
+        :return: list of DFAgentDescription, possibly partial when the deadline expired
+        """
+        if search_id is None:
+            from uuid import uuid4
+            search_id = uuid4().hex
+        if not self.search_ids.add(search_id):
+            return []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        results = OrderedDict()
+        for description in self.df.search(template, max_results):
+            results[description.name] = description
+        if max_results is None:
+            max_results = self.df.max_results
+        if max_depth <= 0 or not self.peers or (max_results is not None and len(results) >= max_results):
+            return list(results.values())
+
+        pending = self._fan_out(loop, deadline, (search_id, template, max_results, max_depth - 1))
+        await self._merge(loop, deadline, pending, results, max_results)
+        values = list(results.values())
+        return values[:max_results] if max_results is not None else values
+
+    def _fan_out(self, loop, deadline, request):
+        """
+        Query every peer, at most max_fanout at the same time
+        :param request: search_id, template, max_results and max_depth of the peer searches
+        :return: set of the pending peer searches
+        """
+        semaphore = asyncio.Semaphore(self.max_fanout)
+
+        async def query(peer):
+            async with semaphore:
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return []
+                return await peer.search(*request, remaining)
+
+        return set(asyncio.ensure_future(query(peer)) for peer in self.peers)
+
+    @staticmethod
+    async def _merge(loop, deadline, pending, results, max_results):
+        """
+        Gather the peer results into results until the peers answered, the deadline expired or max_results is reached,
+        the searches still pending are cancelled
+        """
+        try:
+            while pending:
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        # an unreachable peer only costs its own results
+                        continue
+                    for description in task.result():
+                        results.setdefault(description.name, description)
+                if max_results is not None and len(results) >= max_results:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def encode_description(description):
+    """
+    :param description: DFAgentDescription or None
+    :return: JSON compatible representation of the description
+    """
+    if description is None:
+        return None
+    return {
+        'name': str(description.name) if description.name is not None else None,
+        'services': [{
+            'name': service.name,
+            'type': service.type,
+            'ontologies': _encode_set(service.ontologies),
+            'protocols': _encode_set(service.protocols),
+            'languages': _encode_set(service.languages),
+            'ownership': service.ownership,
+            'properties': service.properties,
+        } for service in description.services],
+    }
+
+
+def decode_description(document):
+    """
+    :param document: representation built by encode_description
+    :return: DFAgentDescription or None
+    """
+    if document is None:
+        return None
+    name = document['name']
+    return DFAgentDescription(name=AID.parse(name) if name is not None else None, services=[
+        ServiceDescription(**service) for service in document['services']])
+
+
+def _encode_set(values):
+    return sorted(values) if values is not None else None
+
+
+def _write_document(writer, document):
+    payload = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    writer.write(_HEADER.pack(len(payload)) + payload)
+
+
+async def _read_document(reader):
+    size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return json.loads((await reader.readexactly(size)).decode('utf-8'))
@@ -0,0 +1,139 @@
+import asyncio
+from collections import namedtuple
+from enum import Enum, unique
+
+from copdai_core.commun import AgentState
+
+
+@unique
+class Operation(Enum):
+    """Operations of the agent life cycle (see [FIPA00023])"""
+
+    INVOKE = 1
+    SUSPEND = 2
+    RESUME = 3
+    WAIT = 4
+    WAKEUP = 5
+    MOVE = 6
+    EXECUTE = 7
+    QUIT = 8
+    DESTROY = 9
+
+
+_LIVE_STATES = (AgentState.INITIATED, AgentState.ACTIVE, AgentState.SUSPENDED, AgentState.WAITING,
+                AgentState.TRANSIT)
+
+# Legal transitions: operation -> {state the agent is in: state it goes to}
+TRANSITIONS = {
+    Operation.INVOKE: {AgentState.INITIATED: AgentState.ACTIVE},
+    Operation.SUSPEND: {AgentState.ACTIVE: AgentState.SUSPENDED, AgentState.WAITING: AgentState.SUSPENDED},
+    Operation.RESUME: {AgentState.SUSPENDED: AgentState.ACTIVE},
+    Operation.WAIT: {AgentState.ACTIVE: AgentState.WAITING},
+    Operation.WAKEUP: {AgentState.WAITING: AgentState.ACTIVE},
+    Operation.MOVE: {AgentState.ACTIVE: AgentState.TRANSIT},
+    Operation.EXECUTE: {AgentState.TRANSIT: AgentState.ACTIVE},
+    Operation.QUIT: dict((state, AgentState.UNKNOWN) for state in _LIVE_STATES),
+    Operation.DESTROY: dict((state, AgentState.UNKNOWN) for state in _LIVE_STATES),
+}
+
+
+def _compile(transitions):
+    # one row per operation indexed by the state value, a transition costs a tuple index instead of hashing enums
+    size = max(state.value for state in AgentState) + 1
+    table = {}
+    for operation, moves in transitions.items():
+        row = [None] * size
+        for state, target in moves.items():
+            row[state.value] = target
+        table[operation] = tuple(row)
+    return table
+
+
+_TABLE = _compile(TRANSITIONS)
+INVOKE = _TABLE[Operation.INVOKE]
+SUSPEND = _TABLE[Operation.SUSPEND]
+RESUME = _TABLE[Operation.RESUME]
+WAIT = _TABLE[Operation.WAIT]
+WAKEUP = _TABLE[Operation.WAKEUP]
+MOVE = _TABLE[Operation.MOVE]
+EXECUTE = _TABLE[Operation.EXECUTE]
+QUIT = _TABLE[Operation.QUIT]
+DESTROY = _TABLE[Operation.DESTROY]
+
+
+def next_state(operation, state):
+    """
+    :param operation: Operation applied to an agent
+    :param state: current AgentState of the agent
+    :return: AgentState the agent goes to, None when the transition is illegal
+    """
+    return _TABLE[operation][state._value_]
+
+
+# A transition of one agent, as published to the subscribers of a TransitionStream
+TransitionEvent = namedtuple('TransitionEvent', ['aid', 'previous', 'state'])
+
+
+class TransitionStream(object):
+    """
+    Batched stream of the transitions of many agents.
+    Publishing only appends to the pending batch; the subscribers get whole
+    batches, when batch_size transitions are pending, once per event loop
+    iteration when a loop is running, or when flush is called.
+    """
+
+    def __init__(self, batch_size=4096):
+        self.batch_size = batch_size
+        self._pending = []
+        self._subscribers = []
+        self._scheduled = False
+        # total number of transitions handed over to the subscribers
+        self.delivered = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def subscribe(self, callback):
+        """
+        :param callback: called with a list of TransitionEvent in publication order
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def publish(self, aid, previous, state):
+        """
+        :param aid: identifier of the agent
+        :param previous: AgentState the agent left
+        :param state: AgentState the agent entered
+        :return:
+        """
+        if not self._subscribers:
+            return
+        pending = self._pending
+        pending.append(TransitionEvent(aid, previous, state))
+        if len(pending) >= self.batch_size:
+            self.flush()
+        elif not self._scheduled:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._scheduled = True
+            loop.call_soon(self.flush)
+
+    def flush(self):
+        """
+        Hand the pending transitions over to the subscribers
+        :return: number of transitions delivered
+        """
+        self._scheduled = False
+        batch = self._pending
+        if not batch:
+            return 0
+        self._pending = []
+        self.delivered += len(batch)
+        for callback in self._subscribers:
+            callback(batch)
+        return len(batch)
@@ -0,0 +1,153 @@
+import logging
+import os
+import queue
+import sys
+import weakref
+from logging import handlers
+
+# Package logger, importing copdai_core configures nothing else
+PACKAGE_LOGGER = 'copdai_core'
+FORMAT = '%(asctime)s.%(msecs)03d %(levelname)s:(%(threadName)-10s) %(message)s'
+
+_listener = None
+_queue_handler = None
+_switches = weakref.WeakSet()
+
+
+class LogSwitch(object):
+    """
+    Cached answer of logger.isEnabledFor for a hot path.
+    `if switch.enabled: log.debug(...)` costs one attribute lookup when the
+    level is disabled, the switches are refreshed every time the logging is
+    (re)configured through this module.
+    """
+
+    __slots__ = ['logger', 'level', 'enabled', '__weakref__']
+
+    def __init__(self, logger, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+        self.enabled = False
+        self.refresh()
+
+    def refresh(self):
+        self.enabled = self.logger.isEnabledFor(self.level)
+
+
+def switch(logger, level=logging.DEBUG):
+    """
+    :param logger: logger used on a hot path
+    :param level: level of the guarded calls
+    :return: LogSwitch kept in line with the logging configuration
+    """
+    log_switch = LogSwitch(logger, level)
+    _switches.add(log_switch)
+    return log_switch
+
+
+class _DroppingQueueHandler(handlers.QueueHandler):
+    """Never block the caller: a record that does not fit in the queue is counted and dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(handlers.QueueListener):
+    """Wait for room in a full queue to post the stop sentinel, the records ahead of it are still written."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def parse_level(level):
+    """
+    :param level: logging level as a number or a name such as 'debug'
+    :return: numeric logging level
+    """
+    if isinstance(level, int):
+        return level
+    numeric_level = getattr(logging, str(level).upper(), None)
+    if not isinstance(numeric_level, int):
+        raise ValueError('Invalid log level: %s' % level)
+    return numeric_level
+
+
+def default_log_file():
+    from pathlib import Path
+    return os.path.join(str(Path.home()), 'copdai_core.log')
+
+
+def start(level=logging.INFO, stream=sys.stdout, filename=None, max_bytes=1048576 * 5, backup_count=7,
+          queue_size=10000):
+    """
+    Route the package log records through a queue to the sinks, written by a
+    background thread so an agent never waits on a terminal or a disk
+    :param level: logging level of the package, a number or a name
+    :param stream: stream sink, None for no stream
+    :param filename: rotating file sink, None for no file
+    :param max_bytes: size of a log file before rotation
+    :param backup_count: number of rotated files kept
+    :param queue_size: records waiting for the sinks beyond which new records are dropped
+    :return: the QueueListener writing the records
+    """
+    global _listener, _queue_handler
+    stop()
+    formatter = logging.Formatter(FORMAT)
+    sinks = []
+    if stream is not None:
+        sinks.append(logging.StreamHandler(stream))
+    if filename is not None:
+        sinks.append(handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count))
+    for sink in sinks:
+        sink.setFormatter(formatter)
+
+    log_queue = queue.Queue(queue_size)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    logger.addHandler(_queue_handler)
+    logger.setLevel(parse_level(level))
+    _listener = _QueueListener(log_queue, *sinks, respect_handler_level=True)
+    _listener.start()
+    refresh()
+    return _listener
+
+
+def stop():
+    """
+    Flush the queued records and detach the sinks
+    :return: number of records dropped because the queue was full
+    """
+    global _listener, _queue_handler
+    dropped = 0
+    if _queue_handler is not None:
+        dropped = _queue_handler.dropped
+        logging.getLogger(PACKAGE_LOGGER).removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for sink in _listener.handlers:
+            sink.close()
+        _listener = None
+    refresh()
+    return dropped
+
+
+def set_level(level):
+    """
+    :param level: new logging level of the package, a number or a name
+    """
+    logging.getLogger(PACKAGE_LOGGER).setLevel(parse_level(level))
+    refresh()
+
+
+def refresh():
+    """Recompute every LogSwitch, to call after changing a logger level directly."""
+    for log_switch in list(_switches):
+        log_switch.refresh()
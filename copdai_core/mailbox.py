@@ -0,0 +1,394 @@
+import asyncio
+import pickle
+import struct
+import threading
+import time
+from collections import deque
+from enum import Enum, unique
+
+from copdai_core.commun import ReturnCodes
+
+_RECORD_HEADER = struct.Struct('!I')
+# flag of the length of a record taken out of order by a selective receive
+_TAKEN = 0x80000000
+
+
+@unique
+class OverflowPolicy(Enum):
+    """What a full mailbox does with a new message"""
+
+    BLOCK = 0  # the sender waits until the agent consumes a message, refused from an event loop thread
+    DROP_OLDEST = 1  # the oldest pending message is discarded
+    DROP_NEWEST = 2  # the new message is refused
+    SPILL = 3  # the new message is written to disk and replayed later
+
+
+class SpillFile(object):
+    """
+    Append only overflow file of a mailbox.
+    Messages are pickled as length prefixed records and read back in
+    order, the file is truncated as soon as it has been fully replayed.
+    A record taken out of order is flagged in place and skipped on replay.
+    """
+
+    __slots__ = ['directory', '_file', '_read_offset', '_write_offset', '_count']
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._file = None
+        self._read_offset = 0
+        self._write_offset = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, message):
+        if self._file is None:
+            import tempfile
+            self._file = tempfile.TemporaryFile(prefix='copdai-spill-', dir=self.directory)
+        payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        self._file.seek(self._write_offset)
+        self._file.write(_RECORD_HEADER.pack(len(payload)))
+        self._file.write(payload)
+        self._write_offset += _RECORD_HEADER.size + len(payload)
+        self._count += 1
+
+    def pop(self):
+        if not self._count:
+            return None
+        spill_file = self._file
+        spill_file.seek(self._read_offset)
+        while True:
+            size, = _RECORD_HEADER.unpack(spill_file.read(_RECORD_HEADER.size))
+            self._read_offset += _RECORD_HEADER.size + (size & ~_TAKEN)
+            if not size & _TAKEN:
+                break
+            spill_file.seek(self._read_offset)
+        message = pickle.loads(spill_file.read(size))
+        self._taken_out()
+        return message
+
+    def take(self, match):
+        """
+        Take the oldest record matching out of the file, the others stay on disk
+        :param match: function of a message returning True when it is selected
+        :return: the message or None when no record matches
+        """
+        spill_file = self._file
+        offset = self._read_offset
+        for _ in range(self._count):
+            spill_file.seek(offset)
+            size, = _RECORD_HEADER.unpack(spill_file.read(_RECORD_HEADER.size))
+            while size & _TAKEN:
+                offset += _RECORD_HEADER.size + (size & ~_TAKEN)
+                spill_file.seek(offset)
+                size, = _RECORD_HEADER.unpack(spill_file.read(_RECORD_HEADER.size))
+            message = pickle.loads(spill_file.read(size))
+            if match(message):
+                spill_file.seek(offset)
+                spill_file.write(_RECORD_HEADER.pack(size | _TAKEN))
+                self._taken_out()
+                return message
+            offset += _RECORD_HEADER.size + size
+        return None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._read_offset = self._write_offset = self._count = 0
+
+    def _taken_out(self):
+        self._count -= 1
+        if not self._count:
+            # fully replayed, give the disk space back
+            self._file.truncate(0)
+            self._read_offset = self._write_offset = 0
+
+
+class IndexedQueue(object):
+    """
+    In-memory queue of a mailbox serving selective receives, with side
+    indexes on conversation-id and performative.
+    Every message sits in a cell shared by the arrival order queue and the
+    indexes; taking a message out of order empties its cell, which the other
+    queues drop once they reach it, and the queues are compacted when the
+    empty cells outnumber the messages. It keeps the deque interface used by
+    the mailbox so plain receives go on in arrival order.
+    """
+
+    __slots__ = ['_cells', '_by_conversation', '_by_performative', '_count']
+
+    def __init__(self, messages=()):
+        self._cells = deque()
+        self._by_conversation = {}
+        self._by_performative = {}
+        self._count = 0
+        for message in messages:
+            self.append(message)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, message):
+        cell = [message]
+        self._cells.append(cell)
+        conversation_id = getattr(message, 'conversation_id', None)
+        if conversation_id is not None:
+            cells = self._by_conversation.get(conversation_id)
+            if cells is None:
+                cells = self._by_conversation[conversation_id] = deque()
+            cells.append(cell)
+        performative = getattr(message, 'performative', None)
+        if performative is not None:
+            cells = self._by_performative.get(performative)
+            if cells is None:
+                cells = self._by_performative[performative] = deque()
+            cells.append(cell)
+        self._count += 1
+
+    def popleft(self):
+        cells = self._cells
+        while True:
+            # raises IndexError once empty, as a deque does
+            cell = cells.popleft()
+            message = cell[0]
+            if message is not None:
+                cell[0] = None
+                self._count -= 1
+                self._trim(message)
+                return message
+
+    def take(self, template):
+        """
+        :param template: MessageTemplate
+        :return: the oldest message matching the template, None when there is none
+        """
+        if template.conversation_id is not None:
+            cells = self._by_conversation.get(template.conversation_id)
+        elif template.performative is not None:
+            cells = self._by_performative.get(template.performative)
+        else:
+            cells = self._cells
+        if not cells:
+            return None
+        match = template.match
+        for cell in cells:
+            message = cell[0]
+            if message is not None and match(message):
+                cell[0] = None
+                self._count -= 1
+                self._trim(message)
+                return message
+        return None
+
+    def clear(self):
+        self._cells.clear()
+        self._by_conversation.clear()
+        self._by_performative.clear()
+        self._count = 0
+
+    def _trim(self, message):
+        cells = self._cells
+        while cells and cells[0][0] is None:
+            cells.popleft()
+        _trim_index(self._by_conversation, getattr(message, 'conversation_id', None))
+        _trim_index(self._by_performative, getattr(message, 'performative', None))
+        if len(cells) > 2 * self._count + 64:
+            self._compact()
+
+    def _compact(self):
+        cells = deque(cell for cell in self._cells if cell[0] is not None)
+        self._cells = cells
+        for index in (self._by_conversation, self._by_performative):
+            for key in list(index):
+                live = deque(cell for cell in index[key] if cell[0] is not None)
+                if live:
+                    index[key] = live
+                else:
+                    del index[key]
+
+
+def _trim_index(index, key):
+    if key is None:
+        return
+    cells = index.get(key)
+    if cells is None:
+        return
+    while cells and cells[0][0] is None:
+        cells.popleft()
+    if not cells:
+        del index[key]
+
+
+class Mailbox(object):
+    """
+    Bounded deque backed message queue of an agent.
+    deque.append and deque.popleft are atomic so one producer and one
+    consumer never take a lock, the condition is only used by the BLOCK policy.
+    Only senders outside of an event loop, such as the threads of a
+    container, can block: in the thread of an AgentRuntime the receivers
+    run on the same loop as the sender, waiting would deadlock it, so a
+    full BLOCK mailbox refuses the message with BUFFER_OVERFLOW there.
+    A selective receive takes the oldest message matching a MessageTemplate.
+    While the agent is not active the mailbox is held: messages are buffered
+    and the listener is only notified once the mailbox is released.
+    """
+
+    __slots__ = ['capacity', 'policy', 'block_timeout', 'listener', 'held', 'delivered', 'buffered', 'dropped',
+                 '_messages', '_spill', '_not_full']
+
+    def __init__(self, capacity=1024, policy=OverflowPolicy.DROP_OLDEST, block_timeout=None, spill_directory=None,
+                 spill=None):
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        # called without argument when messages are available to an active agent
+        self.listener = None
+        self.held = True
+        # statistics: messages queued, queued while held and refused or discarded by the overflow policy
+        self.delivered = 0
+        self.buffered = 0
+        self.dropped = 0
+        self._messages = deque()
+        # overflow tier of the SPILL policy, a queue of the platform SegmentStore or a file of its own
+        if policy is OverflowPolicy.SPILL:
+            self._spill = spill if spill is not None else SpillFile(spill_directory)
+        else:
+            self._spill = None
+        self._not_full = threading.Condition() if policy is OverflowPolicy.BLOCK else None
+
+    def __len__(self):
+        return len(self._messages) + (len(self._spill) if self._spill is not None else 0)
+
+    def put(self, message):
+        """
+        Queue a message, applying the overflow policy when the mailbox is full.
+        With BLOCK, a full mailbox only blocks a sender that is not running an event loop.
+        :param message: message to queue
+        :return: ReturnCodes.SUCCESS or ReturnCodes.BUFFER_OVERFLOW when the message was refused
+        """
+        messages = self._messages
+        if len(messages) >= self.capacity or (self._spill is not None and len(self._spill)):
+            policy = self.policy
+            if policy is OverflowPolicy.DROP_OLDEST:
+                messages.popleft()
+                self.dropped += 1
+            elif policy is OverflowPolicy.DROP_NEWEST:
+                self.dropped += 1
+                return ReturnCodes.BUFFER_OVERFLOW
+            elif policy is OverflowPolicy.SPILL:
+                # once spilling, keep spilling until replayed so the order is preserved
+                self._spill.append(message)
+                self.delivered += 1
+                if self.held:
+                    self.buffered += 1
+                elif self.listener is not None:
+                    self.listener()
+                return ReturnCodes.SUCCESS
+            elif not self._wait_not_full():
+                self.dropped += 1
+                return ReturnCodes.BUFFER_OVERFLOW
+        messages.append(message)
+        self.delivered += 1
+        if self.held:
+            self.buffered += 1
+        elif self.listener is not None:
+            self.listener()
+        return ReturnCodes.SUCCESS
+
+    def get(self, template=None):
+        """
+        :param template: MessageTemplate selecting the message, None for any
+        :return: the oldest pending message or None when the mailbox is empty
+        """
+        if template is not None:
+            return self.select(template)
+        try:
+            message = self._messages.popleft()
+        except IndexError:
+            if self._spill is None or not len(self._spill):
+                return None
+            message = self._spill.pop()
+        else:
+            if self._spill is not None and len(self._spill):
+                self._messages.append(self._spill.pop())
+        if self._not_full is not None:
+            with self._not_full:
+                self._not_full.notify()
+        return message
+
+    def select(self, template):
+        """
+        Take the oldest message matching a template, the others stay in arrival order.
+        The first selective receive switches the mailbox to an IndexedQueue, the
+        mailbox is then meant to be consumed from the thread delivering to it.
+        :param template: MessageTemplate
+        :return: the message or None when no pending message matches
+        """
+        messages = self._messages
+        if messages.__class__ is not IndexedQueue:
+            messages = self._messages = IndexedQueue(messages)
+        message = messages.take(template)
+        spill = self._spill
+        if message is None and spill is not None and len(spill):
+            # the spilled messages are matched in place, the others stay spilled and memory within capacity
+            message = spill.take(template.match)
+        if message is not None and self._not_full is not None:
+            with self._not_full:
+                self._not_full.notify()
+        return message
+
+    def drain(self, max_messages=None):
+        """
+        :param max_messages: maximum number of messages returned, None for all
+        :return: list of pending messages in arrival order
+        """
+        messages = []
+        while max_messages is None or len(messages) < max_messages:
+            message = self.get()
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    def hold(self):
+        """Buffer the messages without notifying the listener, the agent is not active."""
+        self.held = True
+
+    def release(self):
+        """Flush the buffered messages to the listener, the agent is back in active state."""
+        self.held = False
+        if len(self):
+            self._notify()
+
+    def close(self):
+        self._messages.clear()
+        if self._spill is not None:
+            self._spill.close()
+
+    def _notify(self):
+        if not self.held and self.listener is not None:
+            self.listener()
+
+    def _wait_not_full(self):
+        # a sender running in an event loop would wait for a receiver that needs the same loop to consume
+        if _in_event_loop():
+            return False
+        deadline = time.monotonic() + self.block_timeout if self.block_timeout is not None else None
+        with self._not_full:
+            while len(self._messages) >= self.capacity:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+        return True
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
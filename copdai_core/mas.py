@@ -1,41 +1,86 @@
-from copdai_core.commun import ReturnCodes
-from enum import Enum, unique
+from copdai_core.commun import ReturnCodes, AgentState, MOBILITY_PROTOCOL
+from copdai_core.aid import AID, local_platform_id, platform_name, unique_name, unique_names
+from copdai_core.directory import AgentDirectory, AMSAgentDescription, ServiceDirectory
+from copdai_core.mailbox import Mailbox, OverflowPolicy
+from copdai_core.runtime import AgentRuntime
+from copdai_core import acl
+from copdai_core import lifecycle
+from copdai_core import logconfig
+import asyncio
+import gc
+import inspect
+import struct
 import sys
 import os
-import signal
-import subprocess
+import time
 import logging
-from logging.handlers import RotatingFileHandler
-from logging import handlers
-from pathlib import Path
-from uuid import getnode, uuid4
 from abc import ABC, abstractmethod
 
-# Setting logging system for development environment
-home = str(Path.home())
+# Nothing is configured at import, the sinks are chosen when the platform starts logging.
+# The behaviours, federation, transport, metrics and signal modules are imported by the code using them.
 log = logging.getLogger(__name__)
-# numeric_level = getattr(logging, loglevel.upper(), None)
-# if not isinstance(numeric_level, int):
-# raise ValueError('Invalid log level: %s' % loglevel)
-log.setLevel(logging.DEBUG)
-format = logging.Formatter('%(asctime)s.%(msecs)03d %(levelname)s:(%(threadName)-10s) %(message)s')
-sh = logging.StreamHandler(sys.stdout)
-sh.setFormatter(format)
-log.addHandler(sh)
-fh = handlers.RotatingFileHandler("%s%scopdai_core.log" % (home, os.pathsep), maxBytes=(1048576 * 5), backupCount=7)
-fh.setFormatter(format)
-log.addHandler(fh)
-
-@unique
-class AgentState(Enum):
-    """Normal agent life cycle FIPA specification"""
-
-    UNKNOWN = 0
-    INITIATED = 1
-    ACTIVE = 2
-    SUSPENDED = 3
-    WAITING = 4
-    TRANSIT = 5
+# guard of the debug calls on the lifecycle hot paths
+_trace = logconfig.switch(log)
+
+
+def agent_identifier(name, platform_id):
+    """
+    A globally unique name for an agent, composed from an ID + module name + platform ID
+    :param name: ID of the agent, unique on its platform
+    :param platform_id: platform ID, the MAC address of the machine in normal case
+    :return: AID of the agent
+    """
+    return AID('%s#%s' % (name, __name__), platform_name(platform_id))
+
+
+# agent classes by path, a module is imported once whatever the number of agents created from it
+_agent_classes = {}
+# agent class -> whether its constructor takes the name of the agent
+_named_classes = {}
+
+
+def agent_class(path):
+    """
+    Resolve the class of the agents created from a path, the result is cached
+    :param path: 'package.module:Class', 'package.module.Class' or 'file.py:Class'
+    :return: the agent class
+    """
+    cls = _agent_classes.get(path)
+    if cls is not None:
+        return cls
+    if ':' in path:
+        module_name, _, qualname = path.rpartition(':')
+    else:
+        module_name, _, qualname = path.rpartition('.')
+    if not module_name or not qualname:
+        raise ValueError('%r is not a module:Class path' % path)
+    import importlib
+    if module_name.endswith('.py'):
+        from importlib import util
+        spec = util.spec_from_file_location(os.path.splitext(os.path.basename(module_name))[0], module_name)
+        if spec is None:
+            raise ImportError('No agent module at %s' % module_name)
+        module = util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    cls = module
+    for name in qualname.split('.'):
+        cls = getattr(cls, name)
+    _agent_classes[path] = cls
+    return cls
+
+
+def _takes_name(cls):
+    named = _named_classes.get(cls)
+    if named is None:
+        try:
+            parameters = inspect.signature(cls).parameters.values()
+        except (TypeError, ValueError):
+            parameters = ()
+        named = _named_classes[cls] = any(parameter.name == 'name' or parameter.kind is parameter.VAR_KEYWORD
+                                          for parameter in parameters)
+    return named
 
 
 class AbstractAgent(ABC):
@@ -49,63 +94,143 @@ class AbstractAgent(ABC):
     for accessing software (see [FIPA00079]).
     """
 
-    __slots__ = ['_state', '_platform_id', '_pid', '_aid', '_run']  # using slot to declare python object can allow as
+    # using slot to declare python object can allow as
+    __slots__ = ['_state', '_platform_id', '_pid', '_aid', '_run', '_mailbox', '_runtime', '_scheduler']
     # control memory allocated and prevent adding additional attribute to an object later
 
     def __init__(self, platform_id=None, name=None):
         super().__init__()
         # The platform ID in normal case will be the MAC address of current machine
         if platform_id is None:
-            self._platform_id = getnode()
+            self._platform_id = local_platform_id()
         else:
             self._platform_id = platform_id
 
         self._pid = os.getpid()
         self._run = False
+        # messages queued by the MTS, created on first delivery
+        self._mailbox = None
+        # AgentRuntime hosting the agent, None when the agent owns its process
+        self._runtime = None
+        # BehaviourScheduler run by the default run, created with the first behaviour
+        self._scheduler = None
         # A globally unique name for the agent
         # the name will be composed from an ID + filename + platform ID
-        if name is None:
-            self._aid = '%s#%s@%s' % (
-                str(uuid4()),
-                __name__,
-                ''.join(("%012X" % self._platform_id)[i:i + 2] for i in range(0, 12, 2))
-            )
-        else:
-            self.name = '%s#%s@%s' % (
-                name,
-                __name__,
-                ''.join(("%012X" % self._platform_id)[i:i + 2] for i in range(0, 12, 2))
-            )
+        self._aid = agent_identifier(unique_name() if name is None else name, self._platform_id)
+
+        self._state = AgentState.INITIATED
 
+    def install_signal_handlers(self):
+        """
+        One process per agent mode: the AMS controls the agent with POSIX signals.
+        Agents hosted by an AgentRuntime receive their lifecycle events in-process instead.
+        :return:
+        """
+        import signal
         # register to handle TERM signal
         # The graceful termination of an agent. This can be ignored by the agent.
-        signal.signal(signal.SIGTERM, self.signal_term)
-        # register to handle KILL signal
-        # The forceful termination of an agent. This can only be initiated by the AMS and cannot be ignored by the agent
-        signal.signal(signal.SIGKILL, self.signal_kill)
-        # register to handle STOP signal
-        # Puts an agent in a suspended state. This can be initiated by the agent or the AMS.
-        signal.signal(signal.SIGSTOP, self.signal_stop)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        # KILL (forceful termination) and STOP (suspension) cannot be caught by a process,
+        # they are enforced by the operating system on behalf of the AMS.
         # register to handle CONT signal
         # Brings the agent from a suspended state. This can only be initiated by the AMS.
-        signal.signal(signal.SIGCONT, self.signal_cont)
+        signal.signal(signal.SIGCONT, self.signal_handler)
         # register to handle USR1 signal
         # Brings the agent from a waiting state. This can only be initiated by the AMS.
-        signal.signal(signal.SIGUSR1, self.signal_usr1)
+        signal.signal(signal.SIGUSR1, self.signal_handler)
+        return ReturnCodes.SUCCESS
 
-        self._state = AgentState.INITIATED
+    @property
+    def aid(self):
+        return self._aid
+
+    @property
+    def state(self):
+        return self._state
+
+    def receive(self, template=None):
+        """
+        Pick the oldest message delivered to the agent
+        :param template: acl.MessageTemplate the message must match, None for any message
+        :return: the message or None when no pending message matches
+        """
+        if self._mailbox is None:
+            return None
+        return self._mailbox.get(template)
+
+    def send(self, message):
+        """
+        Send a message through the MTS of the runtime hosting the agent
+        :param message: ACLMessage, its receivers are AIDs
+        :return: ReturnCodes.SUCCESS or the failure of the first undeliverable receiver
+        """
+        return self._runtime.mts.send(message)
+
+    async def checkpoint(self):
+        """
+        Cooperative suspension point of an agent hosted by an AgentRuntime,
+        blocks while the agent is suspended, waiting or in transit
+        :return:
+        """
+        await self._runtime.checkpoint(self)
+
+    async def receive_async(self, timeout=None, template=None):
+        """
+        Wait for the next message delivered to an agent hosted by an AgentRuntime
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :param template: acl.MessageTemplate the message must match, None for any message
+        :return: the message or None when the timeout expired
+        """
+        return await self._runtime.receive(self, timeout, template)
+
+    def add_behaviour(self, behaviour):
+        """
+        Schedule a behaviour, the behaviours run cooperatively within the agent run
+        :param behaviour: Behaviour of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        if self._scheduler is None:
+            from copdai_core.behaviours import BehaviourScheduler
+            self._scheduler = BehaviourScheduler(self)
+        return self._scheduler.add(behaviour)
+
+    def remove_behaviour(self, behaviour):
+        """
+        :param behaviour: scheduled Behaviour
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if self._scheduler is None:
+            return ReturnCodes.NOT_REGISTERED
+        return self._scheduler.remove(behaviour)
+
+    def _transition(self, row):
+        # row of the lifecycle transition table of the operation, indexed by the current state
+        state = row[self._state._value_]
+        if state is None:
+            if _trace.enabled:
+                log.debug("Illegal transition from %s", self._state.name)
+            return ReturnCodes.ILLEGAL_TRANSITION
+        self._set_state(state)
+        return ReturnCodes.SUCCESS
+
+    def _set_state(self, state):
+        previous = self._state
+        self._state = state
+        # messages are only handed over to an active agent, the others get them buffered
+        if self._mailbox is not None:
+            if state is AgentState.ACTIVE:
+                self._mailbox.release()
+            else:
+                self._mailbox.hold()
+        if self._runtime is not None:
+            self._runtime.state_changed(self, previous, state)
 
     def signal_handler(self, signum, frame):
-        if signum == signal.SIGTERM:
-            self.quit()
-        elif signum == signal.SIGKILL:
-            self.destroy()
-        elif signum == signal.SIGSTOP and self._state == AgentState.ACTIVE:
-            self.suspend()
-        elif signum == signal.SIGCONT and self._state == AgentState.SUSPENDED:
-            self.resume()
-        elif signum == signal.SIGUSR1 and self._state == AgentState.WAITING:
-            self.wakeup()
+        # the transition table ignores a signal received in a state where it does not apply
+        import signal
+        operation = _SIGNAL_OPERATIONS.get(signal.Signals(signum).name)
+        if operation is not None:
+            getattr(self, operation)()
 
     @abstractmethod
     def setup(self):
@@ -116,13 +241,14 @@ class AbstractAgent(ABC):
         """
         log.debug('Initializing agent ...')
 
-    @abstractmethod
-    def run(self):
+    async def run(self):
         """
-        Code to be executed by the agent
+        Code to be executed by the agent, by default its behaviours until every one of them is done.
+        Agents overriding run write their own loop instead.
         :return:
         """
-        log.debug('starting execution of agent ...')
+        if self._scheduler is not None:
+            await self._scheduler.run()
 
     @abstractmethod
     def teardown(self):
@@ -133,53 +259,68 @@ class AbstractAgent(ABC):
         """
         log.debug('Finalizing the agent ...')
 
+    def before_move(self):
+        """
+        Called in transit before the agent state is captured, release here what cannot migrate
+        :return:
+        """
+
+    def after_move(self):
+        """
+        Called on the new platform in place of setup, before the agent executes there
+        :return:
+        """
+
     def resume(self):
         """
         Brings the agent from a suspended state. This can only be initiated by the AMS.
         :return:
         """
-        log.debug("Resuming agent")
-        self._state = AgentState.ACTIVE
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Resuming agent")
+        return self._transition(lifecycle.RESUME)
 
     def invoke(self):
         """
         The invocation of a new agent.
         :return:
         """
-        log.debug("Agent go to active state")
-        self._state = AgentState.ACTIVE
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to active state")
+        return self._transition(lifecycle.INVOKE)
 
     def suspend(self):
         """
         Puts an agent in a suspended state. This can be initiated by the agent or the AMS.
         :return:
         """
-        log.debug("Agent go to suspend state")
-        self._state = AgentState.SUSPENDED
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to suspend state")
+        return self._transition(lifecycle.SUSPEND)
 
     def wait(self):
         """
         Puts an agent in a waiting state. This can only be initiated by an agent.
+        An agent hosted by an AgentRuntime is blocked at its next checkpoint instead of pausing the process.
         :return:
         """
 
-        log.debug("Agent go to wait state")
-        self._state = AgentState.WAITING
-        signal.pause()
-
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to wait state")
+        code = self._transition(lifecycle.WAIT)
+        if code is ReturnCodes.SUCCESS and self._runtime is None:
+            import signal
+            signal.pause()
+        return code
 
     def wakeup(self):
         """
         Brings the agent from a waiting state. This can only be initiated by the AMS.
         :return:
         """
-        log.debug("Agent go to active state")
-        self._state = AgentState.ACTIVE
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to active state")
+        return self._transition(lifecycle.WAKEUP)
 
     def move(self):
         """
@@ -187,9 +328,9 @@ class AbstractAgent(ABC):
         Puts the agent in a transitory state. This can only be initiated by the agent.
         :return:
         """
-        log.debug("Agent go to transit state")
-        self._state = AgentState.TRANSIT
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to transit state")
+        return self._transition(lifecycle.MOVE)
 
     def execute(self):
         """
@@ -197,30 +338,45 @@ class AbstractAgent(ABC):
         Brings the agent from a transitory state. This can only be initiated by the AMS.
         :return:
         """
-        log.debug("Agent go to active state")
-        self._state = AgentState.ACTIVE
-        return ReturnCodes.SUCCESS
-
+        if _trace.enabled:
+            log.debug("Agent go to active state")
+        code = self._transition(lifecycle.EXECUTE)
+        if code is ReturnCodes.SUCCESS and self._runtime is not None and self._runtime.mts is not None:
+            # the platform the agent came from flushes the messages it stored meanwhile
+            self._runtime.mts.executed(self)
+        return code
 
     def destroy(self):
         """
         The forceful termination of an agent. This can only be initiated by the AMS and cannot be ignored by the agent
         :return:
         """
-        log.debug("Agent Destroyed")
-        self._state = AgentState.UNKNOWN
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent Destroyed")
+        return self._transition(lifecycle.DESTROY)
 
     def quit(self):
         """
         The graceful termination of an agent. This can be ignored by the agent.
         :return:
         """
-        log.debug("Agent Quit")
-        self._state = AgentState.UNKNOWN
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent Quit")
+        return self._transition(lifecycle.QUIT)
 
 
+# POSIX signals of the one process per agent mode and the life cycle operation they trigger
+_SIGNAL_OPERATIONS = {
+    'SIGTERM': 'quit',
+    'SIGCONT': 'resume',
+    'SIGUSR1': 'wakeup',
+}
+
+
+# directory operations timed by the platform metrics
+AMS_OPERATIONS = ('register', 'deregister', 'modify', 'search')
+DF_OPERATIONS = ('register', 'deregister', 'modify', 'search')
+
 
 class AgentPlatform(object):
     """
@@ -228,8 +384,264 @@ class AgentPlatform(object):
     by the AP for realising their functionalities.
     """
 
-    def __init__(self, uid):
+    def __init__(self, uid, mts=None, state_directory=None, **journal_options):
         self.uid = uid
+        self.mts = mts if mts is not None else MessageTransportService()
+        # thousands of agents run as coroutines of the platform event loop
+        self.runtime = AgentRuntime(self.mts)
+        # with a state directory the white pages survive a restart of the platform
+        directory = None
+        if state_directory is not None:
+            from copdai_core.persistence import DurableAgentDirectory
+            directory = DurableAgentDirectory.open(state_directory, **journal_options)
+        self.ams = AgentManagementSystem(self, directory)
+        self.df = DirectoryFacilitator()
+        # the AMS directory follows the transitions of the hosted agents one batch at a time
+        self.runtime.transitions.subscribe(self.ams.transitions_published)
+        # receives the agents migrating here, started by listen_migrations
+        self._migrations = None
+        # MetricsRegistry created on first use, see metrics
+        self._metrics = None
+        self._state_times = None
+
+    @property
+    def metrics(self):
+        """
+        Metrics registry of the platform, the mailbox counters are always collected, start_metrics adds the timings
+        :return: metrics.MetricsRegistry
+        """
+        if self._metrics is None:
+            from copdai_core.metrics import MetricsRegistry
+            self._metrics = MetricsRegistry()
+            self._metrics.collector(self._collect_mailboxes)
+        return self._metrics
+
+    def start_logging(self, level=logging.INFO, stream=sys.stdout, filename=None, **options):
+        """
+        Choose the log sinks of the platform, records are written by a background
+        thread so agents never block on a terminal or a disk
+        :param level: logging level, a number or a name such as 'debug'
+        :param stream: stream sink, None for no stream
+        :param filename: rotating log file, logconfig.default_log_file() gives the usual one
+        :param options: other logconfig.start options
+        :return: ReturnCodes.SUCCESS
+        """
+        logconfig.start(level, stream, filename, **options)
+        return ReturnCodes.SUCCESS
+
+    def stop_logging(self):
+        """
+        Flush the pending records and detach the sinks
+        :return: ReturnCodes.SUCCESS
+        """
+        logconfig.stop()
+        return ReturnCodes.SUCCESS
+
+    def start_metrics(self, sample_every=64):
+        """
+        Instrument the platform: sampled MTS send and AMS and DF operation
+        latencies, and the time the agents spend in each state
+        :param sample_every: one message send and one directory operation in sample_every are timed
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED when the metrics are started
+        """
+        if self._state_times is not None:
+            return ReturnCodes.ALREADY_REGISTERED
+        from copdai_core import metrics
+        registry = self.metrics
+        self.mts.sample(registry.histogram('copdai_mts_send_seconds', 'Duration of the sampled MTS sends'),
+                        sample_every)
+        self.ams.timings = metrics.Timings(registry, 'copdai_ams_operation_seconds',
+                                           'Duration of the sampled AMS directory operations', AMS_OPERATIONS,
+                                           sample_every)
+        self.df.timings = metrics.Timings(registry, 'copdai_df_operation_seconds',
+                                          'Duration of the sampled DF directory operations', DF_OPERATIONS,
+                                          sample_every)
+        self._state_times = metrics.StateTimes()
+        self.runtime.transitions.subscribe(self._state_times.transitions_published)
+        registry.collector(self._state_times.collect)
+        return ReturnCodes.SUCCESS
+
+    def stop_metrics(self):
+        """
+        Remove the instrumentation, the values collected so far are kept
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED when the metrics are not started
+        """
+        if self._state_times is None:
+            return ReturnCodes.NOT_REGISTERED
+        self.mts.sample(None)
+        self.ams.timings = None
+        self.df.timings = None
+        self.runtime.transitions.unsubscribe(self._state_times.transitions_published)
+        self.metrics.remove_collector(self._state_times.collect)
+        self._state_times = None
+        return ReturnCodes.SUCCESS
+
+    def _collect_mailboxes(self):
+        from copdai_core import metrics
+        for aid, agent in self.mts._agents.items():
+            mailbox = agent._mailbox
+            if mailbox is None:
+                continue
+            labels = {'agent': str(aid)}
+            yield ('copdai_messages_delivered_total', metrics.COUNTER, 'Messages queued in the mailbox', labels,
+                   mailbox.delivered)
+            yield ('copdai_messages_buffered_total', metrics.COUNTER,
+                   'Messages queued while the agent was not active', labels, mailbox.buffered)
+            yield ('copdai_messages_dropped_total', metrics.COUNTER,
+                   'Messages refused or discarded by the overflow policy', labels, mailbox.dropped)
+            yield ('copdai_mailbox_depth', metrics.GAUGE, 'Messages pending in the mailbox', labels, len(mailbox))
+
+    def close(self):
+        """
+        Write the pending white pages changes of a durable AMS directory
+        :return: ReturnCodes.SUCCESS
+        """
+        close = getattr(self.ams._directory, 'close', None)
+        if close is not None:
+            close()
+        return ReturnCodes.SUCCESS
+
+    async def listen_migrations(self, address='tcp://127.0.0.1:0', key=None):
+        """
+        Accept the agents migrating to this platform. A migrating agent is unpickled,
+        so any address but a loopback one or a Unix socket needs a key shared with the
+        origin platforms: the snapshots not authenticated with it are refused.
+        :param address: transport address such as tcp://127.0.0.1:7001 or unix:///run/copdai-mobility.sock
+        :param key: bytes shared with the platforms the agents come from
+        :return: the address other platforms migrate agents to
+        """
+        if self._migrations is None:
+            from copdai_core.mobility import MigrationServer
+            self._migrations = MigrationServer(self, key=key)
+        return await self._migrations.start(address)
+
+    async def migrate(self, aid, address, key=None):
+        """
+        Move an agent to another platform. The agent goes in transit, its slots are
+        captured in a snapshot shipped to the destination, which registers it; the agent
+        is released here before the destination is told to execute it, so it never runs
+        on both platforms, but it is lost when the destination fails after that.
+        The messages sent to the agent meanwhile are stored then forwarded.
+        :param aid: identifier of an agent created by the AMS
+        :param address: migration address of the destination platform
+        :param key: bytes shared with the destination, None when it has no key
+        :return: MigrationReport, its pause is the time the agent was not active
+        """
+        from copdai_core import mobility
+        agent = self.ams._agents.get(aid)
+        if agent is None:
+            return mobility.MigrationReport(ReturnCodes.NOT_REGISTERED, 0.0, 0, 0)
+        start = time.perf_counter()
+        code = agent.move()
+        if code is not ReturnCodes.SUCCESS:
+            return mobility.MigrationReport(code, 0.0, 0, 0)
+        released = []
+
+        def release():
+            self.runtime.depart(agent)
+            self.mts.depart(agent)
+            self.ams._forget(aid)
+            released.append(aid)
+
+        code, state = await self._ship(agent, address, key, release)
+        if released:
+            if code is not ReturnCodes.SUCCESS:
+                # the destination may execute it already, it is not brought back here
+                log.warning('%s left for %s but was not confirmed executing there: %s', aid, address, code.name)
+        elif code is not ReturnCodes.SUCCESS:
+            # the agent stays here
+            agent.execute()
+        pause = time.perf_counter() - start
+        if _trace.enabled:
+            log.debug('Migration of %s: %s in %.6f s', aid, code.name, pause)
+        return mobility.MigrationReport(code, pause, len(state.data) if state else 0,
+                                        state.buffer_size if state else 0)
+
+    async def _ship(self, agent, address, key, release):
+        """
+        :return: tuple of the ReturnCodes of the migration and the Snapshot, None when it was not taken
+        """
+        from copdai_core import mobility
+        state = None
+        try:
+            result = agent.before_move()
+            if inspect.isawaitable(result):
+                await result
+            state = mobility.snapshot(agent)
+            code = await mobility.send_snapshot(address, state, self.mts.address, key=key, release=release)
+        except (OSError, asyncio.IncompleteReadError) as error:
+            log.warning('Migration of %s to %s failed: %s', agent.aid, address, error)
+            code = ReturnCodes.FATAL
+        except Exception:
+            # such as a slot that cannot be pickled, the agent must not stay in transit
+            log.exception('Migration of %s to %s failed', agent.aid, address)
+            code = ReturnCodes.FATAL
+        return code, state
+
+    async def adopt(self, agent, origin=None):
+        """
+        Host an agent that migrated from another platform and execute it
+        :param agent: restored agent in AgentState.TRANSIT
+        :param origin: MTS address of the platform it left, told once the agent executes
+        :return: ReturnCodes.SUCCESS, ReturnCodes.ALREADY_REGISTERED when its AID is in use here
+                 or ReturnCodes.FATAL when the agent did not become active
+        """
+        code = self.admit(agent, origin)
+        if code is not ReturnCodes.SUCCESS:
+            return code
+        return await self.start_admitted(agent)
+
+    def admit(self, agent, origin=None):
+        """
+        Register an agent that migrates from another platform, without executing it
+        :param agent: restored agent in AgentState.TRANSIT
+        :param origin: MTS address of the platform it leaves
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED when its AID is in use here
+        """
+        if self.ams.create(agent) is None:
+            return ReturnCodes.ALREADY_REGISTERED
+        if origin is not None:
+            self.mts.arrive(agent, origin)
+        return ReturnCodes.SUCCESS
+
+    def dismiss(self, agent):
+        """
+        Unregister an admitted agent whose migration was not committed, it stays on its origin platform
+        :param agent: agent admitted and not executed yet
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        self.mts.detach(agent)
+        if self.ams._agents.get(agent.aid) is not agent:
+            return ReturnCodes.NOT_REGISTERED
+        self.ams._forget(agent.aid)
+        return ReturnCodes.SUCCESS
+
+    async def start_admitted(self, agent):
+        """
+        Execute an admitted agent
+        :param agent: agent admitted in AgentState.TRANSIT
+        :return: ReturnCodes.SUCCESS or ReturnCodes.FATAL when the agent did not become active
+        """
+        task = self.runtime.spawn(agent)
+        # the agent executes in the first step of its task
+        while agent.state is AgentState.TRANSIT and not task.done():
+            await asyncio.sleep(0)
+        return ReturnCodes.SUCCESS if agent.state is AgentState.ACTIVE else ReturnCodes.FATAL
+
+    async def stop_migrations(self):
+        if self._migrations is not None:
+            await self._migrations.stop()
+        return ReturnCodes.SUCCESS
+
+    def container(self, workers=None, **options):
+        """
+        Container mode: shard the agents of the platform across worker processes, one per core by default
+        :param workers: number of worker processes
+        :param options: other AgentContainer options
+        :return: AgentContainer, not started yet
+        """
+        from copdai_core.container import AgentContainer
+        return AgentContainer(self.uid, workers, **options)
 
 
 class AgentManagementSystem(AbstractAgent):
@@ -244,65 +656,335 @@ class AgentManagementSystem(AbstractAgent):
     AP.
     """
 
-
-    def __init__(self):
+    def __init__(self, platform=None, directory=None):
         # The platform ID in normal case will be the MAC address of current machine
         super().__init__()
-        self._aid = "ams@%s" % ''.join(("%012X" % self._platform_id)[i:i + 2] for i in range(0, 12, 2))
+        self._aid = AID('ams', platform_name(self._platform_id))
+        # white pages directory of the AIDs registered with the AP, it is also the state table of the agents
+        self._directory = directory if directory is not None else AgentDirectory()
+        # agents created by the AMS, they run in the platform runtime when there is one
+        self._agents = {}
+        self._platform = platform
+        # metrics.Timings of the directory operations, set by AgentPlatform.start_metrics
+        self.timings = None
+        # profiler.Profiler of the last start_profiling
+        self.profiler = None
 
+    def setup(self):
+        log.debug('Initializing AMS ...')
+
+    def run(self):
+        log.debug('starting execution of AMS ...')
+
+    def teardown(self):
+        log.debug('Finalizing the AMS ...')
 
     # PART1 :  Management Functions Supported by the Agent Management System
-    def register(self):
-        return ReturnCodes.SUCCESS
+    def register(self, description):
+        """
+        Register an agent in the white pages directory
+        :param description: AMSAgentDescription of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('register', self._directory.register, description)
+        return self._directory.register(description)
 
-    def deregister(self):
-        return ReturnCodes.SUCCESS
+    def deregister(self, aid):
+        """
+        Remove an agent from the white pages directory
+        :param aid: agent identifier
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('deregister', self._directory.deregister, aid)
+        return self._directory.deregister(aid)
 
-    def modify(self):
-        return ReturnCodes.SUCCESS
+    def modify(self, description):
+        """
+        Replace the registered description of an agent
+        :param description: AMSAgentDescription of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('modify', self._directory.modify, description)
+        return self._directory.modify(description)
 
-    def search(self):
-        return ReturnCodes.SUCCESS
+    def search(self, description=None, max_results=None):
+        """
+        Search the white pages directory
+        :param description: AMSAgentDescription template, None fields are wildcards
+        :param max_results: maximum number of results, None for no limit
+        :return: list of matching AMSAgentDescription
+        """
+        self._sync()
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('search', self._directory.search, description, max_results)
+        return self._directory.search(description, max_results)
 
     def get_description(self):
         """
         An agent can make a query in order to request the platform profile of an AP from an AMS.
         :return: platform ID
         """
-        return ''.join(("%012X" % self._platform_id)[i:i + 2] for i in range(0, 12, 2))
+        return platform_name(self._platform_id)
 
     # END PART1
 
     # PART2 : AMS can instruct the underlying AP to perform the following operations
+    # Every operation takes one AID, its _all variant takes a list of AIDs or a search template
+    # and runs as a single pass over the agents. The state of every agent is read from the directory.
+    def create(self, agent):
+        """
+        The creation or installation of a new agent
+        :param agent: AbstractAgent instance, or an agent class built without argument, or the path of one
+        :return: AID of the created agent, None when an agent with the same AID is already registered
+        """
+        if isinstance(agent, str):
+            agent = agent_class(agent)
+        if isinstance(agent, type):
+            agent = agent()
+        if _trace.enabled:
+            log.debug("Creating agent")
+        if self._directory.register(AMSAgentDescription(name=agent.aid, state=agent.state,
+                                                        platform_id=agent._platform_id)) is not ReturnCodes.SUCCESS:
+            return None
+        self._agents[agent.aid] = agent
+        return agent.aid
+
+    def create_all(self, agent, count=None, parameters=None):
+        """
+        Bulk creation: the class is resolved once, the names of the agents are allocated
+        in one block and the agents are registered in one directory transaction
+        :param agent: agent class, or its path as taken by agent_class
+        :param count: number of agents built without argument, when there are no parameters
+        :param parameters: list of keyword argument dicts, one agent is built with each
+        :return: list of the AIDs created, empty when one of them was already registered, none is created then
+        """
+        cls = agent_class(agent) if isinstance(agent, str) else agent
+        if parameters is None:
+            parameters = ({},) * (count or 0)
+        log.debug('Creating %d agents of %s', len(parameters), cls.__name__)
+        names = unique_names(len(parameters)) if _takes_name(cls) else None
+        created = []
+        descriptions = []
+        # every object allocated here survives, collections triggered by the allocations would only walk them
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for index, arguments in enumerate(parameters):
+                if names is not None and 'name' not in arguments:
+                    instance = cls(name=names[index], **arguments)
+                else:
+                    instance = cls(**arguments)
+                aid = instance.aid
+                created.append((aid, instance))
+                descriptions.append(AMSAgentDescription(name=aid, state=instance.state,
+                                                        platform_id=instance._platform_id))
+        finally:
+            if collecting:
+                gc.enable()
+        if self._directory.register_many(descriptions) is not ReturnCodes.SUCCESS:
+            return []
+        self._agents.update(created)
+        return [aid for aid, instance in created]
+
     def invoke(self, aid):
-        log.debug("Agent go to active state")
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to active state")
+        return self._control(aid, self._invoke)
 
     def suspend(self, aid):
-        log.debug("Agent go to suspend state")
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to suspend state")
+        return self._control(aid, _suspend)
 
-    def terminate(self, aid):
-        log.debug("Agent go to unkowen  state")
-        return ReturnCodes.SUCCESS
+    def terminate(self, aid, force=False):
+        """
+        Graceful termination of an agent, or forceful when force is set
+        :param aid: agent identifier
+        :param force: destroy the agent instead of asking it to quit
+        :return: ReturnCodes.SUCCESS, ReturnCodes.NOT_REGISTERED or ReturnCodes.ILLEGAL_TRANSITION
+        """
+        if _trace.enabled:
+            log.debug("Agent go to unkowen  state")
+        return self._control(aid, _destroy if force else _quit)
 
     def resume(self, aid):
-        log.debug("Agent go to active  state")
-        return ReturnCodes.SUCCESS
+        if _trace.enabled:
+            log.debug("Agent go to active  state")
+        return self._control(aid, _resume)
+
+    def wakeup(self, aid):
+        if _trace.enabled:
+            log.debug("Agent go to active  state")
+        return self._control(aid, _wakeup)
+
+    def execute(self, aid):
+        if _trace.enabled:
+            log.debug("Agent go to active state")
+        return self._control(aid, _execute)
 
-    def create(self, agent_path_file_name):
+    def invoke_all(self, aids=None, description=None):
         """
-        The creation or installation of a new agent
-        :param agent_path_file_name:
-        :return:
+        :param aids: list of AIDs
+        :param description: AMSAgentDescription template selecting the agents when aids is None
+        :return: number of agents transitioned, those whose state does not allow the operation are not counted
+        """
+        log.debug("Agents go to active state")
+        return self._control_all(aids, description, self._invoke)
+
+    def suspend_all(self, aids=None, description=None):
+        log.debug("Agents go to suspend state")
+        return self._control_all(aids, description, _suspend)
+
+    def resume_all(self, aids=None, description=None):
+        log.debug("Agents go to active state")
+        return self._control_all(aids, description, _resume)
+
+    def wakeup_all(self, aids=None, description=None):
+        log.debug("Agents go to active state")
+        return self._control_all(aids, description, _wakeup)
+
+    def execute_all(self, aids=None, description=None):
+        log.debug("Agents go to active state")
+        return self._control_all(aids, description, _execute)
+
+    def terminate_all(self, aids=None, description=None, force=False):
+        log.debug("Agents go to unknown state")
+        return self._control_all(aids, description, _destroy if force else _quit)
+
+    def state_of(self, aid):
+        """
+        :param aid: agent identifier
+        :return: AgentState of the agent, AgentState.UNKNOWN when it is not registered
+        """
+        self._sync()
+        description = self._directory.get(aid)
+        return description.state if description is not None else AgentState.UNKNOWN
+
+    def start_profiling(self, accounting=True, sampling=True, interval=0.01, max_overhead=0.02):
+        """
+        Profile the agents of the platform runtime. Accounting adds the wall and
+        CPU time of every behaviour step to its AID and behaviour; sampling runs
+        a CPU sampling profiler collecting collapsed stacks, it must be started
+        from the main thread, the one running the event loop.
+        :param accounting: account the behaviour steps
+        :param sampling: run the sampling profiler
+        :param interval: CPU seconds between two samples
+        :param max_overhead: share of the CPU time the sampler may take, its interval grows to stay under it
+        :return: ReturnCodes.SUCCESS, ReturnCodes.ALREADY_REGISTERED when profiling,
+                 ReturnCodes.NOT_REGISTERED without platform or ReturnCodes.FATAL when sampling is not possible
         """
-        log.debug("Creating agent")
+        if self._platform is None:
+            return ReturnCodes.NOT_REGISTERED
+        if self.profiler is not None and self.profiler.active:
+            return ReturnCodes.ALREADY_REGISTERED
+        from copdai_core.profiler import Profiler
+        profiler = Profiler(interval, max_overhead)
+        if sampling and not profiler.start():
+            return ReturnCodes.FATAL
+        if accounting:
+            profiler.accounting = True
+            self._platform.runtime.profiler = profiler
+        self.profiler = profiler
         return ReturnCodes.SUCCESS
 
-    def execute(self, aid):
-        log.debug("Agent go to active state")
+    def stop_profiling(self):
+        """
+        Stop profiling, the results stay in the profiler attribute until the next start_profiling
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED when not profiling
+        """
+        profiler = self.profiler
+        if profiler is None or not profiler.active:
+            return ReturnCodes.NOT_REGISTERED
+        profiler.stop()
+        profiler.accounting = False
+        if self._platform.runtime.profiler is profiler:
+            self._platform.runtime.profiler = None
         return ReturnCodes.SUCCESS
 
+    def transitions_published(self, events):
+        """
+        Subscriber of the platform runtime transitions, keeps the directory in line with the hosted agents.
+        Only the last transition of every agent in the batch is applied.
+        :param events: list of TransitionEvent
+        """
+        last = {}
+        for event in events:
+            last[event.aid] = event.state
+        agents = self._agents
+        directory = self._directory
+        for aid, state in last.items():
+            if state is AgentState.UNKNOWN:
+                if agents.pop(aid, None) is not None:
+                    directory.deregister(aid)
+            elif aid in agents:
+                directory.set_state(aid, state)
+
+    def _forget(self, aid):
+        # the agent migrated, it is registered with the AMS of its new platform
+        if self._agents.pop(aid, None) is not None:
+            self._directory.deregister(aid)
+
+    def _sync(self):
+        # apply the transitions still pending in the runtime stream before reading the directory
+        if self._platform is not None:
+            self._platform.runtime.transitions.flush()
+
+    def _invoke(self, agent):
+        if self._platform is not None:
+            runtime = self._platform.runtime
+            if agent.state is not AgentState.INITIATED or agent in runtime:
+                return ReturnCodes.ILLEGAL_TRANSITION
+            try:
+                runtime.spawn(agent)
+            except RuntimeError:
+                # the agent would never run, it stays initiated until invoked in the event loop
+                log.warning('Cannot invoke %s outside a running event loop', agent.aid)
+                return ReturnCodes.FATAL
+            return ReturnCodes.SUCCESS
+        return agent.invoke()
+
+    def _control(self, aid, transition):
+        agent = self._agents.get(aid)
+        if agent is None:
+            return ReturnCodes.NOT_REGISTERED
+        return self._transit(aid, agent, transition)
+
+    def _control_all(self, aids, description, transition):
+        if aids is None:
+            aids = [entry.name for entry in self._directory.search(description)]
+        return self._apply(aids, transition)
+
+    def _apply(self, aids, transition):
+        # only the agents the life cycle let through are counted
+        agents = self._agents
+        transit = self._transit
+        count = 0
+        for aid in aids:
+            agent = agents.get(aid)
+            if agent is not None and transit(aid, agent, transition) is ReturnCodes.SUCCESS:
+                count += 1
+        return count
+
+    def _transit(self, aid, agent, transition):
+        code = transition(agent)
+        if code is not ReturnCodes.SUCCESS:
+            return code
+        state = agent.state
+        if state is AgentState.UNKNOWN:
+            # a terminated agent leaves the AP, the runtime observer may already have removed it
+            self._agents.pop(aid, None)
+            self._directory.deregister(aid)
+        else:
+            self._directory.set_state(aid, state)
+        return code
+
     def manage_resource(self):
         return ReturnCodes.SUCCESS
 
@@ -312,6 +994,32 @@ class AgentManagementSystem(AbstractAgent):
         return ReturnCodes.SUCCESS
 
 
+def _suspend(agent):
+    return agent.suspend()
+
+
+def _resume(agent):
+    return agent.resume()
+
+
+def _wakeup(agent):
+    return agent.wakeup()
+
+
+def _execute(agent):
+    return agent.execute()
+
+
+def _quit(agent):
+    return agent.quit()
+
+
+def _destroy(agent):
+    if agent._runtime is not None:
+        return agent._runtime.destroy(agent)
+    return agent.destroy()
+
+
 class DirectoryFacilitator(object):
     """
     A Directory Facilitator (DF) is a mandatory component of the AP.
@@ -321,18 +1029,114 @@ class DirectoryFacilitator(object):
     Multiple DFs may exist within an AP and may be federated.
     """
 
-    def register(self):
-        return ReturnCodes.SUCCESS
+    # default max-results search constraint, a broad query never materialises more than one page
+    DEFAULT_MAX_RESULTS = 100
 
-    def deregister(self):
-        return ReturnCodes.SUCCESS
+    def __init__(self, max_results=DEFAULT_MAX_RESULTS, max_fanout=16):
+        self.max_results = max_results
+        # yellow pages directory of the services registered with the DF
+        self._directory = ServiceDirectory()
+        # the DFs this one is federated with
+        self._federation = None
+        self.max_fanout = max_fanout
+        # metrics.Timings of the directory operations, set by AgentPlatform.start_metrics
+        self.timings = None
 
-    def modify(self):
-        return ReturnCodes.SUCCESS
+    def register(self, description):
+        """
+        Publish the services of an agent
+        :param description: DFAgentDescription of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('register', self._directory.register, description)
+        return self._directory.register(description)
 
-    def search(self):
+    def deregister(self, aid):
+        """
+        Withdraw all the services of an agent
+        :param aid: agent identifier
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('deregister', self._directory.deregister, aid)
+        return self._directory.deregister(aid)
+
+    def modify(self, description):
+        """
+        Replace the published services of an agent
+        :param description: DFAgentDescription of the agent
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('modify', self._directory.modify, description)
+        return self._directory.modify(description)
+
+    def search(self, description=None, max_results=None, offset=0):
+        """
+        Search the yellow pages directory one page at a time
+        :param description: DFAgentDescription template, None fields are wildcards
+        :param max_results: page size, capped by the DF max_results
+        :param offset: number of matching descriptions to skip
+        :return: list of matching DFAgentDescription
+        """
+        if max_results is None or (self.max_results is not None and max_results > self.max_results):
+            max_results = self.max_results
+        timings = self.timings
+        if timings is not None and timings.due():
+            return timings.call('search', self._directory.search, description, max_results, offset)
+        return self._directory.search(description, max_results, offset)
+
+    def add_peer(self, peer):
+        """
+        Federate with another DF, searches may then be propagated to it
+        :param peer: DFPeer, a DirectoryFacilitator is wrapped in a LocalDFPeer
+        :return: ReturnCodes.SUCCESS
+        """
+        if isinstance(peer, DirectoryFacilitator):
+            from copdai_core.federation import LocalDFPeer
+            peer = LocalDFPeer(peer)
+        self._get_federation().peers.append(peer)
         return ReturnCodes.SUCCESS
 
+    def remove_peer(self, peer):
+        """
+        :param peer: DFPeer or DirectoryFacilitator previously added
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        from copdai_core.federation import LocalDFPeer
+        peers = self._get_federation().peers
+        for known in peers:
+            if known is peer or (isinstance(known, LocalDFPeer) and known.df is peer):
+                peers.remove(known)
+                return ReturnCodes.SUCCESS
+        return ReturnCodes.NOT_REGISTERED
+
+    async def federated_search(self, description=None, max_results=None, max_depth=1, timeout=None,
+                               search_id=None):
+        """
+        Search this DF and, in parallel, the DFs it is federated with
+        :param description: DFAgentDescription template, None fields are wildcards
+        :param max_results: maximum number of results, capped by the DF max_results
+        :param max_depth: number of federation hops allowed, 0 searches this DF only
+        :param timeout: global deadline in seconds, partial results are returned when it expires
+        :param search_id: ID of the search, only given when the search is propagated by a peer
+        :return: list of DFAgentDescription deduplicated by AID
+        """
+        return await self._get_federation().search(description, max_results, max_depth, timeout, search_id)
+
+    def _get_federation(self):
+        """
+        :return: DFFederation of this DF, created the first time the DF is federated or searched
+        """
+        if self._federation is None:
+            from copdai_core.federation import DFFederation
+            self._federation = DFFederation(self, self.max_fanout)
+        return self._federation
+
 
 class MessageTransportService(object):
     """
@@ -341,22 +1145,414 @@ class MessageTransportService(object):
     (see [FIPA00067]).
     """
 
-    def deliverMessage(self, agent):
+    def __init__(self, capacity=1024, policy=OverflowPolicy.DROP_OLDEST, block_timeout=None, spill_directory=None,
+                 segment_size=None):
+        # every agent mailbox is bounded, a slow or suspended agent cannot make the platform memory grow
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill_directory = spill_directory
+        # with the SPILL policy the mailboxes overflow to memory-mapped segments shared by the platform,
+        # of segments.DEFAULT_SEGMENT_SIZE bytes unless segment_size is given
+        self.segment_size = segment_size
+        self.segments = None
+        # agents hosted on this platform by AID
+        self._agents = {}
+        # called with a message and the list of receivers that are not hosted here
+        self.router = None
+        # inter-platform transports, created by listen or add_route
+        self.transports = None
+        # transport address of the remote platforms by platform name
+        self.routes = {}
+        # address the other platforms reach this one at, set by listen
+        self.address = None
+        # new location of the agents that left, and the mailboxes of those still in transit
+        self._forwards = None
+        self._departed = {}
+        # aid -> (stored messages the connection refused, task forwarding them once it drained)
+        self._backlogs = {}
+        # former platform of the agents that arrived here and did not execute yet
+        self._origins = {}
+        # histogram of the sampled send durations, see sample
+        self.latency = None
+        self.sample_every = 64
+        self._countdown = 0
+
+    @property
+    def forwards(self):
+        """
+        :return: transport.ForwardingTable, created when the first agent leaves the platform
+        """
+        if self._forwards is None:
+            from copdai_core.transport import ForwardingTable
+            self._forwards = ForwardingTable()
+        return self._forwards
+
+    def sample(self, latency, sample_every=64):
+        """
+        Time one send in sample_every
+        :param latency: metrics.Histogram observing the durations, None to stop sampling
+        :param sample_every: sampling period in messages
+        """
+        self.latency = latency
+        self.sample_every = sample_every
+        self._countdown = sample_every
+
+    def attach(self, agent):
+        """
+        Host an agent, messages sent to its AID are delivered to its mailbox
+        :param agent: local agent
+        :return: Mailbox of the agent
+        """
+        self._agents[agent.aid] = agent
+        return self.mailbox(agent)
+
+    def detach(self, agent):
+        """
+        :param agent: local agent leaving the platform
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        self._origins.pop(agent.aid, None)
+        if self._agents.pop(agent.aid, None) is None:
+            return ReturnCodes.NOT_REGISTERED
+        if agent._mailbox is not None and self.segments is not None:
+            # the spilled messages of an agent that left are not replayed, their segments can be reclaimed
+            agent._mailbox.close()
+        return ReturnCodes.SUCCESS
+
+    def send(self, message):
+        """
+        Deliver a message to its local receivers and hand the others to the router.
+        A co-located receiver gets the message object itself, never a copy, so every
+        local receiver of a multicast shares the same payload; only the router
+        serializes, once per message, when receivers live in another process.
+        The sender must not modify a message once it is sent.
+        :param message: ACLMessage
+        :return: ReturnCodes.SUCCESS or the failure of the first undeliverable receiver
+        """
+        if self.latency is not None:
+            self._countdown -= 1
+            if not self._countdown:
+                return self._sampled_send(message)
+        result = ReturnCodes.SUCCESS
+        remote = None
+        local = self._agents.get
+        for aid in message.receivers:
+            agent = local(aid)
+            if agent is not None:
+                # the mailbox is held while the agent is not active, it buffers the message itself
+                mailbox = agent._mailbox
+                if mailbox is None:
+                    mailbox = self.mailbox(agent)
+                code = mailbox.put(message)
+            else:
+                code = self._elsewhere(aid, message)
+                if code is None:
+                    if remote is None:
+                        remote = []
+                    remote.append(aid)
+                    continue
+            if code is not ReturnCodes.SUCCESS and result is ReturnCodes.SUCCESS:
+                result = code
+        if remote:
+            return self._route(message, remote, result)
+        return result
+
+    def _route(self, message, remote, result):
+        # the router serializes the message once for every remote receiver
+        code = self.router(message, remote)
+        return code if result is ReturnCodes.SUCCESS else result
+
+    def _elsewhere(self, aid, message):
+        """
+        :param aid: receiver not hosted here
+        :param message: ACLMessage
+        :return: code of the forward of a moved receiver, None to hand it to the router,
+                 ReturnCodes.NOT_REGISTERED without router
+        """
+        code = self._redirect(aid, message) if self._departed or self._forwards else None
+        if code is None and self.router is None:
+            return ReturnCodes.NOT_REGISTERED
+        return code
+
+    def _sampled_send(self, message):
+        # the countdown is rearmed first, the nested send is not sampled
+        self._countdown = self.sample_every + 1
+        start = time.perf_counter()
+        result = self.send(message)
+        self.latency.observe(time.perf_counter() - start)
+        return result
+
+    def deliver_local(self, message):
+        """
+        Deliver a message coming from another platform or shard to its receivers hosted here,
+        the decoded message is shared by all of them
+        :param message: ACLMessage
+        :return: number of local receivers
+        """
+        if message.protocol == MOBILITY_PROTOCOL and not message.receivers:
+            self._arrived(message.sender, message.content)
+            return 0
+        count = 0
+        local = self._agents.get
+        for aid in message.receivers:
+            agent = local(aid)
+            if agent is not None:
+                mailbox = agent._mailbox
+                if mailbox is None:
+                    mailbox = self.mailbox(agent)
+                mailbox.put(message)
+                count += 1
+            elif self._departed or self._forwards:
+                # a sender that does not know the agent moved yet
+                self._redirect(aid, message)
+        return count
+
+    def depart(self, agent):
+        """
+        The agent left for another platform while in transit: its messages are
+        stored, with those already buffered, until it executes at its new location
+        :param agent: local agent in AgentState.TRANSIT
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if self._agents.pop(agent.aid, None) is None:
+            return ReturnCodes.NOT_REGISTERED
+        mailbox = self.mailbox(agent)
+        mailbox.hold()
+        mailbox.listener = None
+        # nothing is dropped while the agent is in transit, whatever the overflow policy of the platform
+        mailbox.capacity = sys.maxsize
+        self._departed[agent.aid] = mailbox
+        agent._mailbox = None
+        address = self.forwards.get(agent.aid)
+        if address is not None:
+            # the agent already executes at its new location
+            return self._arrived(agent.aid, address)
+        return ReturnCodes.SUCCESS
+
+    def arrive(self, agent, origin):
+        """
+        Host an agent coming from another platform, its former platform is told
+        where it lives once it executes here
+        :param agent: agent in AgentState.TRANSIT
+        :param origin: transport address of the platform the agent left
+        :return: Mailbox of the agent
+        """
+        self._origins[agent.aid] = origin
+        return self.attach(agent)
+
+    def executed(self, agent):
+        """
+        Called when an agent leaves the transit state on this platform
+        :param agent: local agent
+        :return: ReturnCodes.SUCCESS
+        """
+        origin = self._origins.pop(agent.aid, None)
+        if origin is not None:
+            notice = acl.ACLMessage(acl.Performative.INFORM, sender=agent.aid, protocol=MOBILITY_PROTOCOL,
+                                    content=self.address)
+            return self._transports().send(origin, acl.encode(notice))
+        return ReturnCodes.SUCCESS
+
+    def _arrived(self, aid, address):
+        # the agent executes at its new location: the stored messages go in bulk writes, the next ones are forwarded
+        self.forwards.expire()
+        self.forwards.set(aid, address)
+        if aid not in self._departed:
+            return ReturnCodes.SUCCESS
+        return self._forward_stored(aid, address)
+
+    def _forward_stored(self, aid, address):
+        # frames stay under the backpressure limit of the connection, what it refuses waits for it to drain
+        mailbox = self._departed[aid]
+        backlog = self._backlogs.pop(aid, None)
+        stored = backlog[0] if backlog is not None else []
+        stored.extend(mailbox.drain())
+        connection = self._transports().connection(address)
+        limit = connection.max_pending_bytes // 2
+        chunk = []
+        size = 0
+        # index of the first message of the chunk
+        first = 0
+        for index, message in enumerate(stored):
+            frame = _frame(message)
+            if frame is None:
+                log.warning('A message of %s cannot be encoded as an ACL frame, it is not forwarded to %s', aid,
+                            address)
+                continue
+            if len(frame) > connection.max_pending_bytes:
+                log.warning('A message of %s of %d bytes is too large to be forwarded to %s', aid, len(frame),
+                            address)
+                continue
+            if chunk and size + len(frame) > limit:
+                if connection.send(b''.join(chunk)) is not ReturnCodes.SUCCESS:
+                    return self._retry_stored(aid, address, connection, stored[first:])
+                chunk = []
+                size = 0
+            if not chunk:
+                first = index
+            chunk.append(frame)
+            size += len(frame)
+        if chunk and connection.send(b''.join(chunk)) is not ReturnCodes.SUCCESS:
+            return self._retry_stored(aid, address, connection, stored[first:])
+        del self._departed[aid]
+        mailbox.close()
+        return ReturnCodes.SUCCESS
+
+    def _retry_stored(self, aid, address, connection, remaining):
+        async def retry():
+            await connection.drain()
+            if aid in self._departed:
+                self._forward_stored(aid, address)
+
+        self._backlogs[aid] = (remaining, asyncio.ensure_future(retry()))
+        return ReturnCodes.SUCCESS
+
+    def _redirect(self, aid, message):
+        mailbox = self._departed.get(aid)
+        if mailbox is not None:
+            return mailbox.put(message)
+        address = self.forwards.get(aid)
+        if address is not None:
+            frame = _frame(message)
+            if frame is None:
+                log.warning('A message to %s cannot be encoded as an ACL frame, it is not forwarded to %s', aid,
+                            address)
+                return ReturnCodes.FATAL
+            return self._transports().send(address, frame)
+        return None
+
+    async def listen(self, address):
+        """
+        Accept messages sent by other platforms
+        :param address: transport address such as tcp://0.0.0.0:7000 or unix:///run/copdai.sock
+        :return: the address other platforms use to reach this one
+        """
+        bound = await self._transports().listen(address, self.deliver_local)
+        if self.address is None:
+            self.address = bound
+        return bound
+
+    def add_route(self, platform, address):
+        """
+        Reach the agents of a remote platform through one of the transports,
+        the receivers with a matching AID address do not need a route
+        :param platform: platform name, the part of an AID after the @
+        :param address: transport address the remote platform listens on
+        :return: ReturnCodes.SUCCESS
+        """
+        self._transports()
+        self.routes[platform] = address
+        return ReturnCodes.SUCCESS
+
+    def forward(self, message, receivers):
+        """
+        Router sending the receivers hosted on other platforms through the transports,
+        the message is encoded once whatever the number of destination platforms
+        :param message: ACLMessage
+        :param receivers: AIDs not hosted on this platform
+        :return: ReturnCodes.SUCCESS or the failure of the first undeliverable receiver
+        """
+        result = ReturnCodes.SUCCESS
+        destinations = set()
+        for aid in receivers:
+            address = self._address_of(aid)
+            if address is None:
+                result = ReturnCodes.NOT_REGISTERED
+            else:
+                destinations.add(address)
+        if destinations:
+            frame = acl.encode(message)
+            for address in destinations:
+                code = self.transports.send(address, frame)
+                if code is not ReturnCodes.SUCCESS and result is ReturnCodes.SUCCESS:
+                    result = code
+        return result
+
+    async def close(self):
+        """
+        Flush the messages in flight, close the inter-platform connections and delete the spill segments
+        :return: ReturnCodes.SUCCESS
+        """
+        if self.transports is not None:
+            await self.transports.close()
+        if self.segments is not None:
+            self.segments.close()
+            self.segments = None
+        return ReturnCodes.SUCCESS
+
+    def _transports(self):
+        if self.transports is None:
+            from copdai_core.transport import TransportPool
+            self.transports = TransportPool()
+            if self.router is None:
+                self.router = self.forward
+        return self.transports
+
+    def _address_of(self, aid):
+        for address in getattr(aid, 'addresses', ()):
+            if self.transports.supports(address):
+                return address
+        return self.routes.get(str(aid).rpartition('@')[2])
+
+    def mailbox(self, agent):
+        """
+        Mailbox of an agent, created the first time a message is sent to it
+        :param agent: receiver agent
+        :return: Mailbox of the agent
+        """
+        mailbox = agent._mailbox
+        if mailbox is None:
+            spill = None
+            if self.policy is OverflowPolicy.SPILL:
+                if self.segments is None:
+                    from copdai_core.segments import SegmentStore
+                    self.segments = SegmentStore(self.spill_directory, self.segment_size)
+                spill = self.segments.queue()
+            mailbox = agent._mailbox = Mailbox(self.capacity, self.policy, self.block_timeout, self.spill_directory,
+                                               spill)
+            if agent.state is AgentState.ACTIVE:
+                mailbox.release()
+        return mailbox
+
+    def deliverMessage(self, agent, message):
         """
         The MTS delivers messages to the agent as normal if it is in state
         active, if it is in state (Initiated/Waiting/Suspended) The MTS either
         buffers messages until the agent returns to the active state
         or forwards messages to a new location (if a forward is set for the agent)..
-        :param agent:
-        :return:
+        :param agent: receiver agent
+        :param message: message to deliver
+        :return: ReturnCodes.SUCCESS or ReturnCodes.BUFFER_OVERFLOW when the message was refused
         """
-        return ReturnCodes.SUCCESS
+        if agent.aid not in self._agents and (self._departed or self._forwards):
+            code = self._redirect(agent.aid, message)
+            if code is not None:
+                return code
+        if agent.state is not AgentState.ACTIVE:
+            return self.bufferMessage(agent, message)
+        return self.mailbox(agent).put(message)
+
+    def bufferMessage(self, agent, message):
+        """
+        Keep a message until the agent returns to the active state, the mailbox
+        is flushed to the agent by the transition
+        :param agent: receiver agent
+        :param message: message to buffer
+        :return: ReturnCodes.SUCCESS or ReturnCodes.BUFFER_OVERFLOW when the message was refused
+        """
+        mailbox = self.mailbox(agent)
+        if agent.state is not AgentState.ACTIVE:
+            mailbox.hold()
+        return mailbox.put(message)
 
-    def bufferMessage(self):
-        return ReturnCodes.SUCCESS
 
-"""
-One or more transport-descriptions, each of which is a self describing structure containing a transport-type, 
-a transport-specific-address and zero or more transport-specific-properties used to communicate with the agent
-#self.locator = locator
-"""
\ No newline at end of file
+def _frame(message):
+    """
+    :param message: message leaving the platform
+    :return: its ACL frame, None when it is not an ACLMessage or its content is an object passed by reference
+    """
+    try:
+        return acl.encode(message)
+    except (AttributeError, TypeError, ValueError, struct.error):
+        return None
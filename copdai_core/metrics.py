@@ -0,0 +1,268 @@
+import time
+from bisect import bisect_left
+
+from copdai_core.commun import AgentState
+
+# upper bounds in seconds of the latency histograms, from 1 us to 10 s
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+                   5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+
+class Counter(object):
+    """Monotonic count, increments are plain attribute updates."""
+
+    __slots__ = ['value']
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram(object):
+    """
+    Distribution of observed values in cumulative buckets, the bucket of a
+    value is found by bisection and the cumulative counts are only computed
+    when collected.
+    """
+
+    __slots__ = ['buckets', 'counts', 'sum', 'count']
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one count per bucket and one for the values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        :param q: quantile between 0 and 1
+        :return: upper bound of the bucket holding the quantile, None without observation
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self, name, labels):
+        samples = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            samples.append((name + '_bucket', labels + (('le', _format(bound)),), total))
+        samples.append((name + '_bucket', labels + (('le', '+Inf'),), self.count))
+        samples.append((name + '_sum', labels, self.sum))
+        samples.append((name + '_count', labels, self.count))
+        return samples
+
+
+class Timings(dict):
+    """Histograms of the operations of a service by operation name, one call in sample_every is timed."""
+
+    def __init__(self, registry, name, documentation, operations, sample_every=1):
+        super().__init__((operation, registry.histogram(name, documentation, operation=operation))
+                         for operation in operations)
+        self.sample_every = sample_every
+        self._countdown = sample_every
+
+    def due(self):
+        """
+        :return: True when the next call is to be timed
+        """
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.sample_every
+        return True
+
+    def call(self, operation, function, *args):
+        """
+        :param operation: name of the operation
+        :param function: called with args
+        :return: the result of function, its duration is observed by the histogram of the operation
+        """
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self[operation].observe(time.perf_counter() - start)
+
+
+class StateTimes(object):
+    """
+    Time spent by the agents in each AgentState, accounted from the batches
+    of a TransitionStream: a transition is dated when its batch is
+    published, at most one event loop iteration after it happened.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        # seconds spent in the states left
+        self.seconds = dict((state, 0.0) for state in AgentState)
+        # aid -> (current state, time it was entered)
+        self._entered = {}
+
+    def transitions_published(self, events):
+        """
+        Subscriber of a TransitionStream
+        :param events: list of TransitionEvent
+        """
+        now = self.clock()
+        entered = self._entered
+        seconds = self.seconds
+        for aid, previous, state in events:
+            since = entered.pop(aid, None)
+            if since is not None:
+                seconds[since[0]] += now - since[1]
+            if state is not AgentState.UNKNOWN:
+                entered[aid] = (state, now)
+
+    def totals(self):
+        """
+        :return: dict of AgentState -> seconds, including the time spent so far in the current states
+        """
+        now = self.clock()
+        totals = dict(self.seconds)
+        for state, since in self._entered.values():
+            totals[state] += now - since
+        return totals
+
+    def collect(self):
+        for state, seconds in self.totals().items():
+            yield ('copdai_agent_state_seconds_total', COUNTER, 'Time spent by the agents in each state',
+                   {'state': state.name.lower()}, seconds)
+
+
+class MetricsRegistry(object):
+    """
+    Pull based registry of the platform metrics.
+    Counters and histograms are updated in place by the instrumented code;
+    values only known by walking the platform, such as the mailbox depths,
+    come from collectors called when the metrics are collected.
+    """
+
+    def __init__(self):
+        # name -> [type, help, {labels: metric}]
+        self._families = {}
+        self._collectors = []
+
+    def counter(self, name, documentation, **labels):
+        """
+        :param name: metric name
+        :param documentation: help line of the metric
+        :param labels: label values of this counter
+        :return: Counter, the same one for the same name and labels
+        """
+        return self._metric(name, COUNTER, documentation, labels, Counter)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS, **labels):
+        """
+        :param name: metric name
+        :param documentation: help line of the metric
+        :param buckets: increasing upper bounds of the buckets
+        :param labels: label values of this histogram
+        :return: Histogram, the same one for the same name and labels
+        """
+        return self._metric(name, HISTOGRAM, documentation, labels, lambda: Histogram(buckets))
+
+    def collector(self, collect):
+        """
+        :param collect: called without argument when the metrics are collected, returns
+                        an iterable of (name, type, help, labels dict, value)
+        """
+        self._collectors.append(collect)
+
+    def remove_collector(self, collect):
+        self._collectors.remove(collect)
+
+    def collect(self):
+        """
+        Pull API
+        :return: dict of name -> (type, help, list of (sample name, labels tuple, value)), in registration order
+        """
+        families = {}
+        for name, (kind, documentation, metrics) in self._families.items():
+            samples = []
+            for labels, metric in metrics.items():
+                samples.extend(metric.samples(name, labels))
+            families[name] = (kind, documentation, samples)
+        for collect in self._collectors:
+            for name, kind, documentation, labels, value in collect():
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = (kind, documentation, [])
+                family[2].append((name, tuple(sorted(labels.items())), value))
+        return families
+
+    def value(self, name, **labels):
+        """
+        :param name: sample name, such as a counter or the _count of a histogram
+        :param labels: labels of the sample
+        :return: the sample value, None when it is not collected
+        """
+        key = tuple(sorted(labels.items()))
+        for kind, documentation, samples in self.collect().values():
+            for sample, sample_labels, value in samples:
+                if sample == name and sample_labels == key:
+                    return value
+        return None
+
+    def exposition(self):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for name, (kind, documentation, samples) in self.collect().items():
+            lines.append('# HELP %s %s' % (name, documentation.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for sample, labels, value in samples:
+                if labels:
+                    lines.append('%s{%s} %s' % (sample, ','.join('%s="%s"' % (key, _escape(label))
+                                                                 for key, label in labels), _format(value)))
+                else:
+                    lines.append('%s %s' % (sample, _format(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def _metric(self, name, kind, documentation, labels, factory):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = [kind, documentation, {}]
+        elif family[0] != kind:
+            raise ValueError('%s is already a %s' % (name, family[0]))
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = factory()
+        return metric
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
@@ -0,0 +1,331 @@
+import asyncio
+import hashlib
+import hmac
+import importlib
+import io
+import ipaddress
+import logging
+import os
+import pickle
+import struct
+from collections import namedtuple
+
+from copdai_core.commun import ReturnCodes, AgentState
+from copdai_core.transport import parse_address, TCPTransport, UnixTransport
+
+log = logging.getLogger(__name__)
+
+# Snapshot layout: pickle protocol 5 of (version, module, class name, {slot: value}),
+# bytes-like values of at least OUT_OF_BAND_SIZE bytes travel as out-of-band buffers next to it
+SNAPSHOT_VERSION = 1
+OUT_OF_BAND_SIZE = 1 << 15
+# persistent id of the agent itself in its snapshot, the behaviours of an agent refer to it
+_AGENT = 'agent'
+# slots rebuilt by the destination platform, never shipped
+_LOCAL_SLOTS = frozenset(['_state', '_pid', '_run', '_mailbox', '_runtime', '__weakref__', '__dict__'])
+
+# Migration request: u8 protocol version | u16 origin length | u32 snapshot length | u16 buffer count,
+# the HMAC-SHA256 of the rest of the request (zeros without key), then per buffer a u64 length and a u8
+# writable flag, the origin address, the snapshot and the buffers.
+# The destination answers with the u8 value of a ReturnCodes once the agent is registered there, the
+# origin releases the agent and commits with ReturnCodes.SUCCESS, then the destination executes the agent
+# and answers again. Without the commit the destination drops the agent, which never runs twice.
+PROTOCOL_VERSION = 2
+_REQUEST = struct.Struct('!BHIH')
+_MAC_SIZE = hashlib.sha256().digest_size
+_NO_MAC = bytes(_MAC_SIZE)
+_BUFFER = struct.Struct('!QB')
+_ANSWER = struct.Struct('!B')
+
+# Outcome of a migration, pause is the time in seconds the agent was not active
+MigrationReport = namedtuple('MigrationReport', ['code', 'pause', 'snapshot_size', 'buffer_size'])
+
+
+class Snapshot(object):
+    """
+    Compact state of an agent: the values of its __slots__ pickled with
+    protocol 5, the large buffers being kept out-of-band so they are written
+    to the socket as they are instead of being copied into the pickle.
+    """
+
+    __slots__ = ['data', 'buffers']
+
+    def __init__(self, data, buffers=()):
+        self.data = data
+        self.buffers = list(buffers)
+
+    @property
+    def buffer_size(self):
+        return sum(len(buffer.raw()) if isinstance(buffer, pickle.PickleBuffer) else len(buffer)
+                   for buffer in self.buffers)
+
+
+def slot_names(cls):
+    """
+    :param cls: agent class
+    :return: names of the slots declared along the class hierarchy, in declaration order
+    """
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def snapshot(agent):
+    """
+    :param agent: AbstractAgent, usually in AgentState.TRANSIT
+    :return: Snapshot of the agent
+    """
+    cls = agent.__class__
+    values = {}
+    for name in slot_names(cls):
+        if name in _LOCAL_SLOTS or not hasattr(agent, name):
+            continue
+        value = getattr(agent, name)
+        if isinstance(value, (bytes, bytearray)) and len(value) >= OUT_OF_BAND_SIZE:
+            value = pickle.PickleBuffer(value)
+        values[name] = value
+    buffers = []
+    output = io.BytesIO()
+    _SnapshotPickler(output, agent, buffers.append).dump((SNAPSHOT_VERSION, cls.__module__, cls.__qualname__,
+                                                          values))
+    return Snapshot(output.getvalue(), buffers)
+
+
+def restore(data, buffers=()):
+    """
+    Rebuild an agent from its snapshot, the agent is in AgentState.TRANSIT until it executes
+    :param data: pickled part of the snapshot
+    :param buffers: out-of-band buffers in snapshot order
+    :return: AbstractAgent
+    """
+    unpickler = _SnapshotUnpickler(io.BytesIO(data), buffers)
+    version, module, qualname, values = unpickler.load()
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported snapshot version %d' % version)
+    agent = unpickler.agent
+    if agent is None:
+        cls = _resolve(module, qualname)
+        agent = cls.__new__(cls)
+    for name, value in values.items():
+        setattr(agent, name, value)
+    agent._state = AgentState.TRANSIT
+    agent._pid = os.getpid()
+    agent._run = False
+    agent._mailbox = None
+    agent._runtime = None
+    return agent
+
+
+class _SnapshotPickler(pickle.Pickler):
+    # references to the agent from its own state are kept as references, not as a copy of the agent
+
+    def __init__(self, output, agent, buffer_callback):
+        super().__init__(output, protocol=5, buffer_callback=buffer_callback)
+        self.agent = agent
+
+    def persistent_id(self, obj):
+        if obj is self.agent:
+            return (_AGENT, obj.__class__.__module__, obj.__class__.__qualname__)
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, data, buffers):
+        super().__init__(data, buffers=buffers)
+        self.agent = None
+
+    def persistent_load(self, pid):
+        kind, module, qualname = pid
+        if kind != _AGENT:
+            raise pickle.UnpicklingError('Unsupported persistent id %r' % (kind,))
+        if self.agent is None:
+            cls = _resolve(module, qualname)
+            self.agent = cls.__new__(cls)
+        return self.agent
+
+
+def _resolve(module, qualname):
+    cls = importlib.import_module(module)
+    for name in qualname.split('.'):
+        cls = getattr(cls, name)
+    return cls
+
+
+class MigrationServer(object):
+    """
+    Receive the agents migrating to a platform.
+    A snapshot is unpickled, so it can run code: without a shared key the
+    server only listens on a loopback address or a Unix socket, with a key
+    the requests whose HMAC does not match are refused before unpickling.
+    """
+
+    def __init__(self, platform, transports=None, key=None):
+        self.platform = platform
+        self.transports = _by_scheme(transports)
+        self.key = key
+        self.address = None
+        self._server = None
+        self._transport = None
+        self._location = None
+
+    async def start(self, address):
+        """
+        :param address: transport address to listen on, port 0 picks a free TCP port
+        :return: the address agents are sent to
+        """
+        scheme, location = parse_address(address)
+        if self.key is None and not _local(scheme, location):
+            raise ValueError('Accepting migrations on %s needs a key, it is not a loopback address' % address)
+        self._location = location
+        self._transport = self.transports[scheme]
+        self._server, self.address = await self._transport.start_server(self._handle, self._location)
+        return self.address
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._transport.close_server(self._location)
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_REQUEST.size)
+                except asyncio.IncompleteReadError:
+                    break
+                version, origin_size, data_size, count = _REQUEST.unpack(header)
+                if version != PROTOCOL_VERSION:
+                    log.warning('Unsupported migration protocol version %d', version)
+                    break
+                mac = await reader.readexactly(_MAC_SIZE)
+                layout = await reader.readexactly(_BUFFER.size * count)
+                origin = await reader.readexactly(origin_size)
+                data = await reader.readexactly(data_size)
+                buffers = []
+                for size, writable in _BUFFER.iter_unpack(layout):
+                    buffer = await reader.readexactly(size)
+                    buffers.append(bytearray(buffer) if writable else buffer)
+                agent = None
+                if self.key is not None and not hmac.compare_digest(
+                        mac, _mac(self.key, [header, layout, origin, data] + buffers)):
+                    log.warning('Refused a migrating agent from %s: wrong key', writer.get_extra_info('peername'))
+                    code = ReturnCodes.FATAL
+                else:
+                    code, agent = self._admit(data, buffers, origin.decode('utf-8'))
+                writer.write(_ANSWER.pack(code.value))
+                await writer.drain()
+                if agent is not None:
+                    await self._commit(reader, writer, agent)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # the origin went away in the middle of a migration, it keeps its agent
+            pass
+        finally:
+            writer.close()
+
+    def _admit(self, data, buffers, origin):
+        """
+        :return: tuple of the ReturnCodes and the agent registered here, None when it was refused
+        """
+        try:
+            agent = restore(data, buffers)
+        except Exception:
+            log.exception('Cannot restore a migrating agent')
+            return ReturnCodes.FATAL, None
+        try:
+            code = self.platform.admit(agent, origin or None)
+        except Exception:
+            log.exception('Cannot host the migrating agent %s', agent.aid)
+            return ReturnCodes.FATAL, None
+        return code, agent if code is ReturnCodes.SUCCESS else None
+
+    async def _commit(self, reader, writer, agent):
+        try:
+            value, = _ANSWER.unpack(await reader.readexactly(_ANSWER.size))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # the origin may still have the agent, it must not run here too
+            self.platform.dismiss(agent)
+            raise
+        if value != ReturnCodes.SUCCESS.value:
+            self.platform.dismiss(agent)
+            return
+        try:
+            code = await self.platform.start_admitted(agent)
+        except Exception:
+            log.exception('Cannot execute the migrating agent %s', agent.aid)
+            code = ReturnCodes.FATAL
+        writer.write(_ANSWER.pack(code.value))
+        await writer.drain()
+
+
+async def send_snapshot(address, state, origin, transports=None, key=None, release=None):
+    """
+    Ship a snapshot to the migration server of another platform
+    :param address: transport address of the MigrationServer
+    :param state: Snapshot of the agent
+    :param origin: MTS address of the platform the agent leaves, None when it has none
+    :param transports: Transport instances, TCP and Unix sockets by default
+    :param key: bytes shared with the MigrationServer, None when it has no key
+    :param release: called once the destination registered the agent, before it is told to execute it;
+                    the agent must not be restored here after that, whatever the outcome
+    :return: ReturnCodes answered by the destination
+    """
+    scheme, location = parse_address(address)
+    transport = _by_scheme(transports)[scheme]
+    reader, writer = await transport.open_connection(location)
+    try:
+        origin = (origin or '').encode('utf-8')
+        views = [buffer.raw() for buffer in state.buffers]
+        header = _REQUEST.pack(PROTOCOL_VERSION, len(origin), len(state.data), len(views))
+        layout = b''.join(_BUFFER.pack(view.nbytes, 0 if view.readonly else 1) for view in views)
+        mac = _mac(key, [header, layout, origin, state.data] + views) if key is not None else _NO_MAC
+        writer.write(b''.join((header, mac, layout, origin)))
+        writer.write(state.data)
+        # out-of-band buffers go to the socket without being copied into a frame
+        for view in views:
+            writer.write(view)
+        await writer.drain()
+        value, = _ANSWER.unpack(await reader.readexactly(_ANSWER.size))
+        if value != ReturnCodes.SUCCESS.value:
+            return ReturnCodes(value)
+        if release is not None:
+            release()
+        writer.write(_ANSWER.pack(ReturnCodes.SUCCESS.value))
+        await writer.drain()
+        value, = _ANSWER.unpack(await reader.readexactly(_ANSWER.size))
+    finally:
+        writer.close()
+    return ReturnCodes(value)
+
+
+def _mac(key, parts):
+    digest = hmac.new(key, digestmod=hashlib.sha256)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
+
+
+def _local(scheme, location):
+    if scheme == 'unix':
+        return True
+    host = location.rpartition(':')[0].strip('[]')
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _by_scheme(transports):
+    if transports is None:
+        transports = (TCPTransport(), UnixTransport())
+    return dict((transport.scheme, transport) for transport in transports)
@@ -0,0 +1,355 @@
+import asyncio
+import mmap
+import os
+import pickle
+import re
+import struct
+import time
+import zlib
+
+from copdai_core.aid import AID
+from copdai_core.commun import ReturnCodes, AgentState
+from copdai_core.directory import AgentDirectory, AMSAgentDescription
+
+# Write-ahead log: a header then records of u32 length | u32 crc32 | pickle payload, one file per generation.
+# A snapshot holds the whole directory as one pickle payload and tells which generation comes next.
+# The payloads only hold tuples of str, int and None pickled with a fixed protocol, any Python version
+# since 3.4 reads them.
+_RECORD = struct.Struct('!II')
+_HEADER = struct.Struct('!4sB')
+_SNAPSHOT = struct.Struct('!4sBII')
+_MAGIC = b'CPAD'
+VERSION = 3
+_PROTOCOL = 4
+SNAPSHOT_FILE = 'snapshot'
+_LOG_FILE = 'journal.%08d.log'
+_LOG_PATTERN = re.compile(r'^journal\.(\d{8})\.log$')
+
+_REGISTER = 1
+_DEREGISTER = 2
+_MODIFY = 3
+_STATE = 4
+
+_STATES = dict((state.value, state) for state in AgentState)
+
+
+class DirectoryJournal(object):
+    """
+    Append-only write-ahead log of the white pages operations with group
+    commit: the records of many operations reach the disk in one write and
+    one fsync, when group_size records are pending or sync_interval seconds
+    after the first one; outside of an event loop nothing would run the
+    timer, so every record is committed at once. Every snapshot_every
+    records the directory is compacted into a snapshot and the logs it
+    covers are deleted.
+    Inside an event loop an operation returns before its group is written:
+    a crash loses the operations of the last sync_interval seconds at most,
+    although their callers saw them succeed. With sync_interval=0 every
+    operation is committed before it returns, and commit() makes the
+    pending operations durable at once.
+    """
+
+    def __init__(self, path, group_size=512, sync_interval=0.005, fsync=True, snapshot_every=1000000):
+        self.path = path
+        self.group_size = group_size
+        self.sync_interval = sync_interval
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self.generation = 0
+        self.directory = None
+        self._fd = None
+        self._pending = []
+        self._first_pending = 0.0
+        self._scheduled = False
+        self._since_snapshot = 0
+        # statistics: records and group commits written
+        self.records = 0
+        self.commits = 0
+
+    def open(self, directory):
+        """
+        Rebuild a directory from the snapshot and the logs, then log its changes
+        :param directory: empty AgentDirectory filled by the recovery
+        :return: number of log records replayed on top of the snapshot
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self.directory = directory
+        self.generation = self._load_snapshot(directory)
+        replayed = 0
+        generations = self._generations()
+        for generation in generations:
+            if generation >= self.generation:
+                replayed += self._replay(generation, directory, truncate=generation == generations[-1])
+        if generations and generations[-1] > self.generation:
+            self.generation = generations[-1]
+        self._since_snapshot = replayed
+        self._fd = self._open_log(self.generation)
+        return replayed
+
+    def register(self, description):
+        self._append((_REGISTER,) + _fields(description))
+
+    def register_many(self, descriptions):
+        """
+        Log a batch of registrations and write it in one commit, whatever the group size
+        :param descriptions: list of AMSAgentDescription
+        :return: number of records written
+        """
+        pending = self._pending
+        if not pending:
+            self._first_pending = time.monotonic()
+        dumps = pickle.dumps
+        pack = _RECORD.pack
+        crc32 = zlib.crc32
+        for description in descriptions:
+            payload = dumps((_REGISTER,) + _fields(description), _PROTOCOL)
+            pending.append(pack(len(payload), crc32(payload)) + payload)
+        return self.commit()
+
+    def deregister(self, aid):
+        self._append((_DEREGISTER, str(aid)))
+
+    def modify(self, description):
+        self._append((_MODIFY,) + _fields(description))
+
+    def set_state(self, aid, state):
+        self._append((_STATE, str(aid), state.value))
+
+    def commit(self):
+        """
+        Write the pending records in one system call
+        :return: number of records written
+        """
+        self._scheduled = False
+        pending = self._pending
+        if not pending or self._fd is None:
+            return 0
+        self._pending = []
+        os.write(self._fd, b''.join(pending))
+        if self.fsync:
+            os.fsync(self._fd)
+        self.records += len(pending)
+        self.commits += 1
+        self._since_snapshot += len(pending)
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        return len(pending)
+
+    def snapshot(self):
+        """
+        Compact the directory into a snapshot and delete the logs it replaces
+        :return: ReturnCodes.SUCCESS
+        """
+        self.commit()
+        entries = tuple(_fields(description) for description in self.directory._entries.values())
+        body = pickle.dumps(entries, _PROTOCOL)
+        generation = self.generation + 1
+        # the new log exists before the snapshot pointing at it
+        fd = self._open_log(generation)
+        temporary = os.path.join(self.path, SNAPSHOT_FILE + '.tmp')
+        with open(temporary, 'wb') as snapshot_file:
+            snapshot_file.write(_SNAPSHOT.pack(_MAGIC, VERSION, generation, zlib.crc32(body)))
+            snapshot_file.write(body)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary, os.path.join(self.path, SNAPSHOT_FILE))
+        os.close(self._fd)
+        self._fd = fd
+        self.generation = generation
+        self._since_snapshot = 0
+        for old in self._generations():
+            if old < generation:
+                os.unlink(self._log_path(old))
+        return ReturnCodes.SUCCESS
+
+    def close(self):
+        self.commit()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _append(self, record):
+        payload = pickle.dumps(record, _PROTOCOL)
+        pending = self._pending
+        if not pending:
+            self._first_pending = time.monotonic()
+        pending.append(_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+        if len(pending) >= self.group_size or not self.sync_interval or \
+                time.monotonic() - self._first_pending >= self.sync_interval:
+            self.commit()
+        elif not self._scheduled:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # no loop would ever run the timer, the record is written now
+                self.commit()
+                return
+            self._scheduled = True
+            loop.call_later(self.sync_interval, self.commit)
+
+    def _log_path(self, generation):
+        return os.path.join(self.path, _LOG_FILE % generation)
+
+    def _open_log(self, generation):
+        fd = os.open(self._log_path(generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if not os.fstat(fd).st_size:
+            os.write(fd, _HEADER.pack(_MAGIC, VERSION))
+        return fd
+
+    def _generations(self):
+        generations = []
+        for name in os.listdir(self.path):
+            match = _LOG_PATTERN.match(name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def _load_snapshot(self, directory):
+        path = os.path.join(self.path, SNAPSHOT_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) < _SNAPSHOT.size:
+            return 0
+        with open(path, 'rb') as snapshot_file:
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                magic, version, generation, crc = _SNAPSHOT.unpack_from(mapping)
+                _check_header(path, magic, version)
+                body = memoryview(mapping)[_SNAPSHOT.size:]
+                try:
+                    if zlib.crc32(body) != crc:
+                        raise ValueError('Corrupted directory snapshot %s' % path)
+                    entries = pickle.loads(body)
+                finally:
+                    body.release()
+        AgentDirectory.load(directory, [_description(fields) for fields in entries])
+        return generation
+
+    def _replay(self, generation, directory, truncate):
+        path = self._log_path(generation)
+        with open(path, 'rb') as log_file:
+            data = log_file.read()
+        view = memoryview(data)
+        offset = 0
+        count = 0
+        if len(data) >= _HEADER.size:
+            _check_header(path, *_HEADER.unpack_from(data))
+            offset = _HEADER.size
+        while offset + _RECORD.size <= len(data):
+            size, crc = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + size
+            payload = view[offset + _RECORD.size:end]
+            if end > len(data) or zlib.crc32(payload) != crc:
+                break
+            _apply(directory, pickle.loads(payload))
+            offset = end
+            count += 1
+        if truncate and offset < len(data):
+            # torn tail of a crash during a group commit, its operations may have been acknowledged already
+            # when sync_interval is not 0, they are lost
+            with open(path, 'r+b') as log_file:
+                log_file.truncate(offset)
+        return count
+
+
+class DurableAgentDirectory(AgentDirectory):
+    """
+    White pages directory whose changes are logged to a DirectoryJournal,
+    so a restarted platform recovers its registrations from disk.
+    """
+
+    __slots__ = ['journal']
+
+    def __init__(self, journal=None):
+        super().__init__()
+        self.journal = journal
+
+    @classmethod
+    def open(cls, path, **options):
+        """
+        :param path: directory holding the snapshot and the logs
+        :param options: DirectoryJournal options
+        :return: DurableAgentDirectory recovered from the path
+        """
+        directory = cls()
+        journal = DirectoryJournal(path, **options)
+        journal.open(directory)
+        directory.journal = journal
+        return directory
+
+    def register(self, description):
+        code = super().register(description)
+        if code is ReturnCodes.SUCCESS and self.journal is not None:
+            self.journal.register(description)
+        return code
+
+    def register_many(self, descriptions):
+        code = super().register_many(descriptions)
+        if code is ReturnCodes.SUCCESS and self.journal is not None:
+            self.journal.register_many(descriptions)
+        return code
+
+    def deregister(self, aid):
+        code = super().deregister(aid)
+        if code is ReturnCodes.SUCCESS and self.journal is not None:
+            self.journal.deregister(aid)
+        return code
+
+    def modify(self, description):
+        code = super().modify(description)
+        if code is ReturnCodes.SUCCESS and self.journal is not None:
+            self.journal.modify(description)
+        return code
+
+    def set_state(self, aid, state):
+        description = self._entries.get(aid)
+        if description is not None and description.state is state:
+            return ReturnCodes.SUCCESS
+        code = super().set_state(aid, state)
+        if code is ReturnCodes.SUCCESS and self.journal is not None:
+            self.journal.set_state(aid, state)
+        return code
+
+    def commit(self):
+        """
+        Make the operations done so far durable without waiting for their group commit
+        :return: number of records written
+        """
+        return self.journal.commit() if self.journal is not None else 0
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+
+def _check_header(path, magic, version):
+    if magic != _MAGIC or version != VERSION:
+        raise ValueError('Unsupported directory journal file %s' % path)
+
+
+def _fields(description):
+    state = description.state
+    return (str(description.name), description.ownership, state.value if state is not None else None,
+            description.platform_id, description.addresses)
+
+
+def _description(fields):
+    name, ownership, state, platform_id, addresses = fields
+    local_name, _, platform = name.rpartition('@')
+    description = AMSAgentDescription.__new__(AMSAgentDescription)
+    description.name = AID(local_name, platform)
+    description.ownership = ownership
+    description.state = _STATES.get(state)
+    description.platform_id = platform_id
+    description.addresses = addresses
+    return description
+
+
+def _apply(directory, record):
+    # replay without journaling, the record is already on disk
+    operation = record[0]
+    if operation == _REGISTER:
+        AgentDirectory.register(directory, _description(record[1:]))
+    elif operation == _DEREGISTER:
+        AgentDirectory.deregister(directory, record[1])
+    elif operation == _MODIFY:
+        AgentDirectory.modify(directory, _description(record[1:]))
+    elif operation == _STATE:
+        AgentDirectory.set_state(directory, record[1], _STATES[record[2]])
@@ -0,0 +1,201 @@
+import logging
+import os
+import signal
+import time
+
+from copdai_core.behaviours import BehaviourScheduler
+from copdai_core.runtime import AgentRuntime
+
+log = logging.getLogger(__name__)
+
+# frames recognised on the sampled stacks: the life cycle coroutine of an agent and the loop of its behaviours
+_LIFECYCLE_CODE = AgentRuntime._lifecycle.__code__
+_SCHEDULER_CODE = BehaviourScheduler.run.__code__
+
+# label of the samples taken outside of any agent, the event loop and the platform services
+PLATFORM = '<platform>'
+# label of the samples of an agent outside of its behaviours, its own run
+RUN = '<run>'
+
+
+class Profiler(object):
+    """
+    Opt-in profiler of the agents hosted by an AgentRuntime.
+
+    Accounting: the BehaviourScheduler of every agent times each behaviour
+    step, wall time with perf_counter and CPU time with thread_time, and
+    adds it to the account of the (AID, behaviour) pair. The CPU time of a
+    coroutine action is summed over the steps it runs between its awaits,
+    what runs while it awaits is not accounted to it.
+
+    Sampling: a SIGPROF interval timer interrupts the process every
+    interval seconds of CPU time, the handler runs in the event loop thread
+    and walks the interrupted stack. The sample goes to the agent whose life
+    cycle coroutine is on the stack and to the behaviour it is stepping,
+    which covers the agents with a run of their own and the platform itself.
+    Stacks are kept collapsed, one line per distinct stack, the input of
+    flamegraph.pl and speedscope. The sampler times itself and doubles its
+    interval whenever it took more than max_overhead of the CPU time.
+    """
+
+    def __init__(self, interval=0.01, max_overhead=0.02, max_depth=64):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_depth = max_depth
+        # (aid, behaviour label) -> [wall seconds, cpu seconds, steps]
+        self.accounts = {}
+        # collapsed stack -> number of samples
+        self.stacks = {}
+        # (aid, behaviour label) -> number of samples
+        self.samples = {}
+        self.sampling_time = 0.0
+        # set while the behaviour steps are accounted and while the sampler runs
+        self.accounting = False
+        self.sampling = False
+        self._labels = {}
+        self._previous_handler = None
+        self._started_cpu = 0.0
+        self._taken = 0
+
+    @property
+    def active(self):
+        return self.accounting or self.sampling
+
+    def account(self, aid, behaviour, wall, cpu):
+        """
+        :param aid: identifier of the agent
+        :param behaviour: Behaviour stepped
+        :param wall: wall time of the step in seconds
+        :param cpu: CPU time of the step in seconds
+        """
+        key = (aid, _behaviour_label(behaviour))
+        entry = self.accounts.get(key)
+        if entry is None:
+            entry = self.accounts[key] = [0.0, 0.0, 0]
+        entry[0] += wall
+        entry[1] += cpu
+        entry[2] += 1
+
+    def start(self):
+        """
+        Start the sampler, from the thread running the event loop which must be the main thread
+        :return: True when sampling, False when the platform has no SIGPROF interval timer
+        """
+        if self.sampling:
+            return True
+        if not hasattr(signal, 'setitimer'):
+            return False
+        try:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        except ValueError:
+            # not the main thread
+            return False
+        self._started_cpu = time.process_time()
+        self.sampling = True
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return True
+
+    def stop(self):
+        if not self.sampling:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self._previous_handler = None
+        self.sampling = False
+
+    def report(self):
+        """
+        :return: list of (aid, behaviour label, wall seconds, cpu seconds, steps, samples), the most CPU first,
+                 the CPU time of the pairs only seen by the sampler is estimated from their samples
+        """
+        rows = []
+        for key, (wall, cpu, steps) in self.accounts.items():
+            rows.append(key + (wall, cpu, steps, self.samples.get(key, 0)))
+        for key, count in self.samples.items():
+            if key not in self.accounts:
+                rows.append(key + (None, count * self.interval, 0, count))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def by_agent(self):
+        """
+        :return: dict of aid -> [wall seconds, cpu seconds, steps] summed over its behaviours
+        """
+        totals = {}
+        for (aid, behaviour), (wall, cpu, steps) in self.accounts.items():
+            entry = totals.get(aid)
+            if entry is None:
+                entry = totals[aid] = [0.0, 0.0, 0]
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += steps
+        return totals
+
+    def collapsed(self):
+        """
+        :return: the sampled stacks in the collapsed format, root first, one 'frame;frame;... count' per line
+        """
+        return ''.join('%s %d\n' % (stack, count)
+                       for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True))
+
+    def dump(self, path):
+        """
+        Write the collapsed stacks, for flamegraph.pl path > flamegraph.svg
+        :param path: file written
+        :return: number of distinct stacks written
+        """
+        with open(path, 'w') as output:
+            output.write(self.collapsed())
+        return len(self.stacks)
+
+    def _sample(self, signum, frame):
+        start = time.perf_counter()
+        labels = self._labels
+        names = []
+        agent = None
+        behaviour = None
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            code = frame.f_code
+            if code is _LIFECYCLE_CODE:
+                agent = frame.f_locals.get('agent')
+                break
+            if code is _SCHEDULER_CODE and behaviour is None:
+                scheduler = frame.f_locals.get('self')
+                behaviour = scheduler._current if scheduler is not None else None
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+            names.append(label)
+            frame = frame.f_back
+            depth += 1
+        if agent is not None:
+            aid = str(agent.aid)
+            behaviour_label = _behaviour_label(behaviour) if behaviour is not None else RUN
+            names.append(behaviour_label)
+            names.append(aid)
+            key = (agent.aid, behaviour_label)
+        else:
+            names.append(PLATFORM)
+            key = (PLATFORM, PLATFORM)
+        names.reverse()
+        stack = ';'.join(names)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples[key] = self.samples.get(key, 0) + 1
+        self.sampling_time += time.perf_counter() - start
+        self._taken += 1
+        if not self._taken & 127:
+            self._bound_overhead()
+
+    def _bound_overhead(self):
+        cpu = time.process_time() - self._started_cpu
+        if cpu > 0 and self.sampling_time / cpu > self.max_overhead:
+            self.interval *= 2
+            if self.sampling:
+                signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            log.info('Sampling interval raised to %.3f s to stay under %.1f%% overhead', self.interval,
+                     self.max_overhead * 100)
+
+
+def _behaviour_label(behaviour):
+    return type(behaviour).__name__
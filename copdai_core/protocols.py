@@ -0,0 +1,335 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from copdai_core.acl import ACLMessage, MessageTemplate, Performative
+from copdai_core.commun import ReturnCodes, AgentState
+
+# Interaction protocols (see [FIPA00026], [FIPA00027], [FIPA00029] and [FIPA00035])
+REQUEST = 'fipa-request'
+QUERY = 'fipa-query'
+CONTRACT_NET = 'fipa-contract-net'
+SUBSCRIBE = 'fipa-subscribe'
+
+# performatives ending the part of a responder in a phase of a protocol
+_ANSWERS = frozenset([Performative.INFORM, Performative.INFORM_REF, Performative.FAILURE, Performative.REFUSE,
+                      Performative.NOT_UNDERSTOOD])
+_BIDS = frozenset([Performative.PROPOSE, Performative.REFUSE, Performative.NOT_UNDERSTOOD])
+_RESULTS = frozenset([Performative.INFORM, Performative.FAILURE])
+_AGREEMENTS = frozenset([Performative.AGREE, Performative.INFORM, Performative.FAILURE, Performative.REFUSE,
+                         Performative.NOT_UNDERSTOOD])
+
+# Outcome of a contract-net: the PROPOSE and REFUSE received before the deadline, the proposals
+# accepted, the INFORM or FAILURE of their bidders, and whether a deadline stopped a phase
+ContractNetResult = namedtuple('ContractNetResult', ['proposals', 'refusals', 'accepted', 'results', 'expired'])
+
+
+class Conversation(object):
+    """
+    Initiator side of one interaction: the replies received on its
+    conversation-id, the responders still expected to answer in the current
+    phase and the timer of its reply-by deadline.
+    """
+
+    __slots__ = ['conversation_id', 'protocol', 'template', 'receivers', 'replies', 'pending', 'expired', 'code',
+                 'timer', 'task']
+
+    def __init__(self, conversation_id, protocol):
+        self.conversation_id = conversation_id
+        self.protocol = protocol
+        self.template = MessageTemplate(conversation_id=conversation_id)
+        self.receivers = ()
+        self.replies = []
+        # names of the responders that did not send a final reply yet
+        self.pending = set()
+        self.expired = False
+        # ReturnCodes of the last send
+        self.code = ReturnCodes.SUCCESS
+        self.timer = None
+        # notification task of a subscription
+        self.task = None
+
+    def __repr__(self):
+        return 'Conversation(%r, %s, replies=%d, pending=%d)' % (self.conversation_id, self.protocol,
+                                                                 len(self.replies), len(self.pending))
+
+    @property
+    def done(self):
+        return not self.pending or self.expired
+
+    @property
+    def last(self):
+        """Last reply received, None without reply"""
+        return self.replies[-1] if self.replies else None
+
+
+class ProtocolEngine(object):
+    """
+    Initiator of the FIPA interaction protocols for an agent hosted by an
+    AgentRuntime. Conversations are tracked by conversation-id and their
+    replies taken from the mailbox with a template on it, an index lookup,
+    so the answers of thousands of responders are collected as they come.
+    Reply-by deadlines are timers of the runtime DeadlineWheel: expiring
+    one wakes the agent up and stops the phase waiting for it.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        # conversation-id -> open Conversation
+        self.conversations = {}
+        self._sequence = 0
+
+    def open(self, protocol, timeout=None):
+        """
+        :param protocol: name of the interaction protocol
+        :param timeout: reply-by deadline in seconds from now, None for none
+        :return: new Conversation
+        """
+        self._sequence += 1
+        conversation = Conversation('%s#%d' % (self.agent.aid, self._sequence), protocol)
+        self.conversations[conversation.conversation_id] = conversation
+        self.set_deadline(conversation, timeout)
+        return conversation
+
+    def set_deadline(self, conversation, timeout):
+        """
+        Replace the reply-by deadline of a conversation
+        :param conversation: open Conversation
+        :param timeout: seconds from now, None for no deadline
+        """
+        if conversation.timer is not None:
+            conversation.timer.cancel()
+            conversation.timer = None
+        conversation.expired = False
+        if timeout is not None:
+            conversation.timer = self.agent._runtime.deadlines.call_later(timeout, self._expire, conversation)
+
+    def close(self, conversation):
+        """
+        Forget a conversation, the replies already delivered for it are discarded
+        :param conversation: Conversation
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if self.conversations.pop(conversation.conversation_id, None) is None:
+            return ReturnCodes.NOT_REGISTERED
+        if conversation.timer is not None:
+            conversation.timer.cancel()
+            conversation.timer = None
+        if conversation.task is not None and conversation.task is not asyncio.current_task():
+            conversation.task.cancel()
+        conversation.task = None
+        receive = self.agent.receive
+        template = conversation.template
+        while receive(template) is not None:
+            pass
+        return ReturnCodes.SUCCESS
+
+    def send(self, conversation, performative, receivers, content=None, timeout=None, **fields):
+        """
+        Send a message of a conversation
+        :param conversation: open Conversation
+        :param performative: Performative of the message
+        :param receivers: AIDs of the receivers
+        :param content: content of the message
+        :param timeout: reply-by deadline of the message in seconds from now
+        :param fields: other ACLMessage fields
+        :return: ReturnCodes.SUCCESS or the failure of the first undeliverable receiver
+        """
+        message = ACLMessage(performative, sender=self.agent.aid, receivers=receivers, content=content,
+                             protocol=conversation.protocol, conversation_id=conversation.conversation_id,
+                             reply_by=time.time() + timeout if timeout is not None else None, **fields)
+        conversation.code = self.agent.send(message)
+        return conversation.code
+
+    def reply(self, message, performative, content=None):
+        """
+        Responder side: answer a message in its conversation
+        :param message: ACLMessage received
+        :param performative: Performative of the answer
+        :param content: content of the answer
+        :return: ReturnCodes.SUCCESS or the failure of the delivery
+        """
+        return self.agent.send(message.create_reply(performative, content, sender=self.agent.aid))
+
+    async def collect(self, conversation, final):
+        """
+        Take the replies of a conversation until every pending responder sent a final one or the deadline expired
+        :param conversation: open Conversation
+        :param final: performatives ending the part of a responder
+        :return: the conversation
+        """
+        agent = self.agent
+        runtime = agent._runtime
+        template = conversation.template
+        replies = conversation.replies
+        pending = conversation.pending
+        while pending and not conversation.expired:
+            if agent.state is not AgentState.ACTIVE:
+                await runtime.checkpoint(agent)
+            message = agent.receive(template)
+            if message is None:
+                await runtime.idle(agent)
+                continue
+            replies.append(message)
+            if message.performative in final:
+                pending.discard(str(message.sender))
+        return conversation
+
+    async def request(self, receiver, content=None, timeout=None, **fields):
+        """
+        FIPA request, the receiver may agree before sending the outcome
+        :param receiver: AID of the agent asked to perform the action
+        :param content: action requested
+        :param timeout: reply-by deadline in seconds, None to wait forever
+        :return: closed Conversation, its last reply is the INFORM, FAILURE or REFUSE unless it expired
+        """
+        return await self._ask(REQUEST, Performative.REQUEST, receiver, content, timeout, fields)
+
+    async def query(self, receiver, content=None, timeout=None, performative=Performative.QUERY_REF, **fields):
+        """
+        FIPA query
+        :param receiver: AID of the agent queried
+        :param content: query expression
+        :param timeout: reply-by deadline in seconds, None to wait forever
+        :param performative: Performative.QUERY_REF or Performative.QUERY_IF
+        :return: closed Conversation, its last reply is the INFORM, FAILURE or REFUSE unless it expired
+        """
+        return await self._ask(QUERY, performative, receiver, content, timeout, fields)
+
+    async def contract_net(self, bidders, content, timeout, select, result_timeout=None, **fields):
+        """
+        FIPA contract-net: one call for proposals to every bidder, the bids are collected
+        until all of them answered or the deadline, then the selected ones are accepted
+        and the others rejected, and the outcome of the accepted ones is awaited.
+        :param bidders: AIDs of the agents called for proposals
+        :param content: task to perform
+        :param timeout: deadline of the proposals in seconds
+        :param select: called with the list of PROPOSE messages, returns the ones accepted
+        :param result_timeout: deadline of the results in seconds, timeout by default
+        :return: ContractNetResult
+        """
+        conversation = self.open(CONTRACT_NET, timeout)
+        try:
+            conversation.receivers = tuple(bidders)
+            conversation.pending.update(str(bidder) for bidder in conversation.receivers)
+            # one multicast message, the local bidders share it
+            self.send(conversation, Performative.CFP, conversation.receivers, content, timeout, **fields)
+            await self.collect(conversation, _BIDS)
+            expired = conversation.expired
+            proposals, refusals = _bids(conversation.replies)
+            accepted = list(select(proposals)) if proposals else []
+            chosen = set(id(message) for message in accepted)
+            rejected = [message.sender for message in proposals if id(message) not in chosen]
+            if rejected:
+                self.send(conversation, Performative.REJECT_PROPOSAL, rejected)
+            results = []
+            if accepted:
+                if result_timeout is None:
+                    result_timeout = timeout
+                results = await self._award(conversation, accepted, result_timeout)
+                expired = expired or conversation.expired
+            return ContractNetResult(proposals, refusals, accepted, results, expired)
+        finally:
+            self.close(conversation)
+
+    async def subscribe(self, receiver, content, on_inform, timeout=None, **fields):
+        """
+        FIPA subscribe: once the receiver agreed, on_inform is called with every INFORM it
+        sends until the subscription is cancelled or the receiver sends a FAILURE
+        :param receiver: AID of the agent notifying
+        :param content: subscription expression
+        :param on_inform: called with every INFORM message
+        :param timeout: deadline of the agreement in seconds, None to wait forever
+        :return: Conversation, open when the subscription was agreed, closed otherwise
+        """
+        conversation = self.open(SUBSCRIBE, timeout)
+        conversation.receivers = (receiver,)
+        conversation.pending.add(str(receiver))
+        if self.send(conversation, Performative.SUBSCRIBE, conversation.receivers, content, timeout,
+                     **fields) is not ReturnCodes.SUCCESS:
+            self.close(conversation)
+            return conversation
+        await self.collect(conversation, _AGREEMENTS)
+        self.set_deadline(conversation, None)
+        answer = conversation.last
+        if answer is None or answer.performative not in (Performative.AGREE, Performative.INFORM):
+            self.close(conversation)
+            return conversation
+        if answer.performative is Performative.INFORM:
+            on_inform(answer)
+        conversation.task = asyncio.ensure_future(self._notifications(conversation, on_inform))
+        return conversation
+
+    def cancel(self, conversation):
+        """
+        End a subscription, the receiver is sent a CANCEL
+        :param conversation: Conversation returned by subscribe
+        :return: ReturnCodes.SUCCESS or ReturnCodes.NOT_REGISTERED
+        """
+        if conversation.conversation_id not in self.conversations:
+            return ReturnCodes.NOT_REGISTERED
+        self.send(conversation, Performative.CANCEL, conversation.receivers)
+        return self.close(conversation)
+
+    async def _ask(self, protocol, performative, receiver, content, timeout, fields):
+        conversation = self.open(protocol, timeout)
+        try:
+            conversation.receivers = (receiver,)
+            conversation.pending.add(str(receiver))
+            if self.send(conversation, performative, conversation.receivers, content, timeout,
+                         **fields) is ReturnCodes.SUCCESS:
+                await self.collect(conversation, _ANSWERS)
+            return conversation
+        finally:
+            self.close(conversation)
+
+    async def _award(self, conversation, accepted, timeout):
+        """
+        Accept the selected proposals and collect the outcome of the accepted bidders
+        :return: list of INFORM and FAILURE messages
+        """
+        self.set_deadline(conversation, timeout)
+        conversation.replies = []
+        conversation.pending = set(str(message.sender) for message in accepted)
+        for message in accepted:
+            self.agent.send(message.create_reply(Performative.ACCEPT_PROPOSAL, message.content, sender=self.agent.aid))
+        await self.collect(conversation, _RESULTS)
+        return [message for message in conversation.replies if message.performative in _RESULTS]
+
+    async def _notifications(self, conversation, on_inform):
+        agent = self.agent
+        runtime = agent._runtime
+        template = conversation.template
+        while conversation.conversation_id in self.conversations:
+            if agent.state is not AgentState.ACTIVE:
+                await runtime.checkpoint(agent)
+            message = agent.receive(template)
+            if message is None:
+                await runtime.idle(agent)
+            elif message.performative is Performative.INFORM:
+                on_inform(message)
+            elif message.performative is Performative.FAILURE:
+                conversation.replies.append(message)
+                self.close(conversation)
+
+    def _expire(self, conversation):
+        conversation.timer = None
+        conversation.expired = True
+        runtime = self.agent._runtime
+        if runtime is not None:
+            runtime.wake(self.agent)
+
+
+def _bids(replies):
+    """
+    :param replies: answers to a call for proposals
+    :return: list of PROPOSE messages and list of REFUSE and NOT_UNDERSTOOD messages
+    """
+    proposals = []
+    refusals = []
+    for message in replies:
+        if message.performative is Performative.PROPOSE:
+            proposals.append(message)
+        elif message.performative in _BIDS:
+            refusals.append(message)
+    return proposals, refusals
@@ -0,0 +1,237 @@
+import asyncio
+import inspect
+import logging
+from functools import partial
+
+from copdai_core.commun import ReturnCodes, AgentState
+from copdai_core.lifecycle import TransitionStream
+from copdai_core.timers import DeadlineWheel
+
+log = logging.getLogger(__name__)
+
+
+async def _call(hook):
+    """Run an agent hook that may be a plain method or a coroutine function."""
+    result = hook()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AgentRuntime(object):
+    """
+    Host many agents as coroutines of one asyncio event loop.
+    Each agent runs setup, run and teardown in its own task, the hooks may be
+    plain methods or coroutine functions. Lifecycle transitions are in-process
+    events: a suspended or waiting agent parks on a future at its next
+    checkpoint and is woken up by resume/wakeup or by a message delivery,
+    no POSIX signal is involved. Only parked agents hold a future.
+    """
+
+    def __init__(self, mts=None):
+        # MTS whose mailboxes wake up the agents waiting for a message
+        self.mts = mts
+        # transitions of the hosted agents, the AMS keeps its directory with their batches
+        self.transitions = TransitionStream()
+        # reply-by deadlines of the conversations of the hosted agents
+        self.deadlines = DeadlineWheel()
+        # profiler.Profiler accounting the behaviour steps, set through the AMS
+        self.profiler = None
+        self._tasks = {}
+        self._parked = {}
+        self._destroyed = set()
+        self._departed = set()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, agent):
+        return agent in self._tasks
+
+    def spawn(self, agent):
+        """
+        Start an agent in the running event loop
+        :param agent: AbstractAgent to host
+        :return: asyncio.Task running the agent life cycle
+        :raise RuntimeError: when no event loop is running, the agent is left untouched
+        """
+        loop = asyncio.get_running_loop()
+        agent._runtime = self
+        if self.mts is not None:
+            self.mts.attach(agent).listener = partial(self.wake, agent)
+        task = loop.create_task(self._lifecycle(agent))
+        self._tasks[agent] = task
+        return task
+
+    async def join(self, timeout=None):
+        """
+        Wait for every hosted agent to terminate
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :return: ReturnCodes.SUCCESS or ReturnCodes.FATAL when some agents are still alive
+        """
+        if not self._tasks:
+            return ReturnCodes.SUCCESS
+        done, pending = await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        return ReturnCodes.FATAL if pending else ReturnCodes.SUCCESS
+
+    def suspend(self, agent):
+        return agent.suspend()
+
+    def resume(self, agent):
+        return agent.resume()
+
+    def wakeup(self, agent):
+        return agent.wakeup()
+
+    def quit(self, agent):
+        """
+        Graceful termination, the agent teardown is run
+        :param agent: hosted agent
+        :return: ReturnCodes.SUCCESS
+        """
+        return agent.quit()
+
+    def destroy(self, agent):
+        """
+        Forceful termination, the agent task is cancelled without teardown
+        :param agent: hosted agent
+        :return: ReturnCodes.SUCCESS
+        """
+        self._destroyed.add(agent)
+        return agent.destroy()
+
+    def depart(self, agent):
+        """
+        The agent migrated to another platform: its task is cancelled without teardown
+        and without terminating it, it lives on at its new location
+        :param agent: hosted agent
+        :return: ReturnCodes.SUCCESS
+        """
+        self._departed.add(agent)
+        task = self._tasks.get(agent)
+        if task is not None and task is not _current_task():
+            task.cancel()
+        return ReturnCodes.SUCCESS
+
+    def state_changed(self, agent, previous, state):
+        """
+        Called by a hosted agent on every transition, this is how lifecycle events reach its task
+        :param agent: hosted agent
+        :param previous: AgentState the agent left
+        :param state: new AgentState of the agent
+        """
+        self.transitions.publish(agent.aid, previous, state)
+        if state is AgentState.ACTIVE:
+            self.wake(agent)
+        elif state is AgentState.UNKNOWN:
+            task = self._tasks.get(agent)
+            # an agent quitting from its own task just returns from run, others are cancelled
+            if task is not None and task is not _current_task():
+                task.cancel()
+
+    def wake(self, agent):
+        """Resume an agent parked at a checkpoint or waiting for a message."""
+        future = self._parked.pop(agent, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def checkpoint(self, agent):
+        """
+        Cooperative suspension point of an agent
+        Blocks while the agent is suspended, waiting or in transit
+        :param agent: hosted agent
+        """
+        while agent.state is not AgentState.ACTIVE:
+            if agent.state is AgentState.UNKNOWN:
+                raise asyncio.CancelledError()
+            await self._park(agent)
+
+    async def receive(self, agent, timeout=None, template=None):
+        """
+        Wait for the next message delivered to an active agent
+        :param agent: hosted agent
+        :param timeout: maximum time to wait in seconds, None to wait forever
+        :param template: acl.MessageTemplate the message must match, None for any message
+        :return: the message or None when the timeout expired
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            await self.checkpoint(agent)
+            message = agent.receive(template)
+            if message is not None:
+                return message
+            if deadline is not None and loop.time() >= deadline:
+                return None
+            # the park future may be shared by several coroutines of the agent, it is never cancelled
+            await self.idle(agent, deadline)
+
+    async def idle(self, agent, deadline=None):
+        """
+        Park an active agent with nothing to do until a message, a lifecycle event or its deadline wakes it up
+        :param agent: hosted agent
+        :param deadline: time of the event loop clock to wake up at, None to wait for an event only
+        """
+        future = self._park(agent)
+        if deadline is None:
+            await future
+            return
+        handle = asyncio.get_running_loop().call_at(deadline, self.wake, agent)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    def _park(self, agent):
+        future = self._parked.get(agent)
+        if future is None or future.done():
+            future = self._parked[agent] = asyncio.get_running_loop().create_future()
+        return future
+
+    async def _lifecycle(self, agent):
+        try:
+            try:
+                await self._start(agent)
+                await _call(agent.run)
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                # a failing agent still leaves the platform, it is not left active without a task
+                log.exception('Agent %s failed', agent.aid)
+            if agent not in self._departed:
+                await self._end(agent)
+        finally:
+            self._tasks.pop(agent, None)
+            self._parked.pop(agent, None)
+            self._destroyed.discard(agent)
+            self._departed.discard(agent)
+            if self.mts is not None:
+                self.mts.detach(agent)
+            agent._runtime = None
+
+    @staticmethod
+    async def _start(agent):
+        if agent.state is AgentState.TRANSIT:
+            # a migrated agent was set up on its first platform
+            await _call(agent.after_move)
+            agent.execute()
+        else:
+            await _call(agent.setup)
+            if agent.state is AgentState.INITIATED:
+                agent.invoke()
+
+    async def _end(self, agent):
+        if agent not in self._destroyed:
+            try:
+                await _call(agent.teardown)
+            except Exception:
+                log.exception('Teardown of agent %s failed', agent.aid)
+        if agent.state is not AgentState.UNKNOWN:
+            agent.quit()
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
@@ -0,0 +1,230 @@
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+
+from copdai_core import acl
+
+# Record of a spilled message: u8 kind | u32 payload length | u32 segment and u32 offset of the next record
+# of the same mailbox, then the payload; records start on 8 byte boundaries.
+_HEADER = struct.Struct('=BIII')
+_NEXT = struct.Struct('=II')
+_NEXT_OFFSET = 5
+_NO_NEXT = 0xFFFFFFFF
+_ACL = 1
+_PICKLE = 2
+# contents an ACL frame carries, the messages with any other content are pickled
+_FRAME_CONTENTS = (str, bytes, bytearray, memoryview)
+
+DEFAULT_SEGMENT_SIZE = 1 << 24
+
+
+class Segment(object):
+    """Memory-mapped file holding the spilled records of many mailboxes."""
+
+    __slots__ = ['number', 'path', 'size', 'used', 'live', 'mapping', 'view']
+
+    def __init__(self, number, path, size):
+        self.number = number
+        self.path = path
+        self.size = size
+        self.used = 0
+        # records written and not replayed yet
+        self.live = 0
+        with open(path, 'w+b') as segment_file:
+            segment_file.truncate(size)
+            self.mapping = mmap.mmap(segment_file.fileno(), size)
+        self.view = memoryview(self.mapping)
+
+    def reclaim(self):
+        self.view.release()
+        self.view = None
+        try:
+            self.mapping.close()
+        except BufferError:
+            # a replayed message still holds a view on its content, the pages go away with it
+            pass
+        self.mapping = None
+        os.unlink(self.path)
+
+
+class SegmentStore(object):
+    """
+    Overflow tier of the mailboxes of a platform.
+    Messages are appended to memory-mapped segment files shared by every
+    mailbox, each mailbox only keeps the position of its first and last
+    record, the records being chained through their headers: memory does
+    not grow with the backlog. A segment is deleted as soon as every record
+    it holds has been replayed.
+    """
+
+    def __init__(self, directory=None, segment_size=None):
+        self.segment_size = DEFAULT_SEGMENT_SIZE if segment_size is None else segment_size
+        self._owned = directory is None
+        self.directory = tempfile.mkdtemp(prefix='copdai-spill-') if directory is None else directory
+        self.segments = {}
+        self._current = None
+        self._next_number = 0
+        # statistics: segments created and reclaimed
+        self.created = 0
+        self.reclaimed = 0
+
+    def __len__(self):
+        """Number of segments on disk"""
+        return len(self.segments)
+
+    def queue(self):
+        """
+        :return: SegmentQueue of a new mailbox
+        """
+        return SegmentQueue(self)
+
+    def allocate(self, size):
+        """
+        :param size: bytes needed by a record
+        :return: tuple of the Segment and the offset of the record
+        """
+        size = (size + 7) & ~7
+        current = self._current
+        if current is None or current.used + size > current.size:
+            if current is not None and not current.live:
+                self._reclaim(current)
+            current = self._current = self._create(max(size, self.segment_size))
+        offset = current.used
+        current.used += size
+        current.live += 1
+        return current, offset
+
+    def release(self, segment):
+        """A record of the segment was replayed."""
+        segment.live -= 1
+        if not segment.live and segment is not self._current:
+            self._reclaim(segment)
+
+    def close(self):
+        for segment in list(self.segments.values()):
+            self._reclaim(segment)
+        self._current = None
+        if self._owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _create(self, size):
+        number = self._next_number
+        self._next_number += 1
+        segment = Segment(number, os.path.join(self.directory, 'segment-%08d.seg' % number), size)
+        self.segments[number] = segment
+        self.created += 1
+        return segment
+
+    def _reclaim(self, segment):
+        del self.segments[segment.number]
+        segment.reclaim()
+        self.reclaimed += 1
+
+
+class SegmentQueue(object):
+    """
+    Spilled messages of one mailbox, in arrival order.
+    ACL messages are stored as encoded frames and replayed straight from the
+    mapping, a binary content is a view on the segment instead of a copy;
+    other messages, and ACL messages whose content is an object passed by
+    reference, are pickled.
+    """
+
+    __slots__ = ['store', '_head', '_head_offset', '_tail', '_tail_offset', '_count']
+
+    def __init__(self, store):
+        self.store = store
+        self._head = self._tail = None
+        self._head_offset = self._tail_offset = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, message):
+        if message.__class__ is acl.ACLMessage and (message.content is None or
+                                                    isinstance(message.content, _FRAME_CONTENTS)):
+            kind = _ACL
+            payload = acl.encode(message)
+        else:
+            kind = _PICKLE
+            payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        size = len(payload)
+        segment, offset = self.store.allocate(_HEADER.size + size)
+        view = segment.view
+        _HEADER.pack_into(view, offset, kind, size, _NO_NEXT, 0)
+        start = offset + _HEADER.size
+        view[start:start + size] = payload
+        if self._count:
+            _NEXT.pack_into(self._tail.view, self._tail_offset + _NEXT_OFFSET, segment.number, offset)
+        else:
+            self._head, self._head_offset = segment, offset
+        self._tail, self._tail_offset = segment, offset
+        self._count += 1
+
+    def pop(self):
+        if not self._count:
+            return None
+        segment, offset = self._head, self._head_offset
+        message, next_number, next_offset = _read(segment.view, offset)
+        self._count -= 1
+        if self._count:
+            self._head, self._head_offset = self.store.segments[next_number], next_offset
+        else:
+            self._head = self._tail = None
+        self.store.release(segment)
+        return message
+
+    def take(self, match):
+        """
+        Take the oldest record matching out of the chain, the others stay in their segments
+        :param match: function of a message returning True when it is selected
+        :return: the message or None when no record matches
+        """
+        segments = self.store.segments
+        previous = None
+        segment, offset = self._head, self._head_offset
+        for index in range(self._count):
+            message, next_number, next_offset = _read(segment.view, offset)
+            if match(message):
+                if previous is None:
+                    if index + 1 < self._count:
+                        self._head, self._head_offset = segments[next_number], next_offset
+                else:
+                    # the previous record now chains to the next one
+                    _NEXT.pack_into(previous[0].view, previous[1] + _NEXT_OFFSET, next_number, next_offset)
+                    if index + 1 == self._count:
+                        self._tail, self._tail_offset = previous
+                self._count -= 1
+                if not self._count:
+                    self._head = self._tail = None
+                self.store.release(segment)
+                return message
+            previous = (segment, offset)
+            if index + 1 < self._count:
+                segment, offset = segments[next_number], next_offset
+        return None
+
+    def close(self):
+        while self._count:
+            segment = self._head
+            next_number, next_offset = _NEXT.unpack_from(segment.view, self._head_offset + _NEXT_OFFSET)
+            self._count -= 1
+            if self._count:
+                self._head, self._head_offset = self.store.segments[next_number], next_offset
+            self.store.release(segment)
+        self._head = self._tail = None
+
+
+def _read(view, offset):
+    """
+    :return: tuple of the message of the record at offset and the segment number and offset of the next record
+    """
+    kind, size, next_number, next_offset = _HEADER.unpack_from(view, offset)
+    start = offset + _HEADER.size
+    if kind == _ACL:
+        return acl.decode_from(view, start)[0], next_number, next_offset
+    return pickle.loads(view[start:start + size]), next_number, next_offset
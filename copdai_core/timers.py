@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import math
+
+log = logging.getLogger(__name__)
+
+
+class Timer(object):
+    """Deadline of a TimingWheel, cancelled in O(1)."""
+
+    __slots__ = ['deadline', 'callback', 'args', '_wheel', '_slot']
+
+    def __init__(self, deadline, callback, args, wheel):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self._wheel = wheel
+        # dict of the wheel slot holding the timer, None once expired or cancelled
+        self._slot = None
+
+    @property
+    def active(self):
+        return self._slot is not None
+
+    def cancel(self):
+        """
+        :return: True when the timer was still pending
+        """
+        slot = self._slot
+        if slot is None:
+            return False
+        del slot[self]
+        self._slot = None
+        self._wheel._count -= 1
+        return True
+
+
+class TimingWheel(object):
+    """
+    Hierarchical timing wheel (see [Varghese87]): levels of 2**bits slots,
+    a slot of level n spanning 2**(bits*n) ticks of resolution seconds.
+    A deadline goes to the level whose span covers its distance, inserting
+    and cancelling cost O(1) whatever the number of pending deadlines; the
+    timers of an upper level slot cascade to the level below when its first
+    tick comes. Deadlines beyond the top level wait in its slots and are
+    placed again each turn. A timer never expires before its deadline and at
+    most one tick after it, as seen by advance.
+    """
+
+    def __init__(self, resolution=0.01, bits=8, levels=4, now=0.0):
+        self.resolution = resolution
+        self.bits = bits
+        self._size = 1 << bits
+        self._mask = self._size - 1
+        self._levels = [[None] * self._size for _ in range(levels)]
+        # next tick to process
+        self._tick = int(now / resolution)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, deadline, callback, *args):
+        """
+        :param deadline: time the timer expires, on the clock given to advance
+        :param callback: called with args when the timer expires, by the caller of advance
+        :return: Timer
+        """
+        timer = Timer(deadline, callback, args, self)
+        self._insert(timer)
+        self._count += 1
+        return timer
+
+    def advance(self, now):
+        """
+        Process the ticks up to now
+        :param now: current time
+        :return: list of the expired Timer in deadline order, their callbacks are not called
+        """
+        target = int(now / self.resolution)
+        if not self._count:
+            self._tick = target + 1
+            return []
+        expired = []
+        mask = self._mask
+        level0 = self._levels[0]
+        while self._tick <= target and self._count:
+            tick = self._tick
+            if not tick & mask:
+                self._cascade(tick)
+            slot = level0[tick & mask]
+            if slot:
+                level0[tick & mask] = None
+                for timer in slot:
+                    timer._slot = None
+                self._count -= len(slot)
+                expired.extend(sorted(slot, key=_deadline))
+            self._tick = tick + 1
+        if not self._count and self._tick <= target:
+            self._tick = target + 1
+        return expired
+
+    def next_tick_time(self):
+        """
+        :return: time the next non-empty tick or cascade is due, None without pending timers
+        """
+        if not self._count:
+            return None
+        tick = self._tick
+        level0 = self._levels[0]
+        mask = self._mask
+        end = (tick | mask) + 1
+        while tick < end:
+            if level0[tick & mask]:
+                break
+            tick += 1
+        return tick * self.resolution
+
+    def _insert(self, timer):
+        tick = int(math.ceil(timer.deadline / self.resolution))
+        delta = tick - self._tick
+        if delta < 0:
+            # already due, it expires on the next tick processed
+            tick = self._tick
+            delta = 0
+        bits = self.bits
+        top = len(self._levels) - 1
+        level = 0
+        while delta >= self._size and level < top:
+            delta >>= bits
+            level += 1
+        slots = self._levels[level]
+        index = (tick >> (bits * level)) & self._mask
+        if level == top and delta >= self._size:
+            # beyond the wheel span, the timer comes back on the last slot of the current turn
+            index = ((self._tick >> (bits * level)) - 1) & self._mask
+        slot = slots[index]
+        if slot is None:
+            slot = slots[index] = {}
+        slot[timer] = None
+        timer._slot = slot
+
+    def _cascade(self, tick):
+        # slots of the upper levels starting at this tick move down, the highest level first
+        bits = self.bits
+        mask = self._mask
+        levels = []
+        for level in range(1, len(self._levels)):
+            levels.append(level)
+            if (tick >> (bits * level)) & mask:
+                break
+        for level in reversed(levels):
+            slots = self._levels[level]
+            index = (tick >> (bits * level)) & mask
+            slot = slots[index]
+            if slot:
+                slots[index] = None
+                for timer in slot:
+                    self._insert(timer)
+
+
+def _deadline(timer):
+    return timer.deadline
+
+
+class DeadlineWheel(TimingWheel):
+    """
+    TimingWheel driven by the running event loop: it is only woken up for
+    the ticks holding timers or a cascade, an empty wheel costs nothing.
+    Callbacks run in the event loop, their exceptions are logged.
+    """
+
+    def __init__(self, resolution=0.01, bits=8, levels=4):
+        super().__init__(resolution, bits, levels)
+        self._handle = None
+        self._armed = None
+
+    def call_at(self, deadline, callback, *args):
+        """
+        :param deadline: time of the event loop clock
+        :param callback: called with args once the deadline passed
+        :return: Timer
+        """
+        if not self._count:
+            # the wheel was idle, it starts over from now instead of catching up the ticks it skipped
+            self._tick = int(asyncio.get_running_loop().time() / self.resolution)
+        timer = self.schedule(deadline, callback, *args)
+        self._arm()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(asyncio.get_running_loop().time() + delay, callback, *args)
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._armed = None
+
+    def _arm(self):
+        when = self.next_tick_time()
+        if when is None or (self._armed is not None and self._armed <= when):
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed = when
+        self._handle = asyncio.get_running_loop().call_at(when, self._run)
+
+    def _run(self):
+        self._handle = None
+        self._armed = None
+        for timer in self.advance(asyncio.get_running_loop().time()):
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                log.exception('Deadline callback %r failed', timer.callback)
+        if self._count:
+            self._arm()
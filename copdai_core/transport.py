@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import os
+import struct
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from copdai_core import acl
+from copdai_core.commun import ReturnCodes
+
+log = logging.getLogger(__name__)
+
+# Messages travel between platforms as concatenated ACL frames, each one starting with its u32 length
+_HEADER = struct.Struct('!I')
+_READ_SIZE = 1 << 18
+
+
+def parse_address(address):
+    """
+    :param address: transport address such as tcp://host:port or unix:///path/to/socket
+    :return: tuple of the transport type and the transport specific address
+    """
+    scheme, separator, location = str(address).partition('://')
+    if not separator:
+        raise ValueError('Invalid transport address: %s' % address)
+    return scheme, location
+
+
+class Transport(ABC):
+    """
+    Transport type of the MTS (see [FIPA00067]), it opens the stream
+    connections to and accepts them from other platforms.
+    """
+
+    # transport type, the scheme of the addresses it serves
+    scheme = None
+
+    @abstractmethod
+    async def open_connection(self, location):
+        """
+        :param location: transport specific address of a remote platform
+        :return: asyncio (reader, writer) pair
+        """
+
+    @abstractmethod
+    async def start_server(self, handler, location):
+        """
+        :param handler: asyncio stream connection callback
+        :param location: transport specific address to listen on
+        :return: tuple of the asyncio server and the address it is bound to
+        """
+
+    def close_server(self, location):
+        """Release what the server left behind once closed."""
+
+
+class TCPTransport(Transport):
+    """Stream sockets between hosts, tcp://host:port"""
+
+    scheme = 'tcp'
+
+    def __init__(self, no_delay=True):
+        # batching is done by the connections, Nagle would only add latency
+        self.no_delay = no_delay
+
+    async def open_connection(self, location):
+        host, port = _split_host(location)
+        reader, writer = await asyncio.open_connection(host, port)
+        if self.no_delay:
+            import socket
+            sock = writer.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+
+    async def start_server(self, handler, location):
+        host, port = _split_host(location)
+        server = await asyncio.start_server(handler, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        return server, '%s://%s:%d' % (self.scheme, host, port)
+
+
+class UnixTransport(Transport):
+    """Unix domain sockets between the platforms of one host, unix:///path/to/socket"""
+
+    scheme = 'unix'
+
+    async def open_connection(self, location):
+        return await asyncio.open_unix_connection(location)
+
+    async def start_server(self, handler, location):
+        server = await asyncio.start_unix_server(handler, location)
+        return server, '%s://%s' % (self.scheme, location)
+
+    def close_server(self, location):
+        try:
+            os.unlink(location)
+        except OSError:
+            pass
+
+
+class Connection(object):
+    """
+    Persistent connection to one remote platform.
+    Frames are coalesced and written in one call when max_batch_bytes are
+    pending or max_delay seconds after the first pending frame. Frames sent
+    while the connection is being opened wait for it. Backpressure: once the
+    frames pending here plus the bytes the socket has not sent yet exceed
+    max_pending_bytes, send refuses new frames until the peer catches up.
+    """
+
+    def __init__(self, transport, location, max_batch_bytes=65536, max_delay=0.001, max_pending_bytes=1 << 22):
+        self.transport = transport
+        self.location = location
+        self.max_batch_bytes = max_batch_bytes
+        self.max_delay = max_delay
+        self.max_pending_bytes = max_pending_bytes
+        self._writer = None
+        self._connecting = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._timer = None
+        # statistics: frames accepted, writes issued, connections opened and frames lost on connection failures
+        self.frames = 0
+        self.batches = 0
+        self.connects = 0
+        self.lost = 0
+
+    @property
+    def buffered(self):
+        """Bytes not handed over to the kernel yet"""
+        writer = self._writer
+        size = self._pending_bytes
+        if writer is not None:
+            size += writer.transport.get_write_buffer_size()
+        return size
+
+    def send(self, frame):
+        """
+        Queue an encoded frame, must be called from the event loop thread
+        :param frame: bytes of an ACL frame
+        :return: ReturnCodes.SUCCESS or ReturnCodes.BUFFER_OVERFLOW when the peer does not keep up
+        """
+        if self.buffered + len(frame) > self.max_pending_bytes:
+            return ReturnCodes.BUFFER_OVERFLOW
+        self._pending.append(frame)
+        self._pending_bytes += len(frame)
+        self.frames += 1
+        writer = self._writer
+        if writer is not None and writer.is_closing():
+            # the peer went away, the pending frames go through a new connection
+            writer = self._writer = None
+        if writer is None:
+            if self._connecting is None:
+                self._connecting = asyncio.ensure_future(self._connect())
+        elif self._pending_bytes >= self.max_batch_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+        return ReturnCodes.SUCCESS
+
+    def flush(self):
+        """Write the pending frames now, in a single call."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        writer = self._writer
+        if not self._pending or writer is None:
+            return
+        writer.write(b''.join(self._pending) if len(self._pending) > 1 else self._pending[0])
+        self._pending = []
+        self._pending_bytes = 0
+        self.batches += 1
+
+    async def drain(self):
+        """Wait until the frames sent so far are handed over to the kernel."""
+        if self._connecting is not None:
+            await self._connecting
+        self.flush()
+        if self._writer is not None:
+            await self._writer.drain()
+
+    async def close(self):
+        await self.drain()
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _connect(self):
+        try:
+            reader, writer = await self.transport.open_connection(self.location)
+        except OSError as error:
+            log.warning('Cannot connect to %s://%s: %s', self.transport.scheme, self.location, error)
+            self.lost += len(self._pending)
+            self._pending = []
+            self._pending_bytes = 0
+            return
+        finally:
+            self._connecting = None
+        self._writer = writer
+        self.connects += 1
+        self.flush()
+
+
+class TransportPool(object):
+    """
+    Transports of a platform and their persistent connections, one per
+    remote address: talking to another platform never pays a connect per
+    message. Received frames are decoded and handed to a deliver callback.
+    """
+
+    def __init__(self, transports=None, **policy):
+        self.transports = {}
+        for transport in transports if transports is not None else (TCPTransport(), UnixTransport()):
+            self.register(transport)
+        # Connection options: max_batch_bytes, max_delay and max_pending_bytes
+        self.policy = policy
+        self._connections = {}
+        self._servers = []
+
+    def register(self, transport):
+        """
+        :param transport: Transport to use for the addresses of its scheme
+        :return: ReturnCodes.SUCCESS or ReturnCodes.ALREADY_REGISTERED
+        """
+        if transport.scheme in self.transports:
+            return ReturnCodes.ALREADY_REGISTERED
+        self.transports[transport.scheme] = transport
+        return ReturnCodes.SUCCESS
+
+    def supports(self, address):
+        return str(address).partition('://')[0] in self.transports
+
+    def connection(self, address):
+        """
+        :param address: transport address of a remote platform
+        :return: the Connection to it, created on first use
+        """
+        connection = self._connections.get(address)
+        if connection is None:
+            scheme, location = parse_address(address)
+            transport = self.transports.get(scheme)
+            if transport is None:
+                raise ValueError('No transport for %s' % address)
+            connection = self._connections[address] = Connection(transport, location, **self.policy)
+        return connection
+
+    def send(self, address, frame):
+        """
+        :param address: transport address of a remote platform
+        :param frame: bytes of an ACL frame
+        :return: ReturnCodes.SUCCESS or ReturnCodes.BUFFER_OVERFLOW
+        """
+        return self.connection(address).send(frame)
+
+    async def listen(self, address, deliver):
+        """
+        Accept the connections of the other platforms
+        :param address: transport address to listen on, port 0 picks a free TCP port
+        :param deliver: called with every ACLMessage received
+        :return: the address the platform is reachable at
+        """
+        scheme, location = parse_address(address)
+        transport = self.transports.get(scheme)
+        if transport is None:
+            raise ValueError('No transport for %s' % address)
+
+        async def handler(reader, writer):
+            await _serve(reader, writer, deliver)
+
+        server, bound = await transport.start_server(handler, location)
+        self._servers.append((transport, location, server))
+        return bound
+
+    async def drain(self):
+        for connection in list(self._connections.values()):
+            await connection.drain()
+
+    async def close(self):
+        for connection in list(self._connections.values()):
+            await connection.close()
+        self._connections.clear()
+        for transport, location, server in self._servers:
+            server.close()
+            await server.wait_closed()
+            transport.close_server(location)
+        self._servers = []
+
+
+class ForwardingTable(object):
+    """
+    New location of the agents that left the platform.
+    Entries expire after their ttl, once the agents they point to are
+    registered elsewhere the senders are expected to use the new address.
+    """
+
+    __slots__ = ['ttl', '_entries']
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        # aid -> (transport address, expiry), kept in expiry order when every entry uses the default ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, aid):
+        return self.get(aid) is not None
+
+    def set(self, aid, address, ttl=None):
+        """
+        :param aid: identifier of the agent that moved
+        :param address: transport address of its new platform
+        :param ttl: lifetime of the entry in seconds, the table ttl by default
+        """
+        self._entries.pop(aid, None)
+        self._entries[aid] = (address, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def get(self, aid):
+        """
+        :param aid: agent identifier
+        :return: transport address of the agent, None when it has no valid entry
+        """
+        entry = self._entries.get(aid)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[aid]
+            return None
+        return entry[0]
+
+    def discard(self, aid):
+        self._entries.pop(aid, None)
+
+    def expire(self):
+        """
+        Remove the expired entries
+        :return: number of entries removed
+        """
+        now = time.monotonic()
+        expired = [aid for aid, (address, expiry) in self._entries.items() if expiry <= now]
+        for aid in expired:
+            del self._entries[aid]
+        return len(expired)
+
+
+async def _serve(reader, writer, deliver):
+    # frames of a read are decoded from one immutable buffer, binary contents are views on it
+    pending = b''
+    try:
+        while True:
+            chunk = await reader.read(_READ_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk if pending else chunk
+            view = memoryview(data)
+            offset = 0
+            end = len(data)
+            while end - offset >= _HEADER.size:
+                size, = _HEADER.unpack_from(data, offset)
+                if offset + _HEADER.size + size > end:
+                    break
+                message, offset = acl.decode_from(view, offset)
+                deliver(message)
+            pending = data[offset:]
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _split_host(location):
+    host, _, port = location.rpartition(':')
+    return host.strip('[]') or None, int(port)
@@ -5,3 +5,21 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from copdai_core import mas
+from copdai_core import aid
+from copdai_core import directory
+from copdai_core import federation
+from copdai_core import mailbox
+from copdai_core import acl
+from copdai_core import runtime
+from copdai_core import container
+from copdai_core import logconfig
+from copdai_core import lifecycle
+from copdai_core import transport
+from copdai_core import mobility
+from copdai_core import persistence
+from copdai_core import segments
+from copdai_core import behaviours
+from copdai_core import timers
+from copdai_core import protocols
+from copdai_core import metrics
+from copdai_core import profiler
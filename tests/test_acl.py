@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from .context import acl
+
+import unittest
+
+
+class ACLCodecTestSuite(unittest.TestCase):
+    """ACL message binary codec test cases."""
+
+    def setUp(self):
+        self.message = acl.ACLMessage(
+            acl.Performative.REQUEST, sender='alice@AP', receivers=['bob@AP', 'carol@AP'],
+            content=b'\x00(action move)', language='fipa-sl', ontology='logistics',
+            protocol='fipa-request', conversation_id='c-42', reply_with='r-1', reply_by=1234.5)
+
+    def test_round_trip(self):
+        decoded = acl.decode(acl.encode(self.message))
+        self.assertEqual(decoded, self.message)
+        self.assertIsNone(decoded.in_reply_to)
+        self.assertEqual(decoded.reply_to, ())
+
+    def test_content_is_not_copied(self):
+        frame = bytearray(acl.encode(self.message))
+        decoded = acl.decode(frame)
+        self.assertIsInstance(decoded.content, memoryview)
+        frame[-1:] = b'!'
+        self.assertEqual(bytes(decoded.content), b'\x00(action move!')
+
+    def test_text_content_and_stream(self):
+        reply = acl.ACLMessage(acl.Performative.INFORM, sender='bob@AP', content='déjà fait',
+                               in_reply_to='r-1')
+        stream = acl.encode(self.message) + acl.encode(reply)
+        decoded = list(acl.iter_decode(stream))
+        self.assertEqual(decoded, [self.message, reply])
+        self.assertIsNone(decoded[1].reply_by)
+
+    def test_long_strings(self):
+        for length in (0xFFFE, 0xFFFF, 0x10000):
+            message = acl.ACLMessage(acl.Performative.INFORM, sender='a' * length, receivers=['b' * length],
+                                     conversation_id='', ontology=None)
+            decoded = acl.decode(acl.encode(message))
+            self.assertEqual(decoded, message)
+            self.assertEqual(len(decoded.sender), length)
+            self.assertEqual(decoded.conversation_id, '')
+            self.assertIsNone(decoded.ontology)
+
+    def test_many_receivers(self):
+        receivers = ['agent-%d@AP' % n for n in range(0x10000)]
+        message = acl.ACLMessage(acl.Performative.CFP, sender='alice@AP', receivers=receivers)
+        self.assertEqual(acl.decode(acl.encode(message)).receivers, tuple(receivers))
+
+    def test_corrupted_frame(self):
+        frame = bytearray(acl.encode(self.message))
+        frame[4] = 99
+        self.assertRaises(ValueError, acl.decode, frame)
+
+    def test_truncated_frame(self):
+        frame = acl.encode(self.message)
+        for size in range(len(frame)):
+            self.assertRaises(ValueError, acl.decode, frame[:size])
+        # the sender length runs past the frame into the next one
+        stream = bytearray(frame + acl.encode(self.message))
+        acl._STRING.pack_into(stream, acl._FRAME.size, acl.STRING, len(frame))
+        self.assertRaises(ValueError, acl.decode, stream)
+        self.assertRaises(ValueError, list, acl.iter_decode(stream))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, aid
+
+import pickle
+import unittest
+
+
+class AIDTestSuite(unittest.TestCase):
+    """Agent identifier value type test cases."""
+
+    def setUp(self):
+        self.aid = aid.AID('planner#copdai_core.mas', '0A1B2C3D4E5F', ['tcp://10.0.0.1:7000'])
+
+    def test_string_form(self):
+        self.assertEqual(str(self.aid), 'planner#copdai_core.mas@0A1B2C3D4E5F')
+        self.assertEqual(aid.AID.parse(str(self.aid)), self.aid)
+        self.assertEqual(aid.AID.parse(str(self.aid)).platform, '0A1B2C3D4E5F')
+
+    def test_interchangeable_with_its_string(self):
+        table = {self.aid: 1}
+        self.assertEqual(table['planner#copdai_core.mas@0A1B2C3D4E5F'], 1)
+        self.assertEqual({str(self.aid): 2}[self.aid], 2)
+        self.assertNotEqual(self.aid, aid.AID('planner#copdai_core.mas', '000000000001'))
+
+    def test_immutable_and_picklable(self):
+        with self.assertRaises(AttributeError):
+            self.aid.platform = 'elsewhere'
+        copy = pickle.loads(pickle.dumps(self.aid))
+        self.assertEqual(copy, self.aid)
+        self.assertEqual(copy.addresses, ('tcp://10.0.0.1:7000',))
+
+    def test_platform_name_is_interned(self):
+        self.assertEqual(aid.platform_name(0x0A1B2C3D4E5F), '0A1B2C3D4E5F')
+        self.assertIs(aid.platform_name(0x0A1B2C3D4E5F), aid.platform_name(0x0A1B2C3D4E5F))
+        self.assertEqual(mas.agent_identifier('x', 1).platform, '000000000001')
+        self.assertNotEqual(aid.unique_name(), aid.unique_name())
+
+
+if __name__ == '__main__':
+    unittest.main()
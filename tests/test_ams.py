@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas
+
+import asyncio
+import tempfile
+import unittest
+
+
+class WorkerAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        while True:
+            await self.receive_async()
+
+    def teardown(self):
+        pass
+
+
+class CellAgent(WorkerAgent):
+
+    __slots__ = ['cell']
+
+    def __init__(self, cell=0, name=None):
+        super().__init__(platform_id=1, name=name)
+        self.cell = cell
+
+
+class AMSControlTestSuite(unittest.TestCase):
+    """AMS lifecycle control test cases."""
+
+    def setUp(self):
+        self.ams = mas.AgentManagementSystem()
+        self.aids = [self.ams.create(WorkerAgent(platform_id=1)) for _ in range(10)]
+
+    def test_single_agent_control(self):
+        aid = self.aids[0]
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.INITIATED)
+        self.assertEqual(self.ams.invoke(aid), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.ams.suspend(aid), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.SUSPENDED)
+        self.ams.resume(aid)
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.ACTIVE)
+        self.assertEqual(self.ams.terminate(aid), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.UNKNOWN)
+        self.assertEqual(self.ams.suspend(aid), mas.ReturnCodes.NOT_REGISTERED)
+
+    def test_batch_control(self):
+        self.assertEqual(self.ams.invoke_all(self.aids), 10)
+        self.assertEqual(self.ams.suspend_all(self.aids[:4]), 4)
+        suspended = mas.AMSAgentDescription(state=mas.AgentState.SUSPENDED)
+        self.assertEqual(sorted(d.name for d in self.ams.search(suspended)), sorted(self.aids[:4]))
+        self.assertEqual(self.ams.resume_all(description=suspended), 4)
+        self.assertEqual(self.ams.search(suspended), [])
+        self.assertEqual(self.ams.terminate_all(description=mas.AMSAgentDescription(state=mas.AgentState.ACTIVE),
+                                                force=True), 10)
+        self.assertEqual(len(self.ams.search()), 0)
+
+    def test_illegal_transitions(self):
+        aid = self.aids[0]
+        self.assertEqual(self.ams.suspend(aid), mas.ReturnCodes.ILLEGAL_TRANSITION)
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.INITIATED)
+        self.ams.invoke_all(self.aids[:4])
+        # only the 4 active agents can be suspended, the others are still initiated
+        self.assertEqual(self.ams.suspend_all(self.aids), 4)
+        self.assertEqual(self.ams.resume_all(self.aids), 4)
+        self.assertEqual(self.ams.invoke_all(self.aids), 6)
+
+    def test_platform_runtime_control(self):
+        platform = mas.AgentPlatform('AP')
+        aids = [platform.ams.create(WorkerAgent) for _ in range(5)]
+
+        async def main():
+            platform.ams.invoke_all(aids)
+            await asyncio.sleep(0)
+            active = len(platform.ams.search(mas.AMSAgentDescription(state=mas.AgentState.ACTIVE)))
+            platform.ams.suspend_all(aids[:2])
+            platform.ams.terminate_all(aids)
+            await platform.runtime.join(timeout=1)
+            return active
+
+        self.assertEqual(asyncio.run(main()), 5)
+        self.assertEqual(len(platform.runtime), 0)
+        self.assertEqual(len(platform.ams.search()), 0)
+
+
+class AMSCreateTestSuite(unittest.TestCase):
+    """AMS bulk creation test cases."""
+
+    def setUp(self):
+        self.ams = mas.AgentManagementSystem()
+        self.path = '%s:CellAgent' % __name__
+
+    def test_create_from_path(self):
+        self.assertIs(mas.agent_class(self.path), CellAgent)
+        self.assertIs(mas.agent_class(self.path), mas.agent_class('%s.CellAgent' % __name__))
+        aid = self.ams.create(self.path)
+        self.assertEqual(self.ams.state_of(aid), mas.AgentState.INITIATED)
+        self.assertRaises(ValueError, mas.agent_class, 'CellAgent')
+
+    def test_create_existing_aid(self):
+        first = CellAgent(name='same')
+        self.assertEqual(self.ams.create(first), first.aid)
+        self.assertIsNone(self.ams.create(CellAgent(name='same')))
+        self.assertIs(self.ams._agents[first.aid], first)
+
+    def test_create_all(self):
+        aids = self.ams.create_all(CellAgent, 100)
+        self.assertEqual(len(set(aids)), 100)
+        self.assertEqual(len(self.ams.search(mas.AMSAgentDescription(state=mas.AgentState.INITIATED))), 100)
+        aids = self.ams.create_all(self.path, parameters=[{'cell': n} for n in range(10)])
+        self.assertEqual([self.ams._agents[aid].cell for aid in aids], list(range(10)))
+        self.assertEqual(self.ams.invoke_all(aids), 10)
+
+    def test_create_all_is_one_transaction(self):
+        self.ams.create_all(CellAgent, parameters=[{'name': 'taken'}])
+        aids = self.ams.create_all(CellAgent, parameters=[{'name': 'free'}, {'name': 'taken'}])
+        self.assertEqual(aids, [])
+        self.assertEqual(len(self.ams.search()), 1)
+
+    def test_create_all_journaled_in_one_commit(self):
+        with tempfile.TemporaryDirectory() as path:
+            platform = mas.AgentPlatform('AP', state_directory=path)
+            journal = platform.ams._directory.journal
+            commits = journal.commits
+            aids = platform.ams.create_all(CellAgent, 2000)
+            self.assertEqual(journal.commits, commits + 1)
+            platform.close()
+            platform = mas.AgentPlatform('AP', state_directory=path)
+            self.assertEqual(sorted(d.name for d in platform.ams.search()), sorted(aids))
+            platform.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
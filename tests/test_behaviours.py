@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, behaviours, mobility
+
+import asyncio
+import unittest
+
+
+class BehaviourAgent(mas.AbstractAgent):
+    """Agent whose run is its behaviours."""
+
+    __slots__ = ['log']
+
+    def __init__(self):
+        super().__init__(platform_id=1)
+        self.log = []
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        self.log.append('teardown')
+
+
+class Hello(behaviours.OneShotBehaviour):
+
+    def action(self):
+        self.agent.log.append('hello')
+
+    def on_end(self):
+        return 7
+
+
+class Counter(behaviours.CyclicBehaviour):
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.count = 0
+
+    def action(self):
+        self.count += 1
+        if self.count == self.limit:
+            self.agent.remove_behaviour(self)
+
+
+class Receiver(behaviours.CyclicBehaviour):
+    """Collect the messages until 'stop'."""
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+        self.timeouts = 0
+        self.received = []
+
+    async def action(self):
+        message = self.agent.receive()
+        if message is None:
+            self.timeouts += 1
+            self.block(self.timeout)
+        elif message == 'stop':
+            self.agent.remove_behaviour(self)
+        else:
+            self.received.append(message)
+
+
+class Ticker(behaviours.TickerBehaviour):
+
+    def on_tick(self):
+        self.agent.log.append(('tick', self.ticks))
+        if self.ticks == 3:
+            self.stop()
+
+
+class Waker(behaviours.WakerBehaviour):
+
+    def on_wake(self):
+        self.agent.log.append('wake')
+
+
+class Step(behaviours.OneShotBehaviour):
+
+    def __init__(self, name, events):
+        super().__init__()
+        self.name = name
+        self.events = events
+
+    def action(self):
+        self.agent.log.append(self.name)
+
+    def on_end(self):
+        return self.events.pop(0) if self.events else None
+
+
+class BehaviourTestSuite(unittest.TestCase):
+    """Behaviour scheduler test cases."""
+
+    def setUp(self):
+        self.platform = mas.AgentPlatform('AP')
+
+    def run_agent(self, agent, during=None, timeout=2):
+        async def main():
+            self.platform.runtime.spawn(agent)
+            if during is not None:
+                await during()
+            return await self.platform.runtime.join(timeout=timeout)
+
+        return asyncio.run(main())
+
+    def test_agent_ends_with_its_behaviours(self):
+        agent = BehaviourAgent()
+        hello = Hello()
+        counter = Counter(100)
+        agent.add_behaviour(hello)
+        agent.add_behaviour(counter)
+        self.assertEqual(agent.add_behaviour(hello), mas.ReturnCodes.ALREADY_REGISTERED)
+        self.assertEqual(self.run_agent(agent), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(counter.count, 100)
+        self.assertEqual(hello.exit_code, 7)
+        self.assertEqual(agent.log, ['hello', 'teardown'])
+        self.assertEqual(agent.state, mas.AgentState.UNKNOWN)
+
+    def test_blocked_behaviour_is_woken_by_messages(self):
+        agent = BehaviourAgent()
+        receiver = Receiver()
+        agent.add_behaviour(receiver)
+
+        async def during():
+            for i in range(3):
+                await asyncio.sleep(0.01)
+                self.platform.mts.deliverMessage(agent, i)
+            self.platform.mts.deliverMessage(agent, 'stop')
+
+        self.assertEqual(self.run_agent(agent, during), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(receiver.received, [0, 1, 2])
+        # no polling while waiting: one step per message plus the ones finding the mailbox empty
+        self.assertLessEqual(agent._scheduler.steps, 8)
+
+    def test_ticker_and_waker(self):
+        agent = BehaviourAgent()
+        agent.add_behaviour(Ticker(0.02))
+        agent.add_behaviour(Waker(0.05))
+        self.assertEqual(self.run_agent(agent), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.log, [('tick', 1), ('tick', 2), 'wake', ('tick', 3), 'teardown'])
+
+    def test_block_timeout(self):
+        agent = BehaviourAgent()
+        receiver = Receiver(timeout=0.01)
+        agent.add_behaviour(receiver)
+
+        async def during():
+            await asyncio.sleep(0.05)
+            self.platform.mts.deliverMessage(agent, 'stop')
+
+        self.assertEqual(self.run_agent(agent, during), mas.ReturnCodes.SUCCESS)
+        self.assertGreaterEqual(receiver.timeouts, 3)
+
+    def test_fsm_transitions(self):
+        agent = BehaviourAgent()
+        fsm = behaviours.FSMBehaviour()
+        fsm.register_first_state(Step('a', [1, 2]), 'a')
+        fsm.register_state(Step('b', []), 'b')
+        fsm.register_last_state(Step('c', [3]), 'c')
+        fsm.register_transition('a', 'b', 1)
+        fsm.register_transition('a', 'c', 2)
+        fsm.register_default_transition('b', 'a')
+        agent.add_behaviour(fsm)
+        self.assertEqual(self.run_agent(agent), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.log, ['a', 'b', 'a', 'c', 'teardown'])
+        self.assertEqual(fsm.exit_code, 3)
+
+    def test_snapshot_keeps_behaviours_bound(self):
+        agent = BehaviourAgent()
+        ticker = Ticker(10)
+        agent.add_behaviour(ticker)
+        agent.add_behaviour(Hello())
+        state = mobility.snapshot(agent)
+        copy = mobility.restore(state.data, state.buffers)
+        self.assertIs(copy._scheduler.agent, copy)
+        self.assertEqual(len(copy._scheduler), 2)
+        self.assertTrue(all(behaviour.agent is copy for behaviour in copy._scheduler._behaviours))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl, container
+
+import time
+import unittest
+from collections import deque
+
+
+class EchoAgent(mas.AbstractAgent):
+    """Answer every request to its sender until it gets 'stop'."""
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        while True:
+            message = await self.receive_async()
+            if message.content == 'stop':
+                return
+            self.send(acl.ACLMessage(acl.Performative.INFORM, sender=self.aid, receivers=[message.sender],
+                                     content=message.content, in_reply_to=message.reply_with))
+
+    def teardown(self):
+        pass
+
+
+class RingBufferTestSuite(unittest.TestCase):
+    """Shared memory ring test cases."""
+
+    def setUp(self):
+        self.producer = container.RingBuffer(capacity=256)
+        self.consumer = container.RingBuffer(self.producer.name, capacity=256)
+
+    def test_records_wrap_around(self):
+        received = []
+        for i in range(100):
+            self.assertTrue(self.producer.write(b'record-%03d' % i + b'x' * (i % 40)))
+            received.extend(self.consumer.read())
+        self.assertEqual(len(received), 100)
+        self.assertEqual(received[99], b'record-099' + b'x' * 19)
+        self.assertEqual(len(self.consumer), 0)
+
+    def test_full_ring_refuses(self):
+        while self.producer.write(b'y' * 60):
+            pass
+        self.assertFalse(self.producer.write(b'z'))
+        self.assertEqual(len(self.consumer.read(1)), 1)
+        self.assertTrue(self.producer.write(b'z'))
+
+    def tearDown(self):
+        self.consumer.close()
+        self.producer.close()
+
+
+class AgentContainerTestSuite(unittest.TestCase):
+    """Sharded container test cases, agents run in two worker processes."""
+
+    def test_messages_cross_shards(self):
+        platform = mas.AgentPlatform('AP')
+        with platform.container(workers=2, ring_capacity=1 << 16) as agents:
+            aids = [agents.spawn(EchoAgent, 'echo%d' % i) for i in range(8)]
+            self.assertEqual(set(agents.shard_of(aid) for aid in aids), {0, 1})
+            self.assertEqual(len(agents.ams.search()), 8)
+            for i, aid in enumerate(aids):
+                agents.send(acl.ACLMessage(acl.Performative.REQUEST, sender=agents.aid, receivers=[aid],
+                                           content='ping', reply_with=str(i)))
+            replies = [agents.receive(timeout=5) for _ in aids]
+            self.assertEqual(sorted(reply.in_reply_to for reply in replies), sorted(str(i) for i in range(8)))
+            # the workers report the transitions once per loop iteration
+            active = []
+            for _ in range(500):
+                agents.sync()
+                active = agents.ams.search(mas.AMSAgentDescription(state=mas.AgentState.ACTIVE))
+                if len(active) == len(aids):
+                    break
+                time.sleep(0.01)
+            self.assertEqual(sorted(d.name for d in active), sorted(aids))
+            self.assertEqual(set(d.platform_id for d in active), {agents.platform_id})
+            agents.send(acl.ACLMessage(acl.Performative.REQUEST, sender=agents.aid, receivers=aids, content='stop'))
+            stats = agents.join(timeout=5)
+            # the terminated agents left the white pages
+            self.assertEqual(agents.ams.search(), [])
+        self.assertEqual(sum(shard['spawned'] for shard in stats), 8)
+        self.assertEqual(sum(shard['sent'] for shard in stats), 8)
+
+    def test_send_to_dead_worker(self):
+        with container.AgentContainer('AP', workers=1, ring_capacity=4096) as agents:
+            aid = agents.spawn(EchoAgent, 'echo')
+            agents._processes[0].terminate()
+            agents._processes[0].join()
+            message = acl.ACLMessage(acl.Performative.REQUEST, receivers=[aid], content='x' * 500)
+            start = time.monotonic()
+            codes = [agents.send(message) for _ in range(20)]
+            self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(codes[-1], mas.ReturnCodes.FATAL)
+
+    def test_route_multicast_with_missing_local_receiver(self):
+        worker = container._ShardWorker.__new__(container._ShardWorker)
+        worker.index, worker.shards, worker.container_aid = 0, 2, None
+        worker.backlog = deque()
+        worker.stats = {'sent': 0}
+        ring = container.RingBuffer(capacity=4096)
+        worker.outbound = {1: ring}
+        try:
+            names = ['agent%d@AP' % i for i in range(20)]
+            local = [name for name in names if container.shard_of(name, 2) == 0]
+            remote = [name for name in names if container.shard_of(name, 2) == 1]
+            message = acl.ACLMessage(acl.Performative.INFORM, receivers=local[:1] + remote[:1])
+            self.assertEqual(worker.route(message, message.receivers), mas.ReturnCodes.NOT_REGISTERED)
+            # the receiver of the other shard still gets its frame
+            self.assertEqual(len(ring.read()), 1)
+        finally:
+            ring.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, directory
+
+import unittest
+
+
+class AgentDirectoryTestSuite(unittest.TestCase):
+    """AMS white pages directory test cases."""
+
+    def setUp(self):
+        self.directory = directory.AgentDirectory()
+        for i in range(10):
+            self.directory.register(directory.AMSAgentDescription(
+                name='agent%d@AP' % i,
+                state=mas.AgentState.ACTIVE if i % 2 else mas.AgentState.SUSPENDED,
+                platform_id=i % 3,
+                addresses=['tcp://host%d:7000' % (i % 5)]))
+
+    def test_register_twice(self):
+        description = directory.AMSAgentDescription(name='agent0@AP')
+        self.assertEqual(self.directory.register(description), mas.ReturnCodes.ALREADY_REGISTERED)
+        self.assertEqual(len(self.directory), 10)
+
+    def test_deregister(self):
+        self.assertEqual(self.directory.deregister('agent1@AP'), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.directory.deregister('agent1@AP'), mas.ReturnCodes.NOT_REGISTERED)
+        template = directory.AMSAgentDescription(state=mas.AgentState.ACTIVE)
+        self.assertNotIn('agent1@AP', [d.name for d in self.directory.search(template)])
+
+    def test_search_intersects_indexes(self):
+        template = directory.AMSAgentDescription(state=mas.AgentState.ACTIVE, platform_id=0)
+        self.assertEqual([d.name for d in self.directory.search(template)], ['agent3@AP', 'agent9@AP'])
+        template = directory.AMSAgentDescription(addresses=['tcp://host1:7000'])
+        self.assertEqual([d.name for d in self.directory.search(template)], ['agent1@AP', 'agent6@AP'])
+        self.assertEqual(len(self.directory.search(max_results=4)), 4)
+
+    def test_modify_reindexes(self):
+        description = directory.AMSAgentDescription(name='agent0@AP', state=mas.AgentState.ACTIVE, platform_id=7)
+        self.assertEqual(self.directory.modify(description), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.directory.search(directory.AMSAgentDescription(platform_id=0))[0].name, 'agent3@AP')
+        self.assertEqual(self.directory.search(directory.AMSAgentDescription(platform_id=7)), [description])
+        self.directory.set_state('agent0@AP', mas.AgentState.WAITING)
+        template = directory.AMSAgentDescription(state=mas.AgentState.WAITING)
+        self.assertEqual([d.name for d in self.directory.search(template)], ['agent0@AP'])
+
+    def test_ams_delegates_to_directory(self):
+        ams = mas.AgentManagementSystem()
+        description = mas.AMSAgentDescription(name='agent@AP', state=mas.AgentState.INITIATED)
+        self.assertEqual(ams.register(description), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(ams.search(mas.AMSAgentDescription(name='agent@AP')), [description])
+        self.assertEqual(ams.deregister('agent@AP'), mas.ReturnCodes.SUCCESS)
+
+    def tearDown(self):
+        self.directory = None
+
+
+class ServiceDirectoryTestSuite(unittest.TestCase):
+    """DF yellow pages directory test cases."""
+
+    def setUp(self):
+        self.df = mas.DirectoryFacilitator(max_results=3)
+        for i in range(10):
+            self.df.register(directory.DFAgentDescription(name='agent%d@AP' % i, services=[
+                directory.ServiceDescription(name='planner', type='planning' if i % 2 else 'routing',
+                                             ontologies=['logistics'], protocols=['fipa-request'],
+                                             properties={'region': i % 3}),
+                directory.ServiceDescription(name='weather', type='sensing', languages=['fipa-sl'])]))
+
+    def test_multi_constraint_search(self):
+        template = directory.DFAgentDescription(services=[
+            directory.ServiceDescription(type='planning', properties={'region': 0})])
+        self.assertEqual([d.name for d in self.df.search(template)], ['agent3@AP', 'agent9@AP'])
+
+    def test_constraints_must_hold_on_one_service(self):
+        # planning and fipa-sl are offered by the agent but not by the same service
+        template = directory.DFAgentDescription(services=[
+            directory.ServiceDescription(type='planning', languages=['fipa-sl'])])
+        self.assertEqual(self.df.search(template), [])
+
+    def test_pagination(self):
+        template = directory.DFAgentDescription(services=[directory.ServiceDescription(type='sensing')])
+        self.assertEqual(len(self.df.search(template)), 3)
+        self.assertEqual(len(self.df.search(template, max_results=50)), 3)
+        pages = [self.df.search(template, offset=offset) for offset in range(0, 12, 3)]
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+
+    def test_deregister_and_modify(self):
+        self.assertEqual(self.df.deregister('agent1@AP'), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(self.df.deregister('agent1@AP'), mas.ReturnCodes.NOT_REGISTERED)
+        description = directory.DFAgentDescription(name='agent3@AP',
+                                                   services=[directory.ServiceDescription(type='translation')])
+        self.assertEqual(self.df.modify(description), mas.ReturnCodes.SUCCESS)
+        template = directory.DFAgentDescription(services=[directory.ServiceDescription(type='planning')])
+        self.assertEqual([d.name for d in self.df.search(template)], ['agent5@AP', 'agent7@AP', 'agent9@AP'])
+        template = directory.DFAgentDescription(services=[directory.ServiceDescription(type='translation')])
+        self.assertEqual(self.df.search(template), [description])
+
+    def test_list_valued_property(self):
+        description = directory.DFAgentDescription(name='mapper@AP', services=[
+            directory.ServiceDescription(type='mapping', properties={'zones': ['north', 'south'], 'region': 1})])
+        self.assertEqual(self.df.register(description), mas.ReturnCodes.SUCCESS)
+        template = directory.DFAgentDescription(services=[
+            directory.ServiceDescription(properties={'zones': ['north', 'south']})])
+        self.assertEqual(self.df.search(template), [description])
+        template = directory.DFAgentDescription(services=[directory.ServiceDescription(properties={'zones': ['east']})])
+        self.assertEqual(self.df.search(template), [])
+        self.assertEqual(self.df.deregister('mapper@AP'), mas.ReturnCodes.SUCCESS)
+        postings = self.df._directory._postings
+        self.assertFalse([term for term, posting in postings.items() if 'mapper@AP' in posting])
+        self.assertNotIn(('type', 'mapping'), postings)
+
+
+if __name__ == '__main__':
+    unittest.main()
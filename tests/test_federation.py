@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, directory, federation
+
+import asyncio
+import time
+import unittest
+
+
+def planner(name):
+    return directory.DFAgentDescription(name=name, services=[directory.ServiceDescription(type='planning')])
+
+
+class SlowPeer(federation.DFPeer):
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def search(self, search_id, template, max_results, max_depth, timeout):
+        await asyncio.sleep(self.delay)
+        return [planner('late@AP')]
+
+
+class FederationTestSuite(unittest.TestCase):
+    """Federated DF test cases, the DFs talk over loopback sockets."""
+
+    def setUp(self):
+        self.dfs = [mas.DirectoryFacilitator() for _ in range(3)]
+        for i, df in enumerate(self.dfs):
+            df.register(planner('agent%d@AP' % i))
+            # the same agent registered with every DF must be reported once
+            df.register(planner('shared@AP'))
+        self.template = directory.DFAgentDescription(services=[directory.ServiceDescription(type='planning')])
+
+    def run_federated(self, coroutine_function):
+        async def main():
+            servers = [federation.DFFederationServer(df) for df in self.dfs]
+            peers = [await server.start() for server in servers]
+            # ring of DFs, every search would loop forever without the search ID cache
+            for i, df in enumerate(self.dfs):
+                df.add_peer(peers[(i + 1) % len(peers)])
+            try:
+                return await coroutine_function()
+            finally:
+                for server in servers:
+                    await server.stop()
+        return asyncio.run(main())
+
+    def test_search_reaches_every_df_once(self):
+        results = self.run_federated(lambda: self.dfs[0].federated_search(self.template, max_depth=5))
+        self.assertEqual(sorted(d.name for d in results), ['agent0@AP', 'agent1@AP', 'agent2@AP', 'shared@AP'])
+
+    def test_aid_names(self):
+        for i, df in enumerate(self.dfs):
+            df.register(planner(mas.AID('worker%d' % i, 'AP')))
+        results = self.run_federated(lambda: self.dfs[0].federated_search(self.template, max_depth=5))
+        workers = sorted(d.name for d in results if str(d.name).startswith('worker'))
+        # the remote ones are decoded back to AIDs
+        self.assertEqual([type(name) for name in workers], [mas.AID] * 3)
+        self.assertEqual(workers, [mas.AID('worker%d' % i, 'AP') for i in range(3)])
+
+    def test_depth_limit(self):
+        async def search():
+            return (await self.dfs[0].federated_search(self.template, max_depth=1),
+                    await self.dfs[0].federated_search(self.template, max_depth=0))
+        one_hop, local = self.run_federated(search)
+        self.assertEqual(sorted(d.name for d in one_hop), ['agent0@AP', 'agent1@AP', 'shared@AP'])
+        self.assertEqual(sorted(d.name for d in local), ['agent0@AP', 'shared@AP'])
+
+    def test_deadline_returns_partial_results(self):
+        df = mas.DirectoryFacilitator()
+        df.register(planner('local@AP'))
+        df.add_peer(SlowPeer(5.0))
+        df.add_peer(mas.DirectoryFacilitator())
+        start = time.monotonic()
+        results = asyncio.run(df.federated_search(self.template, timeout=0.1))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual([d.name for d in results], ['local@AP'])
+
+    def test_search_id_cache(self):
+        cache = federation.SearchIdCache(capacity=2)
+        self.assertTrue(cache.add('a'))
+        self.assertFalse(cache.add('a'))
+        cache.add('b')
+        cache.add('c')
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.add('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, lifecycle
+
+import asyncio
+import signal
+import unittest
+
+
+class IdleAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class LifecycleTestSuite(unittest.TestCase):
+    """Agent life cycle state machine test cases."""
+
+    def test_legal_transitions(self):
+        agent = IdleAgent(platform_id=1)
+        self.assertEqual(agent.invoke(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.suspend(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.resume(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.move(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.state, mas.AgentState.TRANSIT)
+        self.assertEqual(agent.execute(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.quit(), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.state, mas.AgentState.UNKNOWN)
+
+    def test_illegal_transitions_are_rejected(self):
+        agent = IdleAgent(platform_id=1)
+        self.assertEqual(agent.resume(), mas.ReturnCodes.ILLEGAL_TRANSITION)
+        self.assertEqual(agent.state, mas.AgentState.INITIATED)
+        agent.invoke()
+        self.assertEqual(agent.invoke(), mas.ReturnCodes.ILLEGAL_TRANSITION)
+        self.assertEqual(agent.execute(), mas.ReturnCodes.ILLEGAL_TRANSITION)
+        agent.destroy()
+        self.assertEqual(agent.quit(), mas.ReturnCodes.ILLEGAL_TRANSITION)
+        self.assertIsNone(lifecycle.next_state(lifecycle.Operation.WAKEUP, mas.AgentState.ACTIVE))
+
+    def test_signal_outside_its_state_is_ignored(self):
+        agent = IdleAgent(platform_id=1)
+        agent.invoke()
+        agent.signal_handler(signal.SIGCONT, None)
+        self.assertEqual(agent.state, mas.AgentState.ACTIVE)
+        agent.suspend()
+        agent.signal_handler(signal.SIGCONT, None)
+        self.assertEqual(agent.state, mas.AgentState.ACTIVE)
+        agent.signal_handler(signal.SIGTERM, None)
+        self.assertEqual(agent.state, mas.AgentState.UNKNOWN)
+
+
+class TransitionStreamTestSuite(unittest.TestCase):
+    """Batched transition events test cases."""
+
+    def setUp(self):
+        self.batches = []
+        self.stream = lifecycle.TransitionStream(batch_size=3)
+        self.stream.subscribe(self.batches.append)
+
+    def test_batches(self):
+        for index in range(4):
+            self.stream.publish(index, mas.AgentState.INITIATED, mas.AgentState.ACTIVE)
+        self.assertEqual([len(batch) for batch in self.batches], [3])
+        self.assertEqual(self.stream.flush(), 1)
+        self.assertEqual(self.batches[1][0], lifecycle.TransitionEvent(3, mas.AgentState.INITIATED,
+                                                                       mas.AgentState.ACTIVE))
+        self.assertEqual(self.stream.delivered, 4)
+
+    def test_flushed_once_per_loop_iteration(self):
+        async def main():
+            self.stream.publish('a', mas.AgentState.INITIATED, mas.AgentState.ACTIVE)
+            self.stream.publish('b', mas.AgentState.INITIATED, mas.AgentState.ACTIVE)
+            self.assertEqual(self.batches, [])
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+        self.assertEqual([len(batch) for batch in self.batches], [2])
+
+    def test_ams_follows_the_stream(self):
+        platform = mas.AgentPlatform('AP')
+        agent = IdleAgent()
+        aid = platform.ams.create(agent)
+        agent._runtime = platform.runtime
+        agent.invoke()
+        agent.suspend()
+        self.assertEqual(len(platform.runtime.transitions), 2)
+        self.assertEqual(platform.ams.state_of(aid), mas.AgentState.SUSPENDED)
+        agent.quit()
+        self.assertEqual(platform.ams.state_of(aid), mas.AgentState.UNKNOWN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, logconfig
+
+import io
+import logging
+import queue
+import unittest
+
+
+class LogConfigTestSuite(unittest.TestCase):
+    """Queue based logging configuration test cases."""
+
+    def tearDown(self):
+        logconfig.stop()
+        logging.getLogger(logconfig.PACKAGE_LOGGER).setLevel(logging.NOTSET)
+        logconfig.refresh()
+
+    def test_nothing_configured_at_import(self):
+        self.assertEqual(logging.getLogger(logconfig.PACKAGE_LOGGER).handlers, [])
+        self.assertEqual(mas.log.handlers, [])
+
+    def test_records_reach_the_stream(self):
+        stream = io.StringIO()
+        platform = mas.AgentPlatform(1)
+        platform.start_logging('debug', stream)
+        mas.log.debug('hello from the platform')
+        platform.stop_logging()
+        self.assertIn('hello from the platform', stream.getvalue())
+
+    def test_switch_follows_the_level(self):
+        log_switch = logconfig.switch(logging.getLogger('copdai_core.test'))
+        logconfig.start(logging.WARNING, None)
+        self.assertFalse(log_switch.enabled)
+        logconfig.set_level('debug')
+        self.assertTrue(log_switch.enabled)
+
+    def test_full_queue_drops_records(self):
+        handler = logconfig._DroppingQueueHandler(queue.Queue(1))
+        for index in range(5):
+            handler.emit(logging.makeLogRecord({'msg': 'record %d' % index}))
+        self.assertEqual(handler.dropped, 4)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_invalid_level(self):
+        with self.assertRaises(ValueError):
+            logconfig.parse_level('verbose')
+
+
+if __name__ == '__main__':
+    unittest.main()
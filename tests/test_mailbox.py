@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, mailbox, acl
+
+import asyncio
+import tempfile
+import unittest
+
+
+class EchoAgent(mas.AbstractAgent):
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class MailboxTestSuite(unittest.TestCase):
+    """Agent mailbox and MTS delivery test cases."""
+
+    def test_drop_oldest(self):
+        box = mailbox.Mailbox(capacity=3, policy=mailbox.OverflowPolicy.DROP_OLDEST)
+        for i in range(5):
+            self.assertEqual(box.put(i), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(box.drain(), [2, 3, 4])
+        self.assertEqual(box.dropped, 2)
+
+    def test_drop_newest(self):
+        box = mailbox.Mailbox(capacity=3, policy=mailbox.OverflowPolicy.DROP_NEWEST)
+        codes = [box.put(i) for i in range(5)]
+        self.assertEqual(codes[-1], mas.ReturnCodes.BUFFER_OVERFLOW)
+        self.assertEqual(box.drain(), [0, 1, 2])
+
+    def test_block_times_out(self):
+        box = mailbox.Mailbox(capacity=1, policy=mailbox.OverflowPolicy.BLOCK, block_timeout=0.01)
+        self.assertEqual(box.put(0), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(box.put(1), mas.ReturnCodes.BUFFER_OVERFLOW)
+        self.assertEqual(box.get(), 0)
+        self.assertEqual(box.put(2), mas.ReturnCodes.SUCCESS)
+
+    def test_block_refused_in_event_loop(self):
+        box = mailbox.Mailbox(capacity=1, policy=mailbox.OverflowPolicy.BLOCK)
+
+        async def main():
+            # no timeout: waiting here would never end
+            return [box.put(0), box.put(1)]
+
+        self.assertEqual(asyncio.run(main()), [mas.ReturnCodes.SUCCESS, mas.ReturnCodes.BUFFER_OVERFLOW])
+        self.assertEqual(box.dropped, 1)
+
+    def test_buffer_message_to_active_agent(self):
+        agent = EchoAgent(platform_id=1)
+        mts = mas.MessageTransportService(capacity=8)
+        agent.invoke()
+        mts.bufferMessage(agent, 'hello')
+        self.assertFalse(agent._mailbox.held)
+
+    def test_spill_keeps_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            box = mailbox.Mailbox(capacity=2, policy=mailbox.OverflowPolicy.SPILL, spill_directory=directory)
+            for i in range(10):
+                box.put({'n': i})
+            self.assertEqual(len(box), 10)
+            self.assertEqual([m['n'] for m in box.drain(4)], [0, 1, 2, 3])
+            box.put({'n': 10})
+            self.assertEqual([m['n'] for m in box.drain()], list(range(4, 11)))
+            box.close()
+
+    def test_buffer_until_active(self):
+        agent = EchoAgent(platform_id=1)
+        mts = mas.MessageTransportService(capacity=8)
+        notified = []
+        mts.mailbox(agent).listener = lambda: notified.append(len(agent._mailbox))
+        self.assertEqual(mts.deliverMessage(agent, 'hello'), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(notified, [])
+        agent.invoke()
+        self.assertEqual(notified, [1])
+        mts.deliverMessage(agent, 'world')
+        self.assertEqual(agent.receive(), 'hello')
+        agent.suspend()
+        mts.deliverMessage(agent, 'again')
+        self.assertEqual(notified, [1, 2])
+        agent.resume()
+        self.assertEqual(notified, [1, 2, 2])
+        self.assertEqual([agent.receive(), agent.receive(), agent.receive()], ['world', 'again', None])
+
+    def test_local_multicast_shares_the_message(self):
+        mts = mas.MessageTransportService()
+        routed = []
+        mts.router = lambda message, receivers: routed.append(receivers) or mas.ReturnCodes.SUCCESS
+        agents = [EchoAgent(platform_id=1) for _ in range(3)]
+        for agent in agents:
+            mts.attach(agent)
+            agent.invoke()
+        payload = bytearray(b'x' * 4096)
+        message = acl.ACLMessage(acl.Performative.INFORM, receivers=[a.aid for a in agents] + ['far@away'],
+                                 content=payload)
+        self.assertEqual(mts.send(message), mas.ReturnCodes.SUCCESS)
+        received = [agent.receive() for agent in agents]
+        self.assertTrue(all(m is message for m in received))
+        self.assertIs(received[0].content, payload)
+        self.assertEqual(routed, [['far@away']])
+
+
+def _message(performative, conversation_id, n, sender='a@AP'):
+    return acl.ACLMessage(performative, sender=sender, conversation_id=conversation_id, content=n)
+
+
+class SelectiveReceiveTestSuite(unittest.TestCase):
+    """Message template and selective receive test cases."""
+
+    def test_template_fields(self):
+        message = _message(acl.Performative.INFORM, 'c1', 1)
+        self.assertTrue(acl.MessageTemplate().match(message))
+        self.assertTrue(acl.MessageTemplate(performative=acl.Performative.INFORM, conversation_id='c1').match(message))
+        self.assertFalse(acl.MessageTemplate(performative=acl.Performative.CFP).match(message))
+        self.assertTrue(acl.MessageTemplate(sender=mas.AID('a', 'AP')).match(message))
+        self.assertFalse(acl.MessageTemplate(predicate=lambda m: m.content > 1).match(message))
+        # anything that is not an ACL message only matches the wildcard template
+        self.assertFalse(acl.MessageTemplate(ontology='x').match('hello'))
+
+    def test_select_out_of_order(self):
+        box = mailbox.Mailbox(capacity=100)
+        performatives = (acl.Performative.INFORM, acl.Performative.PROPOSE)
+        for n in range(12):
+            box.put(_message(performatives[n % 2], 'c%d' % (n % 3), n))
+        self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c2')).content, 2)
+        self.assertEqual(box.get(acl.MessageTemplate(performative=acl.Performative.PROPOSE)).content, 1)
+        self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c1', performative=acl.Performative.INFORM))
+                         .content, 4)
+        self.assertIsNone(box.get(acl.MessageTemplate(conversation_id='c9')))
+        self.assertEqual(len(box), 9)
+        self.assertEqual([m.content for m in box.drain()], [0, 3, 5, 6, 7, 8, 9, 10, 11])
+
+    def test_indexes_stay_bounded(self):
+        box = mailbox.Mailbox(capacity=100000)
+        box.put(_message(acl.Performative.INFORM, 'head', -1))
+        for n in range(10000):
+            box.put(_message(acl.Performative.INFORM, 'c%d' % n, n))
+            self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c%d' % n)).content, n)
+        queue = box._messages
+        self.assertEqual(len(queue), 1)
+        self.assertLess(len(queue._cells), 100)
+        self.assertEqual(list(queue._by_conversation), ['head'])
+
+    def test_select_spilled_message(self):
+        box = mailbox.Mailbox(capacity=2, policy=mailbox.OverflowPolicy.SPILL)
+        for n in range(6):
+            box.put(_message(acl.Performative.INFORM, 'c%d' % n, n))
+        self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c4')).content, 4)
+        self.assertEqual([m.content for m in box.drain()], [0, 1, 2, 3, 5])
+        box.close()
+
+    def test_select_spilled_keeps_memory_bounded(self):
+        box = mailbox.Mailbox(capacity=10, policy=mailbox.OverflowPolicy.SPILL)
+        for n in range(1000):
+            box.put(_message(acl.Performative.INFORM, 'c%d' % n, n))
+        self.assertIsNone(box.get(acl.MessageTemplate(conversation_id='none')))
+        self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c500')).content, 500)
+        self.assertEqual(box.get(acl.MessageTemplate(conversation_id='c999')).content, 999)
+        self.assertEqual(len(box._messages), 10)
+        self.assertEqual(len(box), 998)
+        self.assertEqual([m.content for m in box.drain()], [n for n in range(999) if n != 500])
+        box.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl, metrics
+
+import unittest
+
+Performative = acl.Performative
+
+
+class SinkAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class MetricsTestSuite(unittest.TestCase):
+    """Platform metrics test cases."""
+
+    def setUp(self):
+        self.platform = mas.AgentPlatform('AP', mts=mas.MessageTransportService(capacity=2))
+        self.agent = SinkAgent(platform_id=1)
+        self.platform.mts.attach(self.agent)
+
+    def send(self, count):
+        for n in range(count):
+            self.platform.mts.send(acl.ACLMessage(Performative.INFORM, receivers=(self.agent.aid,), content=n))
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        samples = histogram.samples('latency', ())
+        self.assertEqual([value for name, labels, value in samples if name == 'latency_bucket'], [2, 3, 4])
+        self.assertEqual(samples[-1], ('latency_count', (), 4))
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+
+    def test_mailbox_counters(self):
+        # held while initiated, the third message pushes the oldest one out
+        self.send(3)
+        agent = str(self.agent.aid)
+        registry = self.platform.metrics
+        self.assertEqual(registry.value('copdai_messages_delivered_total', agent=agent), 3)
+        self.assertEqual(registry.value('copdai_messages_buffered_total', agent=agent), 3)
+        self.assertEqual(registry.value('copdai_messages_dropped_total', agent=agent), 1)
+        self.assertEqual(registry.value('copdai_mailbox_depth', agent=agent), 2)
+        self.agent.invoke()
+        self.agent.receive()
+        self.assertEqual(registry.value('copdai_mailbox_depth', agent=agent), 1)
+
+    def test_sampled_operations(self):
+        platform = self.platform
+        self.assertEqual(platform.start_metrics(sample_every=2), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(platform.start_metrics(), mas.ReturnCodes.ALREADY_REGISTERED)
+        self.send(10)
+        for n in range(4):
+            platform.df.search()
+        registry = platform.metrics
+        self.assertEqual(registry.value('copdai_mts_send_seconds_count'), 5)
+        self.assertEqual(registry.value('copdai_df_operation_seconds_count', operation='search'), 2)
+        self.assertEqual(platform.stop_metrics(), mas.ReturnCodes.SUCCESS)
+        self.send(10)
+        self.assertEqual(registry.value('copdai_mts_send_seconds_count'), 5)
+        self.assertEqual(platform.stop_metrics(), mas.ReturnCodes.NOT_REGISTERED)
+
+    def test_state_times(self):
+        clock = [0.0]
+        times = metrics.StateTimes(clock=lambda: clock[0])
+        aid = self.agent.aid
+        times.transitions_published([mas.lifecycle.TransitionEvent(aid, mas.AgentState.INITIATED,
+                                                                   mas.AgentState.ACTIVE)])
+        clock[0] = 2.0
+        times.transitions_published([mas.lifecycle.TransitionEvent(aid, mas.AgentState.ACTIVE,
+                                                                   mas.AgentState.SUSPENDED)])
+        clock[0] = 3.0
+        totals = times.totals()
+        self.assertEqual(totals[mas.AgentState.ACTIVE], 2.0)
+        self.assertEqual(totals[mas.AgentState.SUSPENDED], 1.0)
+
+    def test_exposition(self):
+        self.platform.start_metrics()
+        self.send(1)
+        text = self.platform.metrics.exposition()
+        self.assertIn('# TYPE copdai_mts_send_seconds histogram\n', text)
+        self.assertIn('copdai_messages_delivered_total{agent="%s"} 1\n' % self.agent.aid, text)
+        self.assertIn('copdai_agent_state_seconds_total{state="active"} ', text)
+        self.assertIn('copdai_mts_send_seconds_bucket{le="+Inf"} ', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl, mobility
+
+import asyncio
+import pickle
+import threading
+import unittest
+
+
+class CarrierAgent(mas.AbstractAgent):
+    """Keep a counter and a large buffer across migrations."""
+
+    __slots__ = ['counter', 'payload', 'moves']
+
+    def __init__(self, payload=b'', name=None, platform_id=None):
+        super().__init__(platform_id=platform_id, name=name)
+        self.counter = 0
+        self.payload = payload
+        self.moves = []
+
+    def setup(self):
+        self.moves.append('setup')
+
+    async def run(self):
+        while True:
+            await self.receive_async()
+            self.counter += 1
+
+    def teardown(self):
+        self.moves.append('teardown')
+
+    def before_move(self):
+        self.moves.append('before')
+
+    def after_move(self):
+        self.moves.append('after')
+
+
+class SnapshotTestSuite(unittest.TestCase):
+    """Agent state snapshot test cases."""
+
+    def test_round_trip(self):
+        agent = CarrierAgent(b'x' * (mobility.OUT_OF_BAND_SIZE * 2), platform_id=1)
+        agent.counter = 7
+        state = mobility.snapshot(agent)
+        # the large buffer is not copied into the pickle
+        self.assertEqual(len(state.buffers), 1)
+        self.assertLess(len(state.data), mobility.OUT_OF_BAND_SIZE)
+        copy = mobility.restore(state.data, [bytes(buffer.raw()) for buffer in state.buffers])
+        self.assertEqual(copy.aid, agent.aid)
+        self.assertEqual(copy.counter, 7)
+        self.assertEqual(copy.payload, agent.payload)
+        self.assertEqual(copy.state, mas.AgentState.TRANSIT)
+        self.assertIsNone(copy._mailbox)
+
+
+class MigrationTestSuite(unittest.TestCase):
+    """Migration of a running agent between two platforms over loopback."""
+
+    def test_migrate(self):
+        origin = mas.AgentPlatform('origin')
+        destination = mas.AgentPlatform('destination')
+        agent = CarrierAgent(b'y' * 100000)
+
+        def inform():
+            return acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid])
+
+        async def main():
+            await origin.mts.listen('tcp://127.0.0.1:0')
+            await destination.mts.listen('tcp://127.0.0.1:0')
+            address = await destination.listen_migrations('tcp://127.0.0.1:0')
+            aid = origin.ams.create(agent)
+            origin.ams.invoke(aid)
+            origin.mts.send(inform())
+            await asyncio.sleep(0.01)
+            report = await origin.migrate(aid, address)
+            # sent to the former platform, forwarded to the new one
+            origin.mts.send(inform())
+            moved = destination.ams._agents[aid]
+            for _ in range(100):
+                if moved.counter == 2:
+                    break
+                await asyncio.sleep(0.01)
+            destination.ams.terminate(aid)
+            await destination.runtime.join(1)
+            await origin.runtime.join(1)
+            await destination.stop_migrations()
+            await origin.mts.close()
+            await destination.mts.close()
+            return report, moved
+
+        report, moved = asyncio.run(main())
+        self.assertEqual(report.code, mas.ReturnCodes.SUCCESS)
+        self.assertGreater(report.pause, 0)
+        self.assertEqual(report.buffer_size, 100000)
+        self.assertIsNot(moved, agent)
+        self.assertEqual(moved.counter, 2)
+        self.assertEqual(moved.moves, ['setup', 'before', 'after', 'teardown'])
+        self.assertEqual(origin.ams.state_of(agent.aid), mas.AgentState.UNKNOWN)
+        self.assertEqual(len(origin.runtime), 0)
+
+    def test_failed_snapshot_keeps_the_agent(self):
+        origin = mas.AgentPlatform('origin')
+        destination = mas.AgentPlatform('destination')
+        agent = CarrierAgent(threading.Lock())
+
+        async def main():
+            address = await destination.listen_migrations('tcp://127.0.0.1:0')
+            aid = origin.ams.create(agent)
+            origin.ams.invoke(aid)
+            await asyncio.sleep(0)
+            with self.assertLogs('copdai_core.mas', 'ERROR'):
+                report = await origin.migrate(aid, address)
+            origin.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[aid]))
+            for _ in range(100):
+                if agent.counter == 1:
+                    break
+                await asyncio.sleep(0.01)
+            state = origin.ams.state_of(aid)
+            origin.ams.terminate(aid)
+            await origin.runtime.join(1)
+            await destination.stop_migrations()
+            return report, state
+
+        report, state = asyncio.run(main())
+        self.assertEqual(report.code, mas.ReturnCodes.FATAL)
+        self.assertEqual(state, mas.AgentState.ACTIVE)
+        self.assertEqual(agent.counter, 1)
+
+    def test_bad_snapshot_is_refused(self):
+        destination = mas.AgentPlatform('destination')
+
+        async def main():
+            address = await destination.listen_migrations('tcp://127.0.0.1:0')
+            with self.assertLogs('copdai_core.mobility', 'ERROR'):
+                codes = [await mobility.send_snapshot(address, mobility.Snapshot(pickle.dumps(5)), None)
+                         for _ in range(2)]
+            await destination.stop_migrations()
+            return codes
+
+        # the server answers and keeps serving
+        self.assertEqual(asyncio.run(main()), [mas.ReturnCodes.FATAL] * 2)
+
+    def test_public_address_needs_a_key(self):
+        destination = mas.AgentPlatform('destination')
+
+        async def main():
+            with self.assertRaises(ValueError):
+                await destination.listen_migrations('tcp://0.0.0.0:0')
+
+        asyncio.run(main())
+
+    def test_wrong_key_is_refused(self):
+        origin = mas.AgentPlatform('origin')
+        destination = mas.AgentPlatform('destination')
+        agent = CarrierAgent()
+
+        async def main():
+            address = await destination.listen_migrations('tcp://127.0.0.1:0', key=b'secret')
+            aid = origin.ams.create(agent)
+            origin.ams.invoke(aid)
+            await asyncio.sleep(0)
+            with self.assertLogs('copdai_core.mobility', 'WARNING'):
+                refused = await origin.migrate(aid, address, key=b'guess')
+            state = origin.ams.state_of(aid)
+            report = await origin.migrate(aid, address, key=b'secret')
+            destination.ams.terminate(aid)
+            await destination.runtime.join(1)
+            await origin.runtime.join(1)
+            await destination.stop_migrations()
+            return refused, state, report
+
+        refused, state, report = asyncio.run(main())
+        self.assertEqual(refused.code, mas.ReturnCodes.FATAL)
+        self.assertEqual(state, mas.AgentState.ACTIVE)
+        self.assertEqual(report.code, mas.ReturnCodes.SUCCESS)
+
+    def test_uncommitted_agent_is_dismissed(self):
+        destination = mas.AgentPlatform('destination')
+        agent = CarrierAgent(platform_id=1)
+        agent.move()
+
+        def release():
+            raise ConnectionResetError('origin lost')
+
+        async def main():
+            address = await destination.listen_migrations('tcp://127.0.0.1:0')
+            with self.assertRaises(ConnectionResetError):
+                await mobility.send_snapshot(address, mobility.snapshot(agent), None, release=release)
+            for _ in range(100):
+                if agent.aid not in destination.ams._agents:
+                    break
+                await asyncio.sleep(0.01)
+            await destination.stop_migrations()
+
+        asyncio.run(main())
+        # registered before the commit, dropped without it: the agent never runs on both platforms
+        self.assertNotIn(agent.aid, destination.ams._agents)
+        self.assertEqual(len(destination.runtime), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, persistence
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+
+def description(i, state=mas.AgentState.ACTIVE):
+    return mas.AMSAgentDescription(name=mas.AID('agent%d' % i, '000000000001'), state=state, platform_id=1,
+                                   addresses=('tcp://127.0.0.1:%d' % (7000 + i % 3),))
+
+
+class DurableDirectoryTestSuite(unittest.TestCase):
+    """Write-ahead logged AMS directory test cases."""
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.path = self.temporary.name
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def reopen(self, directory, **options):
+        directory.close()
+        return persistence.DurableAgentDirectory.open(self.path, **options)
+
+    def test_recovery(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=8)
+        for i in range(100):
+            directory.register(description(i))
+        directory.deregister('agent3@000000000001')
+        directory.set_state('agent4@000000000001', mas.AgentState.SUSPENDED)
+        directory.modify(description(5, mas.AgentState.WAITING))
+        directory = self.reopen(directory)
+        self.assertEqual(len(directory), 99)
+        self.assertNotIn('agent3@000000000001', directory)
+        suspended = directory.search(mas.AMSAgentDescription(state=mas.AgentState.SUSPENDED))
+        self.assertEqual([str(d.name) for d in suspended], ['agent4@000000000001'])
+        self.assertEqual(directory.get('agent5@000000000001').state, mas.AgentState.WAITING)
+        self.assertEqual(len(directory.search(mas.AMSAgentDescription(addresses=['tcp://127.0.0.1:7000']))), 33)
+        directory.close()
+
+    def test_group_commit(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=50, sync_interval=60)
+
+        async def register():
+            for i in range(120):
+                directory.register(description(i))
+
+        asyncio.run(register())
+        self.assertEqual(directory.journal.commits, 2)
+        self.assertEqual(directory.journal.records, 100)
+        directory = self.reopen(directory)
+        self.assertEqual(len(directory), 120)
+        directory.close()
+
+    def test_commit_without_loop(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=50, sync_interval=60)
+        for i in range(3):
+            directory.register(description(i))
+        self.assertEqual(directory.journal.commits, 3)
+        self.assertEqual(directory.journal.records, 3)
+        # nothing is left pending for a close that may never come
+        recovered = persistence.DurableAgentDirectory.open(self.path)
+        self.assertEqual(len(recovered), 3)
+        recovered.close()
+        directory.close()
+
+    def test_durable_in_loop(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, sync_interval=0)
+        grouped = persistence.DurableAgentDirectory.open(tempfile.mkdtemp(dir=self.path), sync_interval=60)
+
+        async def register():
+            for i in range(3):
+                directory.register(description(i))
+                grouped.register(description(i))
+            self.assertEqual(grouped.journal.records, 0)
+            self.assertEqual(grouped.commit(), 3)
+
+        asyncio.run(register())
+        self.assertEqual(directory.journal.commits, 3)
+        self.assertEqual(grouped.journal.records, 3)
+        directory.close()
+        grouped.close()
+
+    def test_unsupported_version(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=1, snapshot_every=5)
+        for i in range(10):
+            directory.register(description(i))
+        directory.close()
+        snapshot = os.path.join(self.path, persistence.SNAPSHOT_FILE)
+        with open(snapshot, 'r+b') as snapshot_file:
+            snapshot_file.seek(4)
+            snapshot_file.write(b'\x01')
+        with self.assertRaisesRegex(ValueError, 'Unsupported'):
+            persistence.DurableAgentDirectory.open(self.path)
+
+    def test_snapshot_compaction(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=10, snapshot_every=100)
+        for i in range(250):
+            directory.register(description(i))
+        for i in range(0, 250, 2):
+            directory.deregister(description(i).name)
+        logs = [name for name in os.listdir(self.path) if name.endswith('.log')]
+        self.assertEqual(len(logs), 1)
+        directory = self.reopen(directory)
+        self.assertEqual(len(directory), 125)
+        directory.close()
+
+    def test_torn_tail(self):
+        directory = persistence.DurableAgentDirectory.open(self.path, group_size=1)
+        for i in range(10):
+            directory.register(description(i))
+        directory.close()
+        log = os.path.join(self.path, [name for name in os.listdir(self.path) if name.endswith('.log')][0])
+        with open(log, 'ab') as log_file:
+            log_file.write(b'\x00\x00\x00\x40torn')
+        directory = persistence.DurableAgentDirectory.open(self.path)
+        self.assertEqual(len(directory), 10)
+        directory.register(description(10))
+        directory = self.reopen(directory)
+        self.assertEqual(len(directory), 11)
+        directory.close()
+
+    def test_platform_restart(self):
+        platform = mas.AgentPlatform('AP', state_directory=self.path)
+        platform.ams.register(description(1))
+        platform.close()
+        platform = mas.AgentPlatform('AP', state_directory=self.path)
+        self.assertEqual(platform.ams.state_of('agent1@000000000001'), mas.AgentState.ACTIVE)
+        platform.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, behaviours, profiler
+
+import asyncio
+import time
+import unittest
+
+
+class Burn(behaviours.CyclicBehaviour):
+    """Burn CPU for a number of steps."""
+
+    def __init__(self, steps, seconds):
+        super().__init__()
+        self.steps = steps
+        self.seconds = seconds
+
+    def action(self):
+        end = time.thread_time() + self.seconds
+        while time.thread_time() < end:
+            pass
+        self.steps -= 1
+
+    def done(self):
+        return self.steps <= 0
+
+
+class AsyncBurn(Burn):
+    """Burn CPU on both sides of an await."""
+
+    async def action(self):
+        super().action()
+        await asyncio.sleep(0.01)
+        super().action()
+
+
+class Idle(behaviours.OneShotBehaviour):
+
+    def action(self):
+        pass
+
+
+class SpinningAgent(mas.AbstractAgent):
+    """Burn CPU in its own run, without behaviour."""
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        end = time.thread_time() + 0.2
+        while time.thread_time() < end:
+            pass
+
+    def teardown(self):
+        pass
+
+
+class BehaviourAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class ProfilerTestSuite(unittest.TestCase):
+    """Agent profiler test cases."""
+
+    def setUp(self):
+        self.platform = mas.AgentPlatform('AP')
+
+    def tearDown(self):
+        self.platform.ams.stop_profiling()
+
+    def run_agents(self, agents):
+        async def main():
+            for agent in agents:
+                self.platform.runtime.spawn(agent)
+            await self.platform.runtime.join(timeout=10)
+
+        asyncio.run(main())
+
+    def test_accounting(self):
+        ams = self.platform.ams
+        self.assertEqual(ams.start_profiling(sampling=False), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(ams.start_profiling(sampling=False), mas.ReturnCodes.ALREADY_REGISTERED)
+        hot = BehaviourAgent(platform_id=1)
+        hot.add_behaviour(Burn(5, 0.01))
+        cold = BehaviourAgent(platform_id=1)
+        cold.add_behaviour(Idle())
+        self.run_agents([hot, cold])
+        self.assertEqual(ams.stop_profiling(), mas.ReturnCodes.SUCCESS)
+        wall, cpu, steps = ams.profiler.accounts[hot.aid, 'Burn']
+        self.assertEqual(steps, 5)
+        self.assertGreaterEqual(cpu, 0.045)
+        self.assertGreaterEqual(wall, cpu * 0.9)
+        self.assertEqual(ams.profiler.accounts[cold.aid, 'Idle'][2], 1)
+        self.assertEqual(ams.profiler.report()[0][:2], (hot.aid, 'Burn'))
+        self.assertEqual(ams.stop_profiling(), mas.ReturnCodes.NOT_REGISTERED)
+
+    def test_accounting_coroutine_actions(self):
+        ams = self.platform.ams
+        ams.start_profiling(sampling=False)
+        machine = behaviours.FSMBehaviour()
+        machine.register_first_state(AsyncBurn(4, 0.01), 'burn')
+        machine.register_last_state(Idle(), 'idle')
+        machine.register_default_transition('burn', 'idle')
+        agent = BehaviourAgent(platform_id=1)
+        agent.add_behaviour(machine)
+        self.run_agents([agent])
+        ams.stop_profiling()
+        wall, cpu, steps = ams.profiler.accounts[agent.aid, 'FSMBehaviour']
+        # the sleeps are wall time only
+        self.assertGreaterEqual(cpu, 0.035)
+        self.assertGreaterEqual(wall, cpu + 0.015)
+
+    def test_sampling_attributes_to_agents(self):
+        ams = self.platform.ams
+        self.assertEqual(ams.start_profiling(interval=0.002), mas.ReturnCodes.SUCCESS)
+        spinning = SpinningAgent(platform_id=1)
+        burning = BehaviourAgent(platform_id=1)
+        burning.add_behaviour(Burn(10, 0.02))
+        self.run_agents([spinning, burning])
+        ams.stop_profiling()
+        samples = ams.profiler.samples
+        self.assertGreater(samples.get((spinning.aid, profiler.RUN), 0), 10)
+        self.assertGreater(samples.get((burning.aid, 'Burn'), 0), 10)
+        collapsed = ams.profiler.collapsed()
+        self.assertIn('%s;%s;' % (spinning.aid, profiler.RUN), collapsed)
+        self.assertIn('%s;Burn;' % burning.aid, collapsed)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed.splitlines()))
+
+    def test_overhead_bound(self):
+        sampler = profiler.Profiler(interval=0.001, max_overhead=0.0)
+        sampler._started_cpu = time.process_time() - 1.0
+        sampler.sampling_time = 0.5
+        sampler._bound_overhead()
+        self.assertEqual(sampler.interval, 0.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
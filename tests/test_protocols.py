@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl, behaviours, protocols
+
+import asyncio
+import unittest
+
+Performative = acl.Performative
+
+
+class Responder(behaviours.CyclicBehaviour):
+    """Answer the requests, calls for proposals and subscriptions of the initiators."""
+
+    def __init__(self, price):
+        super().__init__()
+        self.price = price
+        self.cancelled = False
+
+    def action(self):
+        message = self.agent.receive()
+        if message is None:
+            self.block()
+            return
+        reply = self.agent.engine.reply
+        performative = message.performative
+        if self.price is None:
+            # never answers
+            return
+        if performative is Performative.CFP:
+            if self.price < 0:
+                reply(message, Performative.REFUSE)
+            else:
+                reply(message, Performative.PROPOSE, self.price)
+        elif performative is Performative.ACCEPT_PROPOSAL:
+            reply(message, Performative.INFORM, 'done %d' % message.content)
+        elif performative is Performative.REQUEST:
+            reply(message, Performative.AGREE)
+            reply(message, Performative.INFORM, message.content.upper())
+        elif performative is Performative.SUBSCRIBE:
+            reply(message, Performative.AGREE)
+            for n in range(3):
+                reply(message, Performative.INFORM, n)
+        elif performative is Performative.CANCEL:
+            self.cancelled = True
+
+
+class ProtocolAgent(mas.AbstractAgent):
+
+    __slots__ = ['engine']
+
+    def __init__(self, price=None):
+        super().__init__(platform_id=1)
+        self.engine = protocols.ProtocolEngine(self)
+        self.add_behaviour(Responder(price))
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class InitiatorAgent(mas.AbstractAgent):
+    """Driven by the test scenarios, it only stays alive."""
+
+    __slots__ = ['engine']
+
+    def __init__(self):
+        super().__init__(platform_id=1)
+        self.engine = protocols.ProtocolEngine(self)
+
+    def setup(self):
+        pass
+
+    async def run(self):
+        await asyncio.get_running_loop().create_future()
+
+    def teardown(self):
+        pass
+
+
+class ProtocolTestSuite(unittest.TestCase):
+    """Interaction protocol engine test cases."""
+
+    def setUp(self):
+        self.platform = mas.AgentPlatform('AP')
+        self.initiator = InitiatorAgent()
+
+    def run_with(self, agents, scenario):
+        async def main():
+            runtime = self.platform.runtime
+            runtime.spawn(self.initiator)
+            for agent in agents:
+                runtime.spawn(agent)
+            await asyncio.sleep(0)
+            try:
+                return await scenario()
+            finally:
+                for agent in [self.initiator] + agents:
+                    runtime.quit(agent)
+                await runtime.join(timeout=1)
+
+        return asyncio.run(main())
+
+    def test_request(self):
+        responder = ProtocolAgent(price=1)
+
+        async def scenario():
+            return await self.initiator.engine.request(responder.aid, 'ping', timeout=1)
+
+        conversation = self.run_with([responder], scenario)
+        self.assertEqual([m.performative for m in conversation.replies], [Performative.AGREE, Performative.INFORM])
+        self.assertEqual(conversation.last.content, 'PING')
+        self.assertFalse(conversation.expired)
+        self.assertEqual(self.initiator.engine.conversations, {})
+
+    def test_query_expires(self):
+        silent = ProtocolAgent(price=None)
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            conversation = await self.initiator.engine.query(silent.aid, 'price?', timeout=0.05)
+            return conversation, loop.time() - start
+
+        conversation, elapsed = self.run_with([silent], scenario)
+        self.assertTrue(conversation.expired)
+        self.assertEqual(conversation.replies, [])
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertLess(elapsed, 0.5)
+
+    def test_contract_net_stops_at_deadline(self):
+        # prices 1..100 propose, -1 refuses, None never answers
+        bidders = [ProtocolAgent(price=n + 1) for n in range(100)]
+        bidders += [ProtocolAgent(price=-1) for _ in range(20)] + [ProtocolAgent(price=None) for _ in range(5)]
+
+        def cheapest(proposals):
+            return sorted(proposals, key=lambda message: message.content)[:2]
+
+        async def scenario():
+            return await self.initiator.engine.contract_net([bidder.aid for bidder in bidders], 'task', 0.1,
+                                                            cheapest)
+
+        result = self.run_with(bidders, scenario)
+        self.assertEqual(len(result.proposals), 100)
+        self.assertEqual(len(result.refusals), 20)
+        self.assertTrue(result.expired)
+        self.assertEqual([message.content for message in result.accepted], [1, 2])
+        self.assertEqual(sorted(message.content for message in result.results), ['done 1', 'done 2'])
+
+    def test_subscribe_and_cancel(self):
+        responder = ProtocolAgent(price=1)
+        informs = []
+
+        async def scenario():
+            engine = self.initiator.engine
+            conversation = await engine.subscribe(responder.aid, 'prices', informs.append, timeout=1)
+            while len(informs) < 3:
+                await asyncio.sleep(0.001)
+            self.assertEqual(engine.cancel(conversation), mas.ReturnCodes.SUCCESS)
+            await asyncio.sleep(0.01)
+            return conversation
+
+        conversation = self.run_with([responder], scenario)
+        self.assertEqual([message.content for message in informs], [0, 1, 2])
+        self.assertEqual(conversation.replies[0].performative, Performative.AGREE)
+        self.assertTrue(responder._scheduler is None or
+                        all(b.cancelled for b in responder._scheduler._behaviours))
+
+
+if __name__ == '__main__':
+    unittest.main()
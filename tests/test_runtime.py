@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl
+
+import asyncio
+import unittest
+
+
+class CountingAgent(mas.AbstractAgent):
+    """Count the messages it receives until it gets None."""
+
+    __slots__ = ['received', 'events']
+
+    def __init__(self):
+        super().__init__(platform_id=1)
+        self.received = 0
+        self.events = []
+
+    async def setup(self):
+        self.events.append('setup')
+
+    async def run(self):
+        while True:
+            message = await self.receive_async()
+            if message == 'stop':
+                self.quit()
+                return
+            self.received += 1
+
+    def teardown(self):
+        self.events.append('teardown')
+
+
+class FailingAgent(CountingAgent):
+
+    __slots__ = []
+
+    async def run(self):
+        raise ValueError('broken')
+
+
+class RuntimeTestSuite(unittest.TestCase):
+    """Asyncio agent runtime test cases."""
+
+    def setUp(self):
+        self.platform = mas.AgentPlatform('AP')
+
+    def test_thousand_agents_in_one_loop(self):
+        agents = [CountingAgent() for _ in range(1000)]
+
+        async def main():
+            for agent in agents:
+                self.platform.runtime.spawn(agent)
+            await asyncio.sleep(0)
+            for agent in agents:
+                self.platform.mts.deliverMessage(agent, 'ping')
+                self.platform.mts.deliverMessage(agent, 'stop')
+            return await self.platform.runtime.join(timeout=5)
+
+        self.assertEqual(asyncio.run(main()), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(sum(agent.received for agent in agents), 1000)
+        self.assertEqual(agents[0].events, ['setup', 'teardown'])
+        self.assertEqual(agents[0].state, mas.AgentState.UNKNOWN)
+        self.assertEqual(len(self.platform.runtime), 0)
+
+    def test_suspended_agent_gets_messages_on_resume(self):
+        agent = CountingAgent()
+
+        async def main():
+            self.platform.runtime.spawn(agent)
+            await asyncio.sleep(0)
+            self.platform.runtime.suspend(agent)
+            self.platform.mts.deliverMessage(agent, 'ping')
+            await asyncio.sleep(0.01)
+            received_while_suspended = agent.received
+            self.platform.runtime.resume(agent)
+            await asyncio.sleep(0.01)
+            self.platform.runtime.quit(agent)
+            await self.platform.runtime.join(timeout=1)
+            return received_while_suspended
+
+        self.assertEqual(asyncio.run(main()), 0)
+        self.assertEqual(agent.received, 1)
+        self.assertEqual(agent.events, ['setup', 'teardown'])
+
+    def test_destroy_skips_teardown(self):
+        agent = CountingAgent()
+
+        async def main():
+            self.platform.runtime.spawn(agent)
+            await asyncio.sleep(0)
+            self.platform.runtime.destroy(agent)
+            return await self.platform.runtime.join(timeout=1)
+
+        self.assertEqual(asyncio.run(main()), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.events, ['setup'])
+
+    def test_invoke_outside_the_event_loop(self):
+        agent = CountingAgent()
+        aid = self.platform.ams.create(agent)
+        self.assertRaises(RuntimeError, self.platform.runtime.spawn, agent)
+        with self.assertLogs('copdai_core.mas', 'WARNING'):
+            self.assertEqual(self.platform.ams.invoke(aid), mas.ReturnCodes.FATAL)
+        self.assertEqual(agent.state, mas.AgentState.INITIATED)
+        self.assertEqual(len(self.platform.runtime), 0)
+
+        async def main():
+            # the agent can still be invoked once the loop runs
+            code = self.platform.ams.invoke(aid)
+            await asyncio.sleep(0)
+            self.platform.mts.deliverMessage(agent, 'stop')
+            await self.platform.runtime.join(timeout=1)
+            return code
+
+        self.assertEqual(asyncio.run(main()), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.events, ['setup', 'teardown'])
+
+    def test_failing_run_still_quits(self):
+        agent = FailingAgent()
+        aid = self.platform.ams.create(agent)
+
+        async def main():
+            self.platform.ams.invoke(aid)
+            with self.assertLogs('copdai_core.runtime', 'ERROR'):
+                return await self.platform.runtime.join(timeout=1)
+
+        self.assertEqual(asyncio.run(main()), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(agent.events, ['setup', 'teardown'])
+        self.assertEqual(self.platform.ams.state_of(aid), mas.AgentState.UNKNOWN)
+        self.assertNotIn(aid, self.platform.ams._agents)
+
+    def test_receive_timeout(self):
+        agent = CountingAgent()
+
+        async def main():
+            agent._runtime = self.platform.runtime
+            agent.invoke()
+            return await agent.receive_async(timeout=0.01)
+
+        self.assertIsNone(asyncio.run(main()))
+
+    def test_receive_template(self):
+        agent = CountingAgent()
+        template = acl.MessageTemplate(conversation_id='wanted')
+
+        async def main():
+            runtime = agent._runtime = self.platform.runtime
+            self.platform.mts.attach(agent).listener = lambda: runtime.wake(agent)
+            agent.invoke()
+            waiting = asyncio.ensure_future(agent.receive_async(timeout=1, template=template))
+            await asyncio.sleep(0)
+            for conversation_id in ('other', 'wanted'):
+                self.platform.mts.deliverMessage(agent, acl.ACLMessage(acl.Performative.INFORM,
+                                                                       conversation_id=conversation_id))
+                await asyncio.sleep(0)
+            return await waiting
+
+        self.assertEqual(asyncio.run(main()).conversation_id, 'wanted')
+        self.assertEqual(agent.receive().conversation_id, 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl
+
+import mmap
+import os
+import unittest
+
+
+class SinkAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class SegmentStoreTestSuite(unittest.TestCase):
+    """Memory-mapped spill tier test cases."""
+
+    def setUp(self):
+        self.mts = mas.MessageTransportService(capacity=4, policy=mas.OverflowPolicy.SPILL, segment_size=4096)
+        self.agents = [SinkAgent(platform_id=1) for _ in range(2)]
+        for agent in self.agents:
+            self.mts.attach(agent)
+            agent.invoke()
+            agent.suspend()
+
+    def tearDown(self):
+        if self.mts.segments is not None:
+            self.mts.segments.close()
+
+    def test_replay_in_order_and_reclaim(self):
+        for i in range(500):
+            for agent in self.agents:
+                self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content=b'%06d' % i))
+        store = self.mts.segments
+        self.assertGreater(len(store), 2)
+        directory = store.directory
+        for agent in self.agents:
+            agent.resume()
+            contents = [bytes(message.content) for message in agent._mailbox.drain()]
+            self.assertEqual(contents, [b'%06d' % i for i in range(500)])
+        # only the segment still open for writing is left
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.reclaimed, store.created - 1)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_zero_copy_replay(self):
+        agent = self.agents[0]
+        for i in range(6):
+            self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content=b'payload'))
+        messages = agent._mailbox.drain()
+        self.assertIsInstance(messages[-1].content.obj, mmap.mmap)
+        self.assertEqual(bytes(messages[-1].content), b'payload')
+
+    def test_other_messages_are_pickled(self):
+        agent = self.agents[0]
+        for i in range(10):
+            self.mts.deliverMessage(agent, {'n': i})
+        self.assertEqual([m['n'] for m in agent._mailbox.drain()], list(range(10)))
+
+    def test_object_content_is_pickled(self):
+        agent = self.agents[0]
+        for i in range(10):
+            code = self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content={'n': i}))
+            self.assertEqual(code, mas.ReturnCodes.SUCCESS)
+        self.assertEqual([m.content['n'] for m in agent._mailbox.drain()], list(range(10)))
+
+    def test_select_spilled_records_in_place(self):
+        agent = self.agents[0]
+        for i in range(300):
+            self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content=b'x' * 64,
+                                         conversation_id='c%d' % i))
+        box = agent._mailbox
+        for conversation_id in ('c4', 'c150', 'c299', 'c5'):
+            self.assertEqual(box.get(acl.MessageTemplate(conversation_id=conversation_id)).conversation_id,
+                             conversation_id)
+        self.assertIsNone(box.get(acl.MessageTemplate(conversation_id='none')))
+        self.assertEqual(len(box._messages), 4)
+        # the last record was taken, the next one is chained to the one before it
+        self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], conversation_id='last'))
+        expected = ['c%d' % i for i in range(300) if i not in (4, 5, 150, 299)] + ['last']
+        self.assertEqual([message.conversation_id for message in box.drain()], expected)
+        self.assertEqual(len(self.mts.segments), 1)
+
+    def test_detached_agent_releases_its_records(self):
+        agent = self.agents[0]
+        for i in range(300):
+            self.mts.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content=b'x' * 64))
+        self.mts.detach(agent)
+        self.assertEqual(len(self.mts.segments), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
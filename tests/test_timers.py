@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from .context import timers
+
+import asyncio
+import random
+import unittest
+
+
+class TimingWheelTestSuite(unittest.TestCase):
+    """Hierarchical timing wheel test cases."""
+
+    def test_never_early_at_most_one_tick_late(self):
+        # 3 levels of 16 slots span 4096 ticks, the longest deadlines go around the top level
+        wheel = timers.TimingWheel(resolution=0.001, bits=4, levels=3)
+        rng = random.Random(7)
+        scheduled = [wheel.schedule(rng.uniform(0, 12), None) for _ in range(5000)]
+        cancelled = set(scheduled[::5])
+        for timer in cancelled:
+            self.assertTrue(timer.cancel())
+        self.assertEqual(len(wheel), 4000)
+        expired = []
+        now = 0.0
+        while now < 12.1:
+            now += 0.0005
+            for timer in wheel.advance(now):
+                self.assertLessEqual(timer.deadline, now)
+                self.assertLess(now - timer.deadline, 0.0015)
+                expired.append(timer)
+        self.assertEqual(set(expired), set(scheduled) - cancelled)
+        self.assertEqual(len(wheel), 0)
+        self.assertFalse(scheduled[1].cancel())
+
+    def test_expired_in_deadline_order(self):
+        wheel = timers.TimingWheel(resolution=0.01)
+        for deadline in (0.35, 0.31, 5.0, 0.02):
+            wheel.schedule(deadline, None)
+        self.assertEqual([timer.deadline for timer in wheel.advance(1.0)], [0.02, 0.31, 0.35])
+        self.assertEqual(wheel.next_tick_time(), 2.56)
+
+    def test_deadline_wheel_runs_callbacks(self):
+        fired = []
+
+        async def main():
+            wheel = timers.DeadlineWheel(resolution=0.005)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            wheel.call_later(0.03, lambda: fired.append(('late', loop.time() - start)))
+            wheel.call_later(0.01, lambda: fired.append(('early', loop.time() - start)))
+            wheel.call_later(0.02, lambda: fired.append(('cancelled', 0))).cancel()
+            await asyncio.sleep(0.06)
+            wheel.close()
+
+        asyncio.run(main())
+        self.assertEqual([name for name, _ in fired], ['early', 'late'])
+        self.assertGreaterEqual(fired[0][1], 0.01)
+        self.assertGreaterEqual(fired[1][1], 0.03)
+
+
+if __name__ == '__main__':
+    unittest.main()
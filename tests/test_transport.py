@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+from .context import mas, acl, transport
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+
+class SinkAgent(mas.AbstractAgent):
+
+    __slots__ = []
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class TransportTestSuite(unittest.TestCase):
+    """Inter-platform transports test cases, the platforms talk over loopback."""
+
+    def exchange(self, address, count=200):
+        sender = mas.MessageTransportService()
+        receiver = mas.MessageTransportService(capacity=count)
+        agents = [SinkAgent(platform_id=2) for _ in range(2)]
+        for agent in agents:
+            receiver.attach(agent)
+            agent.invoke()
+
+        async def main():
+            bound = await receiver.listen(address)
+            sender.add_route(agents[0].aid.platform, bound)
+            for i in range(count):
+                message = acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid for agent in agents],
+                                         content=b'%d' % i)
+                self.assertEqual(sender.send(message), mas.ReturnCodes.SUCCESS)
+            await sender.transports.drain()
+            for _ in range(100):
+                if len(agents[1]._mailbox) == count:
+                    break
+                await asyncio.sleep(0.01)
+            connection = sender.transports.connection(bound)
+            await sender.close()
+            await receiver.close()
+            return connection
+
+        connection = asyncio.run(main())
+        for agent in agents:
+            self.assertEqual([bytes(m.content) for m in agent._mailbox.drain()],
+                             [b'%d' % i for i in range(count)])
+        # one connection for every message, frames coalesced in far fewer writes
+        self.assertEqual(connection.connects, 1)
+        self.assertEqual(connection.frames, count)
+        self.assertLess(connection.batches, count)
+
+    def test_tcp(self):
+        self.exchange('tcp://127.0.0.1:0')
+
+    def test_unix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.exchange('unix://' + os.path.join(directory, 'platform.sock'))
+
+    def test_backpressure(self):
+        pool = transport.TransportPool(max_pending_bytes=1024)
+
+        async def main():
+            # nothing is connected yet, the frames wait in the connection until it refuses more
+            codes = [pool.send('tcp://127.0.0.1:9', b'x' * 100) for _ in range(20)]
+            await pool.close()
+            return codes
+
+        codes = asyncio.run(main())
+        self.assertEqual(codes.count(mas.ReturnCodes.SUCCESS), 10)
+        self.assertEqual(codes[-1], mas.ReturnCodes.BUFFER_OVERFLOW)
+
+    def test_unknown_platform(self):
+        mts = mas.MessageTransportService()
+        mts.add_route('000000000002', 'tcp://127.0.0.1:9')
+        message = acl.ACLMessage(acl.Performative.INFORM, receivers=['nobody@elsewhere'])
+        self.assertEqual(mts.send(message), mas.ReturnCodes.NOT_REGISTERED)
+
+
+class StoreAndForwardTestSuite(unittest.TestCase):
+    """Messages of a migrating agent are stored while it is in transit then forwarded."""
+
+    def test_no_message_lost(self):
+        origin = mas.MessageTransportService()
+        destination = mas.MessageTransportService()
+        agent = SinkAgent(platform_id=1)
+
+        def inform(i):
+            return acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content='m%d' % i)
+
+        async def main():
+            origin_address = await origin.listen('tcp://127.0.0.1:0')
+            await destination.listen('tcp://127.0.0.1:0')
+            origin.attach(agent)
+            agent.invoke()
+            agent.move()
+            origin.send(inform(0))
+            self.assertEqual(origin.depart(agent), mas.ReturnCodes.SUCCESS)
+            origin.send(inform(1))
+
+            destination.arrive(agent, origin_address)
+            agent._runtime = mas.AgentRuntime(destination)
+            self.assertEqual(agent.execute(), mas.ReturnCodes.SUCCESS)
+            for _ in range(100):
+                if agent.aid in origin.forwards:
+                    break
+                await asyncio.sleep(0.01)
+            # stored messages went in one write, the next ones follow the forward
+            stored_batches = origin.transports.connection(destination.address).batches
+            origin.send(inform(2))
+            for _ in range(100):
+                if len(agent._mailbox) == 3:
+                    break
+                await asyncio.sleep(0.01)
+            await origin.close()
+            await destination.close()
+            return stored_batches
+
+        self.assertEqual(asyncio.run(main()), 1)
+        self.assertEqual([m.content for m in agent._mailbox.drain()], ['m0', 'm1', 'm2'])
+
+    def test_large_backlog(self):
+        # the backlog is far above the connection limit and the mailbox capacity of the origin
+        origin = mas.MessageTransportService(capacity=16)
+        destination = mas.MessageTransportService()
+        agent = SinkAgent(platform_id=1)
+        count = 600
+
+        async def main():
+            origin_address = await origin.listen('tcp://127.0.0.1:0')
+            await destination.listen('tcp://127.0.0.1:0')
+            origin.attach(agent)
+            agent.invoke()
+            agent.move()
+            origin.depart(agent)
+            for i in range(count):
+                origin.send(acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid],
+                                           content=b'%04d' % i + b'x' * 8192))
+            destination.arrive(agent, origin_address)
+            agent._runtime = mas.AgentRuntime(destination)
+            agent.execute()
+            for _ in range(500):
+                if agent._mailbox is not None and len(agent._mailbox) == count:
+                    break
+                await asyncio.sleep(0.01)
+            await origin.close()
+            await destination.close()
+
+        asyncio.run(main())
+        self.assertEqual([bytes(m.content[:4]) for m in agent._mailbox.drain()], [b'%04d' % i for i in range(count)])
+
+    def test_object_content_is_skipped(self):
+        origin = mas.MessageTransportService()
+        destination = mas.MessageTransportService()
+        agent = SinkAgent(platform_id=1)
+
+        def inform(content):
+            return acl.ACLMessage(acl.Performative.INFORM, receivers=[agent.aid], content=content)
+
+        async def main():
+            origin_address = await origin.listen('tcp://127.0.0.1:0')
+            await destination.listen('tcp://127.0.0.1:0')
+            origin.attach(agent)
+            agent.invoke()
+            agent.move()
+            origin.depart(agent)
+            origin.send(inform('m0'))
+            # passed by reference, it has no ACL frame
+            origin.send(inform({'n': 1}))
+            origin.send(inform('m2'))
+            destination.arrive(agent, origin_address)
+            agent._runtime = mas.AgentRuntime(destination)
+            with self.assertLogs('copdai_core.mas', 'WARNING'):
+                agent.execute()
+                for _ in range(100):
+                    if agent.aid in origin.forwards:
+                        break
+                    await asyncio.sleep(0.01)
+            self.assertEqual(origin.send(inform({'n': 3})), mas.ReturnCodes.FATAL)
+            origin.send(inform('m4'))
+            for _ in range(100):
+                if len(agent._mailbox) == 3:
+                    break
+                await asyncio.sleep(0.01)
+            await origin.close()
+            await destination.close()
+
+        with self.assertLogs('copdai_core.mas', 'WARNING'):
+            asyncio.run(main())
+        self.assertEqual([m.content for m in agent._mailbox.drain()], ['m0', 'm2', 'm4'])
+
+    def test_forward_expires(self):
+        table = transport.ForwardingTable(ttl=60)
+        table.set('a@AP', 'tcp://127.0.0.1:9')
+        table.set('b@AP', 'tcp://127.0.0.1:9', ttl=0)
+        self.assertEqual(table.get('a@AP'), 'tcp://127.0.0.1:9')
+        self.assertNotIn('b@AP', table)
+        self.assertEqual(len(table), 1)
+
+    def test_forwards_expire_on_arrival(self):
+        mts = mas.MessageTransportService()
+        # never looked up again
+        mts.forwards.set('gone@AP', 'tcp://127.0.0.1:9', ttl=0)
+        self.assertEqual(mts._arrived('moved@AP', 'tcp://127.0.0.1:9'), mas.ReturnCodes.SUCCESS)
+        self.assertEqual(len(mts.forwards), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()